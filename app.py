@@ -16,6 +16,7 @@ import sys
 import shutil
 import importlib.util
 from PIL import Image
+from frame_store import make_temp_dir
 
 # Global variables for EDEN availability and model
 EDEN_AVAILABLE = False
@@ -193,16 +194,16 @@ class EDENVideoInterpolator:
         if not out.isOpened():
             raise Exception("Error initializing video writer")
         
+        # EDEN's inference script only takes image paths, so frame pairs go through a private
+        # scratch directory in the frame store's temp location (FRAME_STORE_DIR, e.g. tmpfs)
+        temp_frames_dir = make_temp_dir("eden_frames_")
+        
         try:
             # Process frames
             prev_frame = None
             written_count = 0
             processed_frames = 0
             
-            # Create temporary directory for frame processing
-            temp_frames_dir = 'temp_frames'
-            os.makedirs(temp_frames_dir, exist_ok=True)
-            
             while True:
                 ret, frame = cap.read()
                 if not ret:
@@ -211,12 +212,12 @@ class EDENVideoInterpolator:
                 processed_frames += 1
                 
                 if prev_frame is not None:
-                    # Save frames as images for EDEN processing
-                    frame_0_path = f'{temp_frames_dir}/frame_0.jpg'
-                    frame_1_path = f'{temp_frames_dir}/frame_1.jpg'
+                    # Save frames losslessly and uncompressed for EDEN processing
+                    frame_0_path = f'{temp_frames_dir}/frame_0.png'
+                    frame_1_path = f'{temp_frames_dir}/frame_1.png'
                     
-                    cv2.imwrite(frame_0_path, prev_frame)
-                    cv2.imwrite(frame_1_path, frame)
+                    cv2.imwrite(frame_0_path, prev_frame, [cv2.IMWRITE_PNG_COMPRESSION, 0])
+                    cv2.imwrite(frame_1_path, frame, [cv2.IMWRITE_PNG_COMPRESSION, 0])
                     
                     # Use EDEN to interpolate
                     interpolated_frames = self._interpolate_frame_pair(frame_0_path, frame_1_path)
@@ -241,29 +242,27 @@ class EDENVideoInterpolator:
                 out.write(prev_frame)
                 written_count += 1
             
-            # Clean up temporary directory
-            shutil.rmtree(temp_frames_dir, ignore_errors=True)
-            
             print(f"EDEN interpolation completed: {processed_frames} frames processed, {written_count} frames written")
             
         finally:
+            # Clean up temporary directory
+            shutil.rmtree(temp_frames_dir, ignore_errors=True)
             cap.release()
             out.release()
     
     def _interpolate_frame_pair(self, frame_0_path, frame_1_path):
         """Interpolate frames between two input frames using EDEN."""
         try:
-            # Create results directory
-            results_dir = 'temp_interpolation_results'
-            os.makedirs(results_dir, exist_ok=True)
+            # Create results directory next to the input pair; EDEN runs from its own directory
+            results_dir = os.path.abspath(make_temp_dir("eden_results_", os.path.dirname(frame_0_path)))
             
             # Run EDEN inference directly using subprocess as per README
             # CUDA_VISIBLE_DEVICES=0 python inference.py --frame_0_path examples/frame_0.jpg --frame_1_path examples/frame_1.jpg --interpolated_results_dir interpolation_outputs
             cmd = [
                 sys.executable,
                 'inference.py',
-                '--frame_0_path', frame_0_path,
-                '--frame_1_path', frame_1_path,
+                '--frame_0_path', os.path.abspath(frame_0_path),
+                '--frame_1_path', os.path.abspath(frame_1_path),
                 '--interpolated_results_dir', results_dir
             ]
             
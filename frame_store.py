@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+"""
+Frame Store
+Buffers video frames in RAM, spilling to a memory-mapped arena and then to
+compressed files on disk once the memory budgets are used up.
+"""
+
+import os
+import zlib
+import shutil
+import tempfile
+import threading
+import numpy as np
+
+# Default configuration
+MEMORY_BUDGET_MB = 1024  # frames kept as plain arrays before spilling
+ARENA_BUDGET_MB = 4096  # frames kept in the memory-mapped arena before compressing
+ARENA_CHUNK_FRAMES = 16  # frame slots per arena file
+COMPRESSION_LEVEL = 1  # zlib level for the compressed tier, favouring speed
+TEMP_DIR = os.environ.get("FRAME_STORE_DIR")  # spill location, e.g. a tmpfs mount; None = system temp
+
+def make_temp_dir(prefix="frames_", temp_dir=None):
+    """
+    Create a private scratch directory in the configured temp location.
+    
+    Args:
+        prefix (str): Directory name prefix
+        temp_dir (str): Parent directory, defaults to TEMP_DIR then the system temp dir
+    
+    Returns:
+        str: Path to the new directory
+    """
+    parent = temp_dir or TEMP_DIR
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    return tempfile.mkdtemp(prefix=prefix, dir=parent)
+
+class MemoryFrameStore:
+    """Frames kept as in-process arrays."""
+    
+    name = "memory"
+    
+    def __init__(self):
+        self.frames = {}
+        self.nbytes = 0
+    
+    def put(self, key, frame):
+        """Store a frame under key."""
+        self.frames[key] = frame
+        self.nbytes += frame.nbytes
+    
+    def get(self, key):
+        """Return the frame stored under key."""
+        return self.frames[key]
+    
+    def pop(self, key):
+        """Remove and return the frame stored under key."""
+        frame = self.frames.pop(key)
+        self.nbytes -= frame.nbytes
+        return frame
+    
+    def close(self):
+        """Drop all frames."""
+        self.frames.clear()
+        self.nbytes = 0
+
+class MmapFrameStore:
+    """
+    Frames kept in raw .npy files mapped into memory.
+    
+    Frames of one shape share fixed-size slots in arena files of
+    ARENA_CHUNK_FRAMES frames each, and freed slots are reused. The kernel
+    pages the arena out under memory pressure instead of the process
+    growing, and reading a frame back is a plain memory copy.
+    """
+    
+    name = "mmap"
+    
+    def __init__(self, directory, chunk_frames=ARENA_CHUNK_FRAMES):
+        """
+        Args:
+            directory (str): Directory the arena files are created in
+            chunk_frames (int): Frame slots per arena file
+        """
+        self.directory = directory
+        self.chunk_frames = chunk_frames
+        self.chunks = {}
+        self.free_slots = {}
+        self.slots = {}
+        self.counter = 0
+        self.nbytes = 0
+    
+    def put(self, key, frame):
+        """Copy a frame into a free arena slot."""
+        arena_key = (frame.shape, frame.dtype.str)
+        free = self.free_slots.setdefault(arena_key, [])
+        if not free:
+            chunks = self.chunks.setdefault(arena_key, [])
+            # Numbered across all shapes, so every chunk gets its own file
+            path = os.path.join(self.directory, f"arena_{self.counter:08d}.npy")
+            self.counter += 1
+            chunks.append(np.lib.format.open_memmap(path, mode='w+', dtype=frame.dtype,
+                                                    shape=(self.chunk_frames,) + frame.shape))
+            free.extend((len(chunks) - 1, slot) for slot in reversed(range(self.chunk_frames)))
+        chunk, slot = free.pop()
+        self.chunks[arena_key][chunk][slot] = frame
+        self.slots[key] = (arena_key, chunk, slot)
+        self.nbytes += frame.nbytes
+    
+    def get(self, key):
+        """Return a copy of the frame stored under key."""
+        arena_key, chunk, slot = self.slots[key]
+        return np.array(self.chunks[arena_key][chunk][slot])
+    
+    def pop(self, key):
+        """Remove and return the frame stored under key, freeing its slot."""
+        frame = self.get(key)
+        arena_key, chunk, slot = self.slots.pop(key)
+        self.free_slots[arena_key].append((chunk, slot))
+        self.nbytes -= frame.nbytes
+        return frame
+    
+    def close(self):
+        """Unmap the arena files (the caller removes the directory)."""
+        self.chunks.clear()
+        self.free_slots.clear()
+        self.slots.clear()
+        self.nbytes = 0
+
+class CompressedFrameStore:
+    """Frames kept as zlib-compressed raw files, one per frame."""
+    
+    name = "compressed"
+    
+    def __init__(self, directory, level=COMPRESSION_LEVEL):
+        """
+        Args:
+            directory (str): Directory the frame files are created in
+            level (int): zlib compression level
+        """
+        self.directory = directory
+        self.level = level
+        self.files = {}
+        self.counter = 0
+        self.nbytes = 0
+    
+    def put(self, key, frame):
+        """Compress a frame to its own file."""
+        data = zlib.compress(np.ascontiguousarray(frame).tobytes(), self.level)
+        path = os.path.join(self.directory, f"frame_{self.counter:08d}.zlib")
+        self.counter += 1
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.files[key] = (path, frame.shape, frame.dtype.str, len(data))
+        self.nbytes += len(data)
+    
+    def get(self, key):
+        """Read back and decompress the frame stored under key."""
+        path, shape, dtype, _ = self.files[key]
+        with open(path, 'rb') as f:
+            data = zlib.decompress(f.read())
+        return np.frombuffer(data, dtype=np.dtype(dtype)).reshape(shape).copy()
+    
+    def pop(self, key):
+        """Remove and return the frame stored under key, deleting its file."""
+        frame = self.get(key)
+        path, _, _, size = self.files.pop(key)
+        os.remove(path)
+        self.nbytes -= size
+        return frame
+    
+    def close(self):
+        """Forget all frames (the caller removes the directory)."""
+        self.files.clear()
+        self.nbytes = 0
+
+class FrameStore:
+    """
+    Frame buffer that spills from RAM to a memory-mapped arena to compressed files.
+    
+    Each frame goes to the first tier with budget left for it: plain
+    arrays up to memory_budget_mb, then the arena up to arena_budget_mb,
+    then compressed files without limit. A tier with a budget of 0 is
+    skipped. The spill directory is created on first use under temp_dir
+    and removed by close(). Safe to use from several threads.
+    """
+    
+    def __init__(self, memory_budget_mb=MEMORY_BUDGET_MB, arena_budget_mb=ARENA_BUDGET_MB, temp_dir=None):
+        """
+        Args:
+            memory_budget_mb (float): RAM for plain frames
+            arena_budget_mb (float): Space for memory-mapped frames
+            temp_dir (str): Parent of the spill directory, defaults to TEMP_DIR then the system temp dir
+        """
+        self.budgets = [memory_budget_mb * 1024 * 1024, arena_budget_mb * 1024 * 1024, None]
+        self.temp_dir = temp_dir
+        self.directory = None
+        self.tiers = [MemoryFrameStore(), None, None]
+        self.locations = {}
+        self.lock = threading.Lock()
+        self.counts = {"memory": 0, "mmap": 0, "compressed": 0}
+        self.peak_bytes = {"memory": 0, "mmap": 0, "compressed": 0}
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def __len__(self):
+        return len(self.locations)
+    
+    def __contains__(self, key):
+        return key in self.locations
+    
+    def _tier(self, index):
+        """Return the tier at index, creating the spill directory and store on first use."""
+        if self.tiers[index] is None:
+            if self.directory is None:
+                self.directory = make_temp_dir("frame_store_", self.temp_dir)
+            self.tiers[index] = (MmapFrameStore(self.directory) if index == 1
+                                 else CompressedFrameStore(self.directory))
+        return self.tiers[index]
+    
+    def put(self, key, frame):
+        """
+        Store a frame, replacing any frame already stored under key.
+        
+        Args:
+            key: Any hashable key
+            frame (numpy.ndarray): Frame to store
+        """
+        with self.lock:
+            if key in self.locations:
+                self.tiers[self.locations.pop(key)].pop(key)
+            for index, budget in enumerate(self.budgets):
+                if budget is None:
+                    break
+                if not budget:
+                    continue
+                tier = self.tiers[index]
+                if (tier.nbytes if tier is not None else 0) + frame.nbytes <= budget:
+                    break
+            tier = self._tier(index)
+            tier.put(key, frame)
+            self.locations[key] = index
+            self.counts[tier.name] += 1
+            self.peak_bytes[tier.name] = max(self.peak_bytes[tier.name], tier.nbytes)
+    
+    def get(self, key):
+        """
+        Return the frame stored under key.
+        
+        Args:
+            key: Key the frame was stored under
+        
+        Returns:
+            numpy.ndarray: The frame
+        """
+        with self.lock:
+            return self.tiers[self.locations[key]].get(key)
+    
+    def pop(self, key):
+        """
+        Remove and return the frame stored under key.
+        
+        Args:
+            key: Key the frame was stored under
+        
+        Returns:
+            numpy.ndarray: The frame
+        """
+        with self.lock:
+            return self.tiers[self.locations.pop(key)].pop(key)
+    
+    def stats(self):
+        """
+        Summarize how many frames each tier has taken.
+        
+        Returns:
+            dict: Per tier, frames stored and peak bytes held
+        """
+        with self.lock:
+            return {name: {"frames": self.counts[name], "peak_bytes": self.peak_bytes[name]}
+                    for name in self.counts}
+    
+    def close(self):
+        """Drop all frames and remove the spill directory."""
+        with self.lock:
+            for tier in self.tiers:
+                if tier is not None:
+                    tier.close()
+            self.locations.clear()
+            if self.directory is not None:
+                shutil.rmtree(self.directory, ignore_errors=True)
+                self.directory = None
+            self.tiers = [MemoryFrameStore(), None, None]
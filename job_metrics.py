@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+"""
+Job Metrics
+Per-stage wall time, throughput, bytes read/written and peak memory for
+upscale jobs, with optional JSON-lines output for offline analysis, and
+live progress of running jobs.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+import collections
+
+# Default configuration
+SAMPLE_INTERVAL = 0.1  # seconds between memory samples
+PROGRESS_WINDOW = 5.0  # seconds of recent progress the instantaneous fps is measured over
+
+STAGE_FIELDS = ("seconds", "frames", "bytes_read", "bytes_written")
+
+def current_memory():
+    """
+    Resident memory of this process.
+    
+    Returns:
+        int: RSS in bytes, or the lifetime peak RSS when psutil is unavailable
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        import resource
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def gpu_peak_memory(reset=False):
+    """
+    Peak CUDA memory allocated by torch, if torch is already loaded and has a GPU.
+    
+    Args:
+        reset (bool): Start a new peak measurement
+    
+    Returns:
+        int: Bytes, or None without CUDA
+    """
+    torch = sys.modules.get('torch')
+    if torch is None or not torch.cuda.is_available():
+        return None
+    if reset:
+        torch.cuda.reset_peak_memory_stats()
+    return torch.cuda.max_memory_allocated()
+
+class JobMetrics:
+    """
+    Timings and I/O of one job, broken down by stage.
+    
+    Sequential stages are timed with stage(); stages measured elsewhere
+    (such as the busy time of pipeline threads) are recorded with add().
+    Repeated records of a stage accumulate, so per-segment numbers sum up.
+    While started, a sampler thread tracks peak memory for the job and
+    for every stage open at the time. Set frames to the number of frames
+    the job produced to get its overall fps. Safe to use from several threads.
+    """
+    
+    def __init__(self):
+        self.stages = {}
+        self.frames = None
+        self.lock = threading.Lock()
+        self.started = None
+        self.finished = None
+        self.peak_memory = 0
+        self.peak_gpu_memory = None
+        self._open_stages = {}
+        self._stop = threading.Event()
+        self._sampler = None
+    
+    def __enter__(self):
+        self.start()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.finish()
+    
+    def start(self):
+        """Start the job clock and the memory sampler."""
+        self.started = time.time()
+        gpu_peak_memory(reset=True)
+        self._sample()
+        self._sampler = threading.Thread(target=self._run_sampler, daemon=True)
+        self._sampler.start()
+    
+    def finish(self):
+        """Stop the job clock and the memory sampler."""
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+        self._sample()
+        self.peak_gpu_memory = gpu_peak_memory()
+        self.finished = time.time()
+    
+    def _run_sampler(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            self._sample()
+    
+    def _sample(self):
+        memory = current_memory()
+        with self.lock:
+            self.peak_memory = max(self.peak_memory, memory)
+            for name in self._open_stages:
+                self._open_stages[name] = max(self._open_stages[name], memory)
+    
+    def _record(self, name):
+        return self.stages.setdefault(name, dict.fromkeys(STAGE_FIELDS, 0))
+    
+    def add(self, name, seconds=0.0, frames=0, bytes_read=0, bytes_written=0, peak_memory=None):
+        """
+        Add measurements to a stage.
+        
+        Args:
+            name (str): Stage name
+            seconds (float): Time spent in the stage
+            frames (int): Frames the stage handled
+            bytes_read (int): Bytes the stage read from files
+            bytes_written (int): Bytes the stage wrote to files
+            peak_memory (int): Peak resident memory seen during the stage
+        """
+        with self.lock:
+            record = self._record(name)
+            record["seconds"] += seconds
+            record["frames"] += frames
+            record["bytes_read"] += bytes_read
+            record["bytes_written"] += bytes_written
+            if peak_memory is not None:
+                record["peak_memory_bytes"] = max(record.get("peak_memory_bytes", 0), peak_memory)
+    
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Time a block as a stage, tracking its peak memory.
+        
+        Yields:
+            dict: Counters for the block (frames, bytes_read, bytes_written) to fill in
+        """
+        counters = {"frames": 0, "bytes_read": 0, "bytes_written": 0}
+        with self.lock:
+            self._open_stages[name] = 0
+        self._sample()
+        start = time.time()
+        try:
+            yield counters
+        finally:
+            seconds = time.time() - start
+            self._sample()
+            with self.lock:
+                peak = self._open_stages.pop(name)
+            self.add(name, seconds, peak_memory=peak, **counters)
+    
+    def merge(self, report):
+        """
+        Add the stages of another job's report, e.g. a segment upscaled in a worker process.
+        
+        Args:
+            report (dict): Output of report()
+        """
+        for name, record in report.get("stages", {}).items():
+            self.add(name, **{key: record.get(key, 0) for key in STAGE_FIELDS},
+                     peak_memory=record.get("peak_memory_bytes"))
+        with self.lock:
+            self.peak_memory = max(self.peak_memory, report.get("peak_memory_bytes", 0))
+    
+    def report(self):
+        """
+        Summarize the job.
+        
+        Returns:
+            dict: Overall wall time, fps, bytes and peak memory plus a record per stage
+        """
+        with self.lock:
+            wall = ((self.finished or time.time()) - self.started) if self.started else 0.0
+            stages = {}
+            for name, record in self.stages.items():
+                stage = dict(record, seconds=round(record["seconds"], 3))
+                if record["frames"] and record["seconds"] > 0:
+                    stage["fps"] = round(record["frames"] / record["seconds"], 2)
+                stages[name] = stage
+            report = {
+                "wall_seconds": round(wall, 3),
+                "bytes_read": sum(record["bytes_read"] for record in self.stages.values()),
+                "bytes_written": sum(record["bytes_written"] for record in self.stages.values()),
+                "peak_memory_bytes": self.peak_memory,
+                "stages": stages
+            }
+        if self.frames is not None:
+            report["frames"] = self.frames
+            report["fps"] = round(self.frames / wall, 2) if wall > 0 else 0.0
+        if self.peak_gpu_memory is not None:
+            report["peak_gpu_memory_bytes"] = self.peak_gpu_memory
+        return report
+
+class JobProgress:
+    """
+    Live progress of a running job: current stage, frames done out of the
+    total, instantaneous and average fps, and an ETA.
+    
+    The pipeline calls advance() once per batch. It only takes a lock, bumps
+    a counter and appends to a short window of recent samples, so it costs
+    nothing next to inference; rates and the ETA are worked out when a
+    snapshot is read. Frames counted with timed=False (such as segments
+    reused from a checkpoint) count towards progress but not towards fps.
+    Safe to use from several threads.
+    """
+    
+    def __init__(self, window=PROGRESS_WINDOW):
+        """
+        Args:
+            window (float): Seconds of recent progress the instantaneous fps is measured over
+        """
+        self.window = window
+        self.lock = threading.Lock()
+        self.stage = None
+        self.frames_done = 0
+        self.frames_total = None
+        self.untimed_frames = 0
+        self.started = None
+        self.stage_started = None
+        self.updated = None
+        self._samples = collections.deque()
+    
+    def set_stage(self, stage, frames_total=None):
+        """
+        Move on to a stage.
+        
+        Rates are measured from the start of the stage that finishes the
+        first frames, so model loading and other setup before it do not
+        count against them.
+        
+        Args:
+            stage (str): Stage name
+            frames_total (int): Frames the job will produce, when it becomes known
+        """
+        now = time.time()
+        with self.lock:
+            self.stage = stage
+            self.stage_started = now
+            if frames_total is not None:
+                self.frames_total = frames_total
+            self.updated = now
+    
+    def advance(self, frames, timed=True):
+        """
+        Count frames as done.
+        
+        Args:
+            frames (int): Frames finished since the last call
+            timed (bool): Include the frames in the fps measurements
+        """
+        now = time.time()
+        with self.lock:
+            self.frames_done += frames
+            self.updated = now
+            if not timed:
+                self.untimed_frames += frames
+                return
+            if self.started is None:
+                self.started = self.stage_started or now
+                self._samples.append((self.started, self.frames_done - self.untimed_frames - frames))
+            self._samples.append((now, self.frames_done - self.untimed_frames))
+            while len(self._samples) > 2 and self._samples[1][0] < now - self.window:
+                self._samples.popleft()
+    
+    def snapshot(self):
+        """
+        Summarize progress so far.
+        
+        Returns:
+            dict: stage, frames_done, frames_total, percent, fps, average_fps, eta_seconds and updated_time
+        """
+        now = time.time()
+        with self.lock:
+            progress = {"stage": self.stage, "frames_done": self.frames_done, "frames_total": self.frames_total}
+            timed = self.frames_done - self.untimed_frames
+            fps = average_fps = None
+            if self._samples and now > self.started:
+                # Measured up to now rather than the last batch, so a stall shows as a falling rate
+                (first_time, first_done), last_done = self._samples[0], self._samples[-1][1]
+                fps = (last_done - first_done) / (now - first_time)
+                average_fps = timed / (now - self.started)
+            updated = self.updated
+        
+        total = progress["frames_total"]
+        progress["percent"] = round(min(100.0, 100.0 * progress["frames_done"] / total), 1) if total else None
+        progress["fps"] = round(fps, 2) if fps is not None else None
+        progress["average_fps"] = round(average_fps, 2) if average_fps is not None else None
+        rate = fps or average_fps
+        progress["eta_seconds"] = round(max(0, total - progress["frames_done"]) / rate, 1) if total and rate else None
+        progress["updated_time"] = updated
+        return progress
+
+def write_metrics_line(path, record):
+    """
+    Append one JSON record to a JSON-lines file.
+    
+    Args:
+        path (str): File to append to
+        record (dict): JSON-serializable record
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    line = json.dumps(record, default=str) + '\n'
+    # A single write of one line keeps concurrent jobs from interleaving records
+    with open(path, 'a') as f:
+        f.write(line)
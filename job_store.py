@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+"""
+Job Store
+Durable record of server jobs in SQLite, so statuses and queued work
+survive a restart.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# Default configuration
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jobs.db')
+BUSY_TIMEOUT = 30  # seconds a writer waits for another connection's lock
+
+# Columns stored as JSON text
+JSON_COLUMNS = ("input_path", "output_path", "settings", "options", "stats", "metrics", "progress")
+COLUMNS = ("type", "status", "priority", "client_id", "input_path", "output_path", "settings", "options", "stats",
+           "metrics", "progress", "error", "queued_time", "start_time", "end_time")
+# Columns added after the first release, with their types, for upgrading older databases
+ADDED_COLUMNS = (("priority", "TEXT"), ("client_id", "TEXT"), ("progress", "TEXT"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    priority TEXT,
+    client_id TEXT,
+    input_path TEXT,
+    output_path TEXT,
+    settings TEXT,
+    options TEXT,
+    stats TEXT,
+    metrics TEXT,
+    progress TEXT,
+    error TEXT,
+    queued_time REAL,
+    start_time REAL,
+    end_time REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+"""
+
+class JobStore:
+    """
+    Jobs kept in an SQLite database in WAL mode.
+    
+    IDs come from an AUTOINCREMENT primary key, so they are allocated
+    atomically and never reused. Lookups by ID go through the primary key
+    and status queries through an index on (status, id), so both stay fast
+    with any number of finished jobs. Every thread gets its own
+    connection; WAL lets readers run while a job is being updated.
+    """
+    
+    def __init__(self, path=DB_PATH):
+        """
+        Args:
+            path (str): Database file, created if missing
+        """
+        self.path = path
+        self.local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.executescript(SCHEMA)
+        existing = {row[1] for row in connection.execute("PRAGMA table_info(jobs)")}
+        for column, column_type in ADDED_COLUMNS:
+            if column not in existing:
+                connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+    
+    def _connection(self):
+        """Return this thread's connection, opening it on first use."""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            # Autocommit; multi-statement changes use explicit transactions
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+    
+    @staticmethod
+    def _encode(column, value):
+        return json.dumps(value, default=str) if column in JSON_COLUMNS and value is not None else value
+    
+    @staticmethod
+    def _decode(row):
+        job = dict(row)
+        for column in JSON_COLUMNS:
+            if job[column] is not None:
+                job[column] = json.loads(job[column])
+        return job
+    
+    def create(self, job_type, input_path, output_path, settings, options=None, priority=None, client_id=None):
+        """
+        Record a new queued job.
+        
+        Args:
+            job_type (str): "upscale", "preview" or "images"
+            input_path: Input file, or list of files
+            output_path: Output file, or list of files
+            settings (dict): Per-job upscale setting overrides
+            options (dict): Job-type specific arguments (resume, frames, ...)
+            priority (str): Priority class the job is scheduled in
+            client_id (str): Client the job is accounted to for fair sharing
+        
+        Returns:
+            int: The new job's ID
+        """
+        values = {"type": job_type, "status": "queued", "priority": priority, "client_id": client_id,
+                  "input_path": input_path, "output_path": output_path, "settings": settings,
+                  "options": options or {}, "stats": {}, "queued_time": time.time()}
+        columns = ", ".join(values)
+        placeholders = ", ".join("?" for _ in values)
+        cursor = self._connection().execute(f"INSERT INTO jobs ({columns}) VALUES ({placeholders})",
+                                            [self._encode(column, value) for column, value in values.items()])
+        return cursor.lastrowid
+    
+    def get(self, job_id):
+        """
+        Look up a job by ID.
+        
+        Returns:
+            dict: The job's columns, or None if there is no such job
+        """
+        row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._decode(row) if row is not None else None
+    
+    def update(self, job_id, **fields):
+        """
+        Change columns of a job; a value of None clears the column.
+        
+        Args:
+            job_id (int): Job to change
+            **fields: Column values, from COLUMNS
+        """
+        unknown = set(fields) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown job columns: {', '.join(sorted(unknown))}")
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        values = [self._encode(column, value) for column, value in fields.items()]
+        self._connection().execute(f"UPDATE jobs SET {assignments} WHERE id = ?", values + [job_id])
+    
+    def delete(self, job_id):
+        """Remove a job."""
+        self._connection().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+    
+    def ids_with_status(self, status, limit=None):
+        """
+        IDs of the jobs in a status, oldest first.
+        
+        Args:
+            status (str): Status to match
+            limit (int): Return at most this many IDs
+        
+        Returns:
+            list: Job IDs
+        """
+        query = "SELECT id FROM jobs WHERE status = ? ORDER BY id"
+        params = [status]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(int(limit))
+        return [row[0] for row in self._connection().execute(query, params)]
+    
+    def counts(self):
+        """Number of jobs in each status."""
+        rows = self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+        return {status: count for status, count in rows}
+    
+    def requeue_interrupted(self):
+        """
+        Put jobs that were processing when the server stopped back in the queue.
+        
+        Returns:
+            list: IDs of every queued job, oldest first, including the requeued ones
+        """
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("UPDATE jobs SET status = 'queued', start_time = NULL WHERE status = 'processing'")
+            ids = [row[0] for row in connection.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id")]
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return ids
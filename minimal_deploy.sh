@@ -9,7 +9,7 @@ rm -rf $DEPLOY_DIR
 mkdir -p $DEPLOY_DIR
 
 # Copy essential files only
-cp upscale_app.py server.py requirements.txt config.json run_upscale.sh start_server.sh $DEPLOY_DIR/
+cp upscale_app.py frame_store.py result_cache.py job_metrics.py job_store.py server.py requirements.txt config.json run_upscale.sh start_server.sh $DEPLOY_DIR/
 cp setup_vastai.sh $DEPLOY_DIR/
 cp test_instance.py $DEPLOY_DIR/
 
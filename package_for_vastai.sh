@@ -9,7 +9,7 @@ rm -rf $DEPLOY_DIR
 mkdir -p $DEPLOY_DIR
 
 # Copy necessary files
-cp -r upscale_app.py server.py requirements.txt config.json run_upscale.sh start_server.sh setup_vastai.sh $DEPLOY_DIR/
+cp -r upscale_app.py frame_store.py result_cache.py job_metrics.py job_store.py server.py requirements.txt config.json run_upscale.sh start_server.sh setup_vastai.sh $DEPLOY_DIR/
 cp -r README.md README_UPSCALE.md README_API.md VASTAI_DEPLOYMENT.md VASTAI_API_GUIDE.md DEPLOYMENT_EXAMPLE.md $DEPLOY_DIR/
 cp -r deploy_vastai.py test_deployed_api.py $DEPLOY_DIR/
 cp -r vastai_direct_config.json $DEPLOY_DIR/
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+"""
+Result Cache
+Content-addressed store of finished upscale outputs with a size-bounded,
+least-recently-used eviction policy on disk.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+
+# Default configuration
+MAX_SIZE_MB = 10240  # total size of cached outputs before the least recently used are evicted
+
+def make_cache_key(*parts):
+    """
+    Hash JSON-serializable parts into a cache key.
+    
+    Args:
+        *parts: Values that together identify a result (input hash, settings, ...)
+    
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    data = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+class ResultCache:
+    """
+    Finished outputs stored under a key derived from their inputs.
+    
+    Each entry is a single file named after its key. A hit refreshes the
+    entry's modification time, so the oldest mtime is always the least
+    recently used entry and the order survives a restart. Storing an entry
+    evicts least recently used entries until the cache fits in
+    max_size_mb. Hit/miss counters cover the life of the process. Safe to
+    use from several threads.
+    """
+    
+    def __init__(self, cache_dir, max_size_mb=MAX_SIZE_MB):
+        """
+        Args:
+            cache_dir (str): Directory the cached files are kept in
+            max_size_mb (float): Size bound for all cached files
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    def _path(self, key, extension):
+        return os.path.join(self.cache_dir, key + extension)
+    
+    def _entries(self):
+        """List (mtime, size, path) for every cached file, oldest first."""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(entries)
+    
+    def get(self, key, output_path):
+        """
+        Copy a cached result to output_path if there is one.
+        
+        Args:
+            key (str): Cache key
+            output_path (str): Where to write the cached result
+        
+        Returns:
+            bool: True on a hit, False on a miss
+        """
+        path = self._path(key, os.path.splitext(output_path)[1])
+        with self.lock:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                self.counters["misses"] += 1
+                return False
+            self.counters["hits"] += 1
+        
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        try:
+            shutil.copyfile(path, output_path)
+        except FileNotFoundError:
+            # Evicted by another thread between the lookup and the copy
+            with self.lock:
+                self.counters["hits"] -= 1
+                self.counters["misses"] += 1
+            return False
+        return True
+    
+    def put(self, key, result_path):
+        """
+        Store a copy of a finished result and evict down to the size bound.
+        
+        Results larger than the whole cache are not stored.
+        
+        Args:
+            key (str): Cache key
+            result_path (str): File to store
+        
+        Returns:
+            bool: True if the result was stored
+        """
+        if os.path.getsize(result_path) > self.max_bytes:
+            return False
+        
+        # Copy under a hidden name first so a partial file is never served
+        fd, temp_path = tempfile.mkstemp(prefix='.', dir=self.cache_dir)
+        os.close(fd)
+        try:
+            shutil.copyfile(result_path, temp_path)
+            os.replace(temp_path, self._path(key, os.path.splitext(result_path)[1]))
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        
+        with self.lock:
+            self.counters["stores"] += 1
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                os.remove(path)
+                total -= size
+                self.counters["evictions"] += 1
+        return True
+    
+    def stats(self):
+        """
+        Summarize cache usage.
+        
+        Returns:
+            dict: Counters, hit rate, entry count and bytes used
+        """
+        with self.lock:
+            entries = self._entries()
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return dict(self.counters,
+                        hit_rate=self.counters["hits"] / lookups if lookups else 0.0,
+                        entries=len(entries),
+                        size_bytes=sum(size for _, size, _ in entries),
+                        max_bytes=self.max_bytes)
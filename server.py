@@ -8,15 +8,522 @@ import os
 import sys
 import time
 import json
+import queue
 import threading
-from flask import Flask, request, jsonify, send_file
-from upscale_app import upscale_video_with_realesrgan
+import itertools
+import collections
+from flask import Flask, Response, request, jsonify, send_file
+from upscale_app import (upscale_video_with_realesrgan, upscale_image_files, preview_video, preload_models,
+                         get_result_cache, get_processing_settings, get_video_info, PREVIEW_FRAMES)
+from job_store import JobStore, DB_PATH
+from job_metrics import JobProgress
 
 app = Flask(__name__)
 
-# In-memory job tracking
-jobs = {}
-job_counter = 0
+# Stats and progress of running jobs, updated by the pipeline as it goes and saved to the store when the job ends
+live_stats = {}
+live_progress = {}
+# Requests waiting for their image job to finish
+job_waiters = {}
+
+# Scheduler estimates
+DEFAULT_JOB_SECONDS = 60.0  # assumed job duration until jobs have finished to measure
+ESTIMATE_SMOOTHING = 0.2  # weight of the latest finished job in the running duration estimates
+
+# Server-Sent Events
+EVENT_QUEUE_SIZE = 100  # state events buffered per stream before the oldest are dropped
+PROGRESS_EVENT_INTERVAL = 1.0  # seconds between progress checks of a stream's running jobs
+EVENT_KEEPALIVE = 15.0  # seconds of silence before a stream sends a comment to keep proxies from closing it
+FINAL_STATUSES = ("completed", "failed")
+
+# Seconds /upscale/images holds the request open before answering 202 with the job ID to follow instead
+IMAGE_REQUEST_TIMEOUT = 120.0
+
+class JobQueue:
+    """
+    Fixed pool of execution slots fed by a priority, fair-share job queue.
+    
+    Each slot is a thread that runs one job at a time, so at most `slots`
+    jobs hold a model pipeline at once however many are submitted; the
+    rest wait in the queue and report their position. Slot threads start
+    with the first submitted job.
+    
+    A free slot takes a job from the first priority class that has any
+    waiting. Within the class it serves the client that has used the
+    least slot time for its weight, so one client's backlog cannot starve
+    the others; a client that goes idle and comes back starts level with
+    the least-served active client rather than with a credit. Each
+    client's own jobs run oldest first, or shortest estimated first with
+    shortest_first.
+    """
+    
+    def __init__(self, run, slots, max_queued=0, priorities=("normal",), client_weights=None,
+                 shortest_first=False):
+        """
+        Args:
+            run (callable): Called with a job ID to run the job
+            slots (int): Jobs run at the same time
+            max_queued (int): Jobs allowed to wait, 0 = unlimited
+            priorities (list): Priority class names, highest first
+            client_weights (dict): Share weight per client ID, 1 for clients not listed
+            shortest_first (bool): Order each client's jobs by estimated work instead of arrival
+        """
+        self.run = run
+        self.slots = max(1, int(slots))
+        self.max_queued = int(max_queued)
+        self.priorities = list(priorities)
+        self.client_weights = dict(client_weights or {})
+        self.shortest_first = shortest_first
+        self.pending = {}  # priority -> client -> job IDs in arrival order
+        self.queued = 0
+        self.jobs = {}  # job ID -> priority, client, work and submit time of a waiting or running job
+        self.running = {}
+        self.usage = collections.Counter()  # client -> weighted slot seconds of its finished jobs
+        self.class_counters = {}
+        self.client_counters = {}
+        self.seconds_per_work = None
+        self.default_seconds = DEFAULT_JOB_SECONDS
+        self.condition = threading.Condition()
+        self.threads = []
+        self.started = time.time()
+        self.busy_seconds = 0.0
+        self.finished = 0
+        self._sequence = itertools.count()
+        self._ordered = None  # predicted dispatch order, dropped whenever the queue changes
+        self._positions = {}
+    
+    def submit(self, job_id, priority, client_id, work=None, bounded=True):
+        """
+        Queue a job for the next free slot.
+        
+        Args:
+            job_id (int): Job to run
+            priority (str): Priority class, one of priorities
+            client_id (str): Client the job's slot time is accounted to
+            work (float): Estimated size of the job (megapixel-frames), None if unknown
+            bounded (bool): Refuse the job when max_queued jobs are already waiting
+        
+        Returns:
+            bool: False if the queue is full
+        """
+        if priority not in self.priorities:
+            raise ValueError(f"Unknown priority: {priority}")
+        
+        with self.condition:
+            if bounded and self.max_queued and self.queued >= self.max_queued:
+                return False
+            
+            if not self._active(client_id):
+                # Start a returning client level with the active ones instead of with the credit it built up idle
+                usage = self._current_usage()
+                active = [usage[client] for client in self._active_clients()]
+                if active:
+                    self.usage[client_id] = max(self.usage[client_id], min(active))
+            
+            self.jobs[job_id] = {"priority": priority, "client_id": client_id, "work": work,
+                                 "submitted": time.time(), "sequence": next(self._sequence)}
+            self.pending.setdefault(priority, {}).setdefault(client_id, []).append(job_id)
+            self.queued += 1
+            self._ordered = None
+            self.class_counters.setdefault(priority, {"dispatched": 0, "finished": 0, "wait_seconds": 0.0})
+            self.client_counters.setdefault(client_id, {"finished": 0, "busy_seconds": 0.0})
+            
+            while len(self.threads) < self.slots:
+                thread = threading.Thread(target=self._run_slot, daemon=True)
+                thread.start()
+                self.threads.append(thread)
+            self.condition.notify()
+        return True
+    
+    def _weight(self, client_id):
+        return float(self.client_weights.get(client_id, 1.0))
+    
+    def _active(self, client_id):
+        return (any(client_id in clients for clients in self.pending.values()) or
+                any(self.jobs[job_id]["client_id"] == client_id for job_id in self.running))
+    
+    def _active_clients(self):
+        clients = {client for waiting in self.pending.values() for client in waiting}
+        clients.update(self.jobs[job_id]["client_id"] for job_id in self.running)
+        return clients
+    
+    def _current_usage(self):
+        """Weighted slot seconds per client, counting the time its running jobs have had so far."""
+        usage = collections.Counter(self.usage)
+        now = time.time()
+        for job_id, started in self.running.items():
+            client_id = self.jobs[job_id]["client_id"]
+            usage[client_id] += (now - started) / self._weight(client_id)
+        return usage
+    
+    def _estimate(self, job_id):
+        """Estimated seconds a job will take, from its work and the rate measured on finished jobs."""
+        work = self.jobs[job_id]["work"]
+        if work is None or self.seconds_per_work is None:
+            return self.default_seconds
+        return work * self.seconds_per_work
+    
+    def _select(self, pending, usage):
+        """Pick the next job from pending under the given client usage, or None if nothing waits."""
+        for priority in self.priorities:
+            clients = pending.get(priority)
+            if not clients:
+                continue
+            client_id = min(clients, key=lambda client: (usage[client], self.jobs[clients[client][0]]["sequence"]))
+            waiting = clients[client_id]
+            if self.shortest_first:
+                return min(waiting, key=lambda job_id: (self._estimate(job_id), self.jobs[job_id]["sequence"]))
+            return waiting[0]
+        return None
+    
+    @staticmethod
+    def _remove(pending, job_id, job):
+        clients = pending[job["priority"]]
+        clients[job["client_id"]].remove(job_id)
+        if not clients[job["client_id"]]:
+            del clients[job["client_id"]]
+    
+    def _order(self):
+        """
+        Predict the order waiting jobs will run in.
+        
+        Replays the scheduler, charging each job its estimated time to its
+        client, so jobs that arrive later can still change the order. The
+        replay is kept until a job is submitted, dispatched or finishes, so
+        status polls between those changes cost a lookup rather than a
+        replay under the queue lock. Call with the condition held.
+        """
+        if self._ordered is None:
+            pending = {priority: {client: list(ids) for client, ids in clients.items()}
+                       for priority, clients in self.pending.items()}
+            usage = self._current_usage()
+            order = []
+            for _ in range(self.queued):
+                job_id = self._select(pending, usage)
+                job = self.jobs[job_id]
+                self._remove(pending, job_id, job)
+                usage[job["client_id"]] += self._estimate(job_id) / self._weight(job["client_id"])
+                order.append(job_id)
+            self._ordered = order
+            self._positions = {job_id: index + 1 for index, job_id in enumerate(order)}
+        return self._ordered
+    
+    def position(self, job_id):
+        """Return a queued job's predicted 1-based position, or None if it is not waiting."""
+        with self.condition:
+            self._order()
+            return self._positions.get(job_id)
+    
+    def job_ids(self):
+        """IDs of the waiting and running jobs."""
+        with self.condition:
+            return sorted(self.jobs)
+    
+    def stats(self):
+        """Slot and queue occupancy, plus how busy the slots have been since startup, by class and client."""
+        with self.condition:
+            now = time.time()
+            capacity = (now - self.started) * self.slots
+            busy = self.busy_seconds + sum(now - started for started in self.running.values())
+            usage = self._current_usage()
+            
+            classes = {}
+            for priority in self.priorities:
+                counters = self.class_counters.get(priority, {"dispatched": 0, "finished": 0, "wait_seconds": 0.0})
+                classes[priority] = {
+                    "queued": sum(len(ids) for ids in self.pending.get(priority, {}).values()),
+                    "running": sum(1 for job_id in self.running if self.jobs[job_id]["priority"] == priority),
+                    "finished": counters["finished"],
+                    "average_wait_seconds": (round(counters["wait_seconds"] / counters["dispatched"], 3)
+                                             if counters["dispatched"] else 0.0)
+                }
+            
+            clients = {}
+            for client_id, counters in self.client_counters.items():
+                client_busy = counters["busy_seconds"] + sum(
+                    now - started for job_id, started in self.running.items()
+                    if self.jobs[job_id]["client_id"] == client_id)
+                clients[client_id] = {
+                    "weight": self._weight(client_id),
+                    "queued": sum(len(waiting.get(client_id, ())) for waiting in self.pending.values()),
+                    "running": sum(1 for job_id in self.running if self.jobs[job_id]["client_id"] == client_id),
+                    "finished": counters["finished"],
+                    "busy_seconds": round(client_busy, 3),
+                    "busy_share": round(client_busy / busy, 3) if busy > 0 else 0.0,
+                    "weighted_usage": round(usage[client_id], 3)
+                }
+            
+            return {
+                "slots": self.slots,
+                "running": len(self.running),
+                "queued": self.queued,
+                "max_queued": self.max_queued,
+                "slot_utilization": len(self.running) / self.slots,
+                "busy_utilization": round(busy / capacity, 3) if capacity > 0 else 0.0,
+                "finished": self.finished,
+                "shortest_first": self.shortest_first,
+                "running_jobs": sorted(self.running),
+                "queued_jobs": list(self._order()),
+                "classes": classes,
+                "clients": clients
+            }
+    
+    def _run_slot(self):
+        while True:
+            with self.condition:
+                while not self.queued:
+                    self.condition.wait()
+                job_id = self._select(self.pending, self._current_usage())
+                job = self.jobs[job_id]
+                self._remove(self.pending, job_id, job)
+                self.queued -= 1
+                self._ordered = None
+                self.running[job_id] = time.time()
+                counters = self.class_counters[job["priority"]]
+                counters["dispatched"] += 1
+                counters["wait_seconds"] += self.running[job_id] - job["submitted"]
+            
+            try:
+                self.run(job_id)
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}")
+            finally:
+                with self.condition:
+                    seconds = time.time() - self.running.pop(job_id)
+                    job = self.jobs.pop(job_id)
+                    client_id = job["client_id"]
+                    self.busy_seconds += seconds
+                    self.finished += 1
+                    self.usage[client_id] += seconds / self._weight(client_id)
+                    self._ordered = None
+                    self.class_counters[job["priority"]]["finished"] += 1
+                    self.client_counters[client_id]["finished"] += 1
+                    self.client_counters[client_id]["busy_seconds"] += seconds
+                    # Learn how long a unit of work takes, for estimates of the jobs still waiting
+                    self.default_seconds += ESTIMATE_SMOOTHING * (seconds - self.default_seconds)
+                    if job["work"]:
+                        rate = seconds / job["work"]
+                        if self.seconds_per_work is None:
+                            self.seconds_per_work = rate
+                        else:
+                            self.seconds_per_work += ESTIMATE_SMOOTHING * (rate - self.seconds_per_work)
+
+class JobEvents:
+    """
+    Fan-out of job state changes to Server-Sent Events streams.
+    
+    Each stream subscribes with a bounded queue, for one job or for all
+    jobs. Publishing never blocks a job: a stream that falls behind loses
+    its oldest buffered events. Progress is not published here; streams
+    sample the live progress of their jobs instead, so the pipeline's
+    per-batch updates stay free of any fan-out cost.
+    """
+    
+    def __init__(self, max_pending=EVENT_QUEUE_SIZE):
+        """
+        Args:
+            max_pending (int): Events buffered per stream
+        """
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.subscribers = {}
+    
+    def subscribe(self, job_id=None):
+        """
+        Start receiving events.
+        
+        Args:
+            job_id (int): Job to follow, None for every job
+        
+        Returns:
+            queue.Queue: Receives (event, data) tuples
+        """
+        events = queue.Queue(maxsize=self.max_pending)
+        with self.lock:
+            self.subscribers[events] = job_id
+        return events
+    
+    def unsubscribe(self, events):
+        with self.lock:
+            self.subscribers.pop(events, None)
+    
+    def has_subscribers(self, job_id):
+        with self.lock:
+            return any(wanted is None or wanted == job_id for wanted in self.subscribers.values())
+    
+    def publish(self, job_id, event, data):
+        """Queue an event for every stream following job_id."""
+        with self.lock:
+            targets = [events for events, wanted in self.subscribers.items() if wanted is None or wanted == job_id]
+        for events in targets:
+            while True:
+                try:
+                    events.put_nowait((event, data))
+                    break
+                except queue.Full:
+                    try:
+                        events.get_nowait()
+                    except queue.Empty:
+                        pass
+
+job_events = JobEvents()
+
+def publish_job_state(job_id):
+    """Send a job's current record to the event streams following it."""
+    if not job_events.has_subscribers(job_id):
+        return
+    job = job_store.get(job_id)
+    if job is not None:
+        job_events.publish(job_id, "state", job_response(job_id, job))
+
+def run_job(job_id):
+    """Run a queued job in the calling slot and record how it ended."""
+    job = job_store.get(job_id)
+    stats = live_stats[job_id] = {}
+    progress = live_progress[job_id] = JobProgress()
+    progress.set_stage("starting")
+    job_store.update(job_id, status="processing", start_time=time.time())
+    publish_job_state(job_id)
+    
+    outcome = {}
+    try:
+        options = job["options"]
+        if job["type"] == "upscale":
+            success, metrics = upscale_video_with_realesrgan(job["input_path"], job["output_path"], job["settings"],
+                                                             stats, resume=options.get("resume", False),
+                                                             return_metrics=True, progress=progress)
+            outcome["metrics"] = metrics.report()
+        elif job["type"] == "preview":
+            success = preview_video(job["input_path"], job["output_path"], job["settings"],
+                                    options.get("frames", PREVIEW_FRAMES), options.get("seconds", 0), stats, progress)
+        elif job["type"] == "images":
+            success = upscale_image_files(job["input_path"], job["output_path"], job["settings"], stats, progress)
+        else:
+            raise Exception(f"Unknown job type: {job['type']}")
+        outcome["status"] = "completed" if success else "failed"
+        
+    except Exception as e:
+        outcome["status"] = "failed"
+        outcome["error"] = str(e)
+    finally:
+        progress.set_stage(outcome.get("status", "failed"))
+        job_store.update(job_id, stats=stats, progress=progress.snapshot(), end_time=time.time(), **outcome)
+        live_stats.pop(job_id, None)
+        live_progress.pop(job_id, None)
+        publish_job_state(job_id)
+        waiter = job_waiters.pop(job_id, None)
+        if waiter is not None:
+            waiter.set()
+
+# Jobs are stored in SQLite and run in a fixed number of slots, both configured in config.json
+processing_settings = get_processing_settings()
+# Without an explicit path the database sits in temp_dir next to the segment checkpoints it resumes from
+job_store = JobStore(processing_settings["job_db_path"]
+                     or (os.path.join(processing_settings["temp_dir"], 'jobs.db') if processing_settings["temp_dir"]
+                         else DB_PATH))
+job_queue = JobQueue(run_job, processing_settings["job_slots"], processing_settings["max_queued_jobs"],
+                     processing_settings["priority_classes"], processing_settings["client_weights"],
+                     processing_settings["shortest_job_first"])
+
+def get_job_owner(data, default_priority=None):
+    """
+    Read the priority class and client ID of a job request.
+    
+    The client ID comes from the body, then the X-Client-ID header, then
+    the caller's address.
+    
+    Args:
+        data (dict): Request body
+        default_priority (str): Class for requests without one, None for default_priority
+    
+    Returns:
+        tuple: (priority, client_id); priority is None if it is not a configured class
+    """
+    priority = data.get('priority', default_priority or processing_settings["default_priority"])
+    client_id = data.get('client_id') or request.headers.get('X-Client-ID') or request.remote_addr
+    return (priority if priority in job_queue.priorities else None), str(client_id)
+
+def invalid_priority_response():
+    """Build the 400 response for a priority that is not a configured class."""
+    return jsonify({"error": "Unknown priority", "priorities": job_queue.priorities}), 400
+
+def estimate_job_work(job_type, input_path, options):
+    """
+    Estimate the size of a job in megapixel-frames for shortest-job-first ordering.
+    
+    Returns:
+        float: Estimated work, or None if the input could not be measured
+    """
+    try:
+        if job_type == "images":
+            from PIL import Image
+            work = 0
+            for path in input_path:
+                with Image.open(path) as image:
+                    work += image.width * image.height
+            return work / 1e6
+        
+        info = get_video_info(input_path)
+        frames = info["frame_count"]
+        if job_type == "preview":
+            seconds = options.get("seconds", 0)
+            frames = min(frames, int(seconds * info["fps"])) if seconds > 0 else options.get("frames", PREVIEW_FRAMES)
+        return frames * info["width"] * info["height"] / 1e6
+    except Exception as e:
+        print(f"Could not estimate job size of {input_path}: {e}")
+        return None
+
+def create_job(job_type, input_path, output_path, settings, options=None, priority=None, client_id=None):
+    """Record a queued job and return its ID."""
+    options = dict(options or {})
+    options["work"] = estimate_job_work(job_type, input_path, options)
+    return job_store.create(job_type, input_path, output_path, settings, options, priority, client_id)
+
+def submit_job(job_id, bounded=True):
+    """Hand a stored job to the queue under its priority class and client."""
+    job = job_store.get(job_id)
+    priority = job["priority"] if job["priority"] in job_queue.priorities else processing_settings["default_priority"]
+    if not job_queue.submit(job_id, priority, job["client_id"] or "", job["options"].get("work"), bounded):
+        return False
+    publish_job_state(job_id)
+    return True
+
+def queue_full_response(job_id):
+    """Drop a job the queue could not take and build the 503 response."""
+    job_store.delete(job_id)
+    return jsonify({"error": "Job queue is full, retry later", "queue": job_queue.stats()}), 503
+
+def recover_jobs():
+    """
+    Queue again the jobs a previous server process left queued or processing.
+    
+    Interrupted upscale jobs resume from their checkpointed segments. Image
+    jobs are marked failed, since the request waiting for them is gone.
+    
+    Returns:
+        int: Number of jobs queued
+    """
+    queued = 0
+    for job_id in job_store.requeue_interrupted():
+        job = job_store.get(job_id)
+        if job["type"] == "images":
+            job_store.update(job_id, status="failed", error="Interrupted by a server restart", end_time=time.time())
+            publish_job_state(job_id)
+            continue
+        if job["type"] == "upscale":
+            job_store.update(job_id, options=dict(job["options"], resume=True))
+        submit_job(job_id, bounded=False)
+        queued += 1
+    return queued
+
+# Per-job overrides accepted on /upscale (defaults come from config.json)
+JOB_SETTING_KEYS = ("denoise_strength", "upscale_factor", "target_width", "target_height", "max_dimension",
+                    "face_enhancement", "batch_size", "tile_size", "tile_overlap", "memory_budget_mb",
+                    "video_codec", "crf", "preset",
+                    "copy_audio", "skip_duplicate_frames", "duplicate_threshold", "face_gating",
+                    "face_detect_interval", "face_batch_size", "precision",
+                    "inference_backend", "inference_threads", "temporal_delta", "delta_tile_size",
+                    "delta_threshold", "delta_refresh_interval")
 
 @app.route('/upscale', methods=['POST'])
 def upscale_video():
@@ -26,17 +533,79 @@ def upscale_video():
     Expected JSON payload:
     {
         "input_path": "/path/to/input/video.mp4",
-        "output_path": "/path/to/output/video.mp4"
+        "output_path": "/path/to/output/video.mp4",
+        "batch_size": 8,  (optional, any of JOB_SETTING_KEYS)
+        "resume": true,  (optional, continue from checkpointed segments of an earlier run)
+        "priority": "high",  (optional, one of processing_settings.priority_classes)
+        "client_id": "studio-a"  (optional, defaults to the X-Client-ID header or the caller's address)
     }
     
     Returns:
     {
         "job_id": 123,
-        "status": "processing"
+        "status": "queued",
+        "queue_position": 1
     }
     """
-    global job_counter
+    try:
+        data = request.get_json()
+        input_path = data.get('input_path')
+        output_path = data.get('output_path')
+        
+        if not input_path or not output_path:
+            return jsonify({"error": "Missing input_path or output_path"}), 400
+        
+        if not os.path.exists(input_path):
+            return jsonify({"error": "Input file not found"}), 404
+        
+        priority, client_id = get_job_owner(data)
+        if priority is None:
+            return invalid_priority_response()
+        
+        settings = {key: data[key] for key in JOB_SETTING_KEYS if key in data}
+        resume = bool(data.get('resume', False))
+        
+        # Create a new job and wait for a free slot
+        job_id = create_job("upscale", input_path, output_path, settings, {"resume": resume}, priority, client_id)
+        if not submit_job(job_id):
+            return queue_full_response(job_id)
+        
+        return jsonify({
+            "job_id": job_id,
+            "status": "queued",
+            "queue_position": job_queue.position(job_id)
+        }), 202
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/preview', methods=['POST'])
+def preview_video_job():
+    """
+    Upscale a few frames of a video to check quality before the full job.
+    
+    The preview's frames are kept, and a later /upscale job of the same
+    input with the same settings reuses them. Previews are small and
+    someone is usually waiting on them, so without a priority they go in
+    the highest class and start ahead of queued full jobs.
+    
+    Expected JSON payload:
+    {
+        "input_path": "/path/to/input/video.mp4",
+        "output_path": "/path/to/preview.jpg",  (image = contact sheet, video = clip)
+        "frames": 8,  (optional, evenly spaced frames to sample)
+        "seconds": 5,  (optional, upscale the first seconds instead of sampling)
+        "batch_size": 8,  (optional, any of JOB_SETTING_KEYS)
+        "priority": "normal"  (optional, priority and client_id as for /upscale; default: highest class)
+    }
     
+    Returns:
+    {
+        "job_id": 124,
+        "status": "queued",
+        "queue_position": 1
+    }
+    """
     try:
         data = request.get_json()
         input_path = data.get('input_path')
@@ -48,66 +617,286 @@ def upscale_video():
         if not os.path.exists(input_path):
             return jsonify({"error": "Input file not found"}), 404
         
-        # Create a new job
-        job_counter += 1
-        job_id = job_counter
+        priority, client_id = get_job_owner(data, job_queue.priorities[0])
+        if priority is None:
+            return invalid_priority_response()
         
-        jobs[job_id] = {
-            "status": "processing",
-            "input_path": input_path,
-            "output_path": output_path,
-            "start_time": time.time()
-        }
+        settings = {key: data[key] for key in JOB_SETTING_KEYS if key in data}
+        frames = int(data.get('frames', PREVIEW_FRAMES))
+        seconds = float(data.get('seconds', 0))
         
-        # Process in background
-        thread = threading.Thread(target=process_upscale_job, args=(job_id, input_path, output_path))
-        thread.daemon = True
-        thread.start()
+        job_id = create_job("preview", input_path, output_path, settings, {"frames": frames, "seconds": seconds},
+                            priority, client_id)
+        if not submit_job(job_id):
+            return queue_full_response(job_id)
         
         return jsonify({
             "job_id": job_id,
-            "status": "processing"
+            "status": "queued",
+            "queue_position": job_queue.position(job_id)
         }), 202
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-def process_upscale_job(job_id, input_path, output_path):
-    """Process the upscaling job in background."""
+@app.route('/upscale/images', methods=['POST'])
+def upscale_images():
+    """
+    Upscale a set of still images and wait for the result.
+    
+    Images share the preloaded model and are batched together; no video
+    is encoded. The request runs as a job in the same queue as videos and
+    returns once it has finished, or after IMAGE_REQUEST_TIMEOUT seconds
+    with 202 and the job ID to poll on /job/<job_id> or follow on
+    /job/<job_id>/events. Give either output_paths (one per input) or
+    output_dir (outputs keep their input file names).
+    
+    Expected JSON payload:
+    {
+        "input_paths": ["/path/to/a.png", "/path/to/b.jpg"],
+        "output_dir": "/path/to/output",
+        "batch_size": 8,  (optional, any of JOB_SETTING_KEYS)
+        "priority": "high"  (optional, priority and client_id as for /upscale)
+    }
+    
+    Returns:
+    {
+        "job_id": 125,
+        "status": "completed",
+        "output_paths": ["/path/to/output/a.png", "/path/to/output/b.jpg"],
+        "duration": 1.23,
+        "stats": {...}
+    }
+    or, if it is still queued or running when the wait times out, the
+    /job/<job_id> view of it with status 202.
+    """
     try:
-        success = upscale_video_with_realesrgan(input_path, output_path)
+        data = request.get_json()
+        input_paths = data.get('input_paths') or []
+        output_paths = data.get('output_paths')
+        output_dir = data.get('output_dir')
+        
+        if not input_paths or not (output_paths or output_dir):
+            return jsonify({"error": "Missing input_paths or output_paths/output_dir"}), 400
+        
+        if output_paths is None:
+            output_paths = [os.path.join(output_dir, os.path.basename(path)) for path in input_paths]
+        elif len(output_paths) != len(input_paths):
+            return jsonify({"error": "input_paths and output_paths differ in length"}), 400
         
-        jobs[job_id]["status"] = "completed" if success else "failed"
-        jobs[job_id]["end_time"] = time.time()
+        missing = [path for path in input_paths if not os.path.exists(path)]
+        if missing:
+            return jsonify({"error": "Input file not found", "missing": missing}), 404
+        
+        priority, client_id = get_job_owner(data)
+        if priority is None:
+            return invalid_priority_response()
+        
+        settings = {key: data[key] for key in JOB_SETTING_KEYS if key in data}
+        job_id = create_job("images", input_paths, output_paths, settings, priority=priority, client_id=client_id)
+        done = job_waiters[job_id] = threading.Event()
+        if not submit_job(job_id):
+            job_waiters.pop(job_id, None)
+            return queue_full_response(job_id)
+        if not done.wait(IMAGE_REQUEST_TIMEOUT):
+            job_waiters.pop(job_id, None)
+            job = job_store.get(job_id)
+            if job["status"] not in FINAL_STATUSES:
+                return jsonify(job_response(job_id, job)), 202
+        
+        job = job_store.get(job_id)
+        success = job["status"] == "completed"
+        return jsonify({
+            "job_id": job_id,
+            "status": job["status"],
+            "output_paths": output_paths,
+            "duration": job["end_time"] - job["start_time"],
+            "stats": job["stats"]
+        }), 200 if success else 500
         
     except Exception as e:
-        jobs[job_id]["status"] = "failed"
-        jobs[job_id]["error"] = str(e)
-        jobs[job_id]["end_time"] = time.time()
+        return jsonify({"error": str(e)}), 500
 
-@app.route('/job/<int:job_id>', methods=['GET'])
-def get_job_status(job_id):
-    """Get the status of an upscaling job."""
-    if job_id not in jobs:
+@app.route('/job/<int:job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    """Restart a failed job, reusing the segments it already completed."""
+    job = job_store.get(job_id)
+    if job is None:
         return jsonify({"error": "Job not found"}), 404
     
-    job = jobs[job_id]
+    if job["type"] != "upscale":
+        return jsonify({"error": "Only upscale jobs can be resumed"}), 409
+    if job["status"] != "failed":
+        return jsonify({"error": f"Only failed jobs can be resumed (status: {job['status']})"}), 409
+    
+    job_store.update(job_id, status="queued", stats={}, options=dict(job["options"], resume=True),
+                     queued_time=time.time(), metrics=None, progress=None, error=None, start_time=None,
+                     end_time=None)
+    
+    if not submit_job(job_id):
+        error = "Job queue is full, retry later"
+        job_store.update(job_id, status="failed", error=error)
+        publish_job_state(job_id)
+        return jsonify({"error": error, "queue": job_queue.stats()}), 503
+    
+    return jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "queue_position": job_queue.position(job_id)
+    }), 202
+
+def job_response(job_id, job):
+    """Build the public view of a job record, with live progress and stats while it runs."""
     response = {
         "job_id": job_id,
-        "status": job["status"]
+        "type": job["type"],
+        "status": job["status"],
+        "priority": job["priority"],
+        "client_id": job["client_id"]
     }
     
-    if "error" in job:
+    if job["error"] is not None:
         response["error"] = job["error"]
     
-    if "start_time" in job:
+    if job["status"] == "queued":
+        response["queue_position"] = job_queue.position(job_id)
+    
+    if job["queued_time"] is not None:
+        response["queued_time"] = job["queued_time"]
+    
+    if job["start_time"] is not None:
         response["start_time"] = job["start_time"]
     
-    if "end_time" in job:
+    if job["end_time"] is not None:
         response["end_time"] = job["end_time"]
-        response["duration"] = job["end_time"] - job["start_time"]
+        if job["start_time"] is not None:
+            response["duration"] = job["end_time"] - job["start_time"]
+    
+    progress = live_progress.get(job_id)
+    progress = progress.snapshot() if progress is not None else job["progress"]
+    if progress:
+        response["progress"] = progress
+    
+    stats = live_stats.get(job_id, job["stats"])
+    if stats:
+        response["stats"] = stats
+    
+    if job.get("metrics"):
+        response["metrics"] = job["metrics"]
+    
+    return response
+
+def format_event(event, data):
+    """Encode one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def event_stream(job_id=None):
+    """
+    Yield Server-Sent Events for one job, or for every job when job_id is None.
+    
+    A stream starts with a state event for the job (or for each waiting and
+    running job), then sends a state event whenever a job changes status
+    and a progress event when a running job has advanced, checked every
+    PROGRESS_EVENT_INTERVAL seconds. A single-job stream ends after the
+    job's final state.
+    """
+    events = job_events.subscribe(job_id)
+    try:
+        yield "retry: 3000\n\n"
+        initial = [job_id] if job_id is not None else job_queue.job_ids()
+        for current_id in initial:
+            job = job_store.get(current_id)
+            if job is None:
+                continue
+            yield format_event("state", job_response(current_id, job))
+            if job_id is not None and job["status"] in FINAL_STATUSES:
+                return
+        
+        progress_seen = {}
+        last_sent = time.time()
+        while True:
+            try:
+                event, data = events.get(timeout=PROGRESS_EVENT_INTERVAL)
+            except queue.Empty:
+                event = None
+            if event is not None:
+                yield format_event(event, data)
+                last_sent = time.time()
+                if job_id is not None and event == "state" and data["status"] in FINAL_STATUSES:
+                    return
+            
+            running = live_progress.items() if job_id is None else [(job_id, live_progress.get(job_id))]
+            for current_id, progress in list(running):
+                if progress is None or progress.updated == progress_seen.get(current_id):
+                    continue
+                progress_seen[current_id] = progress.updated
+                yield format_event("progress", dict(progress.snapshot(), job_id=current_id))
+                last_sent = time.time()
+            for finished_id in [current_id for current_id in progress_seen if current_id not in live_progress]:
+                del progress_seen[finished_id]
+            
+            if time.time() - last_sent >= EVENT_KEEPALIVE:
+                yield ": keepalive\n\n"
+                last_sent = time.time()
+    finally:
+        job_events.unsubscribe(events)
+
+def event_stream_response(stream):
+    """Wrap an event generator in an unbuffered text/event-stream response."""
+    return Response(stream, mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/job/<int:job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Get the status of an upscaling job."""
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    return jsonify(job_response(job_id, job))
+
+@app.route('/job/<int:job_id>/events', methods=['GET'])
+def get_job_events(job_id):
+    """Stream a job's state changes and progress as Server-Sent Events until it finishes."""
+    if job_store.get(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    return event_stream_response(event_stream(job_id))
+
+@app.route('/events', methods=['GET'])
+def get_all_events():
+    """Stream state changes and progress of every job as Server-Sent Events."""
+    return event_stream_response(event_stream())
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """
+    Count jobs by status and list the IDs of jobs in one status.
     
-    return jsonify(response)
+    Query parameters:
+        status: Status to list (default "queued")
+        limit: Maximum IDs returned (default 100)
+    """
+    status = request.args.get('status', 'queued')
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({
+        "counts": job_store.counts(),
+        "status": status,
+        "job_ids": job_store.ids_with_status(status, limit)
+    })
+
+@app.route('/cache', methods=['GET'])
+def get_cache_stats():
+    """Result cache hit/miss counters and disk usage."""
+    cache = get_result_cache()
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(cache.stats(), enabled=True))
+
+@app.route('/queue', methods=['GET'])
+def get_queue_stats():
+    """Job queue length and execution slot utilization."""
+    return jsonify(job_queue.stats())
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -118,8 +907,25 @@ if __name__ == '__main__':
     print("Starting Video Upscaling Server...")
     print("Endpoints:")
     print("  POST /upscale - Submit upscaling job")
+    print("  POST /preview - Submit a quick preview of sampled frames")
+    print("  POST /upscale/images - Upscale still images (waits for the result)")
     print("  GET /job/<id> - Check job status")
+    print("  GET /job/<id>/events - Stream job state and progress (Server-Sent Events)")
+    print("  GET /events - Stream state and progress of all jobs (Server-Sent Events)")
+    print("  GET /jobs?status=<status> - Count jobs and list them by status")
+    print("  POST /job/<id>/resume - Resume a failed job")
+    print("  GET /queue - Job queue and slot utilization")
+    print("  GET /cache - Result cache statistics")
     print("  GET /health - Health check")
     
-    # Run the server
-    app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
+    # Load the model once; every job thread reuses it
+    print("Preloading upscaling models...")
+    preload_models()
+    
+    # Pick up the jobs a previous run left unfinished
+    recovered = recover_jobs()
+    if recovered:
+        print(f"Requeued {recovered} unfinished jobs")
+    
+    # Run the server; threaded so open event streams do not hold up other requests
+    app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
\ No newline at end of file
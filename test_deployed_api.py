@@ -6,6 +6,7 @@ Test script for deployed Vast.ai API
 import os
 import sys
 import time
+import json
 import requests
 import argparse
 
@@ -61,32 +62,89 @@ def check_job_status(api_url, job_id):
         print(f"❌ Failed to check job status: {e}")
         return None, {}
 
+def report_job_state(status, details):
+    """Print a job's state; return True/False once it has finished, None while it runs."""
+    if status == "completed":
+        print("✅ Job completed successfully!")
+        if details and "duration" in details:
+            print(f"Processing time: {details['duration']:.2f} seconds")
+        return True
+        
+    elif status == "failed":
+        print("❌ Job failed!")
+        if details and "error" in details:
+            print(f"Error: {details['error']}")
+        return False
+        
+    elif status == "queued":
+        print(f"Job is queued (position {details.get('queue_position')})...")
+        
+    elif status == "processing":
+        print_job_progress(details.get("progress") or {})
+    return None
+
+def print_job_progress(progress):
+    """Print a progress snapshot of a processing job."""
+    if progress.get("percent") is not None:
+        eta = progress.get("eta_seconds")
+        print(f"Job is processing: {progress['stage']} {progress['percent']:.1f}% "
+              f"({progress.get('fps') or 0:.1f} fps, ETA {f'{eta:.0f}s' if eta is not None else 'unknown'})...")
+    else:
+        print("Job is still processing...")
+
+def wait_for_job_events(api_url, job_id, timeout=300):
+    """
+    Follow a job's Server-Sent Events stream until it finishes.
+    
+    Returns:
+        bool: Whether the job completed, or None if the stream is unavailable
+    """
+    start_time = time.time()
+    try:
+        response = requests.get(f"{api_url}/job/{job_id}/events", stream=True, timeout=(10, timeout))
+        if response.status_code != 200:
+            return None
+        
+        event = None
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if time.time() - start_time > timeout:
+                    print("⏰ Timeout waiting for job completion")
+                    return False
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    details = json.loads(line[len("data:"):])
+                    if event == "progress":
+                        print_job_progress(details)
+                        continue
+                    result = report_job_state(details.get("status"), details)
+                    if result is not None:
+                        return result
+        return None
+    except Exception as e:
+        print(f"Event stream unavailable ({e}), polling instead")
+        return None
+
 def wait_for_job_completion(api_url, job_id, timeout=300):
-    """Wait for job to complete."""
+    """Wait for job to complete, following its event stream or polling if the server has none."""
     print(f"Waiting for job {job_id} to complete...")
     start_time = time.time()
     
+    result = wait_for_job_events(api_url, job_id, timeout)
+    if result is not None:
+        return result
+    
     while time.time() - start_time < timeout:
         status, details = check_job_status(api_url, job_id)
         
         if status is None:
             return False
-            
-        if status == "completed":
-            print("✅ Job completed successfully!")
-            if details and "duration" in details:
-                print(f"Processing time: {details['duration']:.2f} seconds")
-            return True
-            
-        elif status == "failed":
-            print("❌ Job failed!")
-            if details and "error" in details:
-                print(f"Error: {details['error']}")
-            return False
-            
-        elif status == "processing":
-            print("Job is still processing...")
-            
+        
+        result = report_job_state(status, details)
+        if result is not None:
+            return result
+        
         time.sleep(10)
     
     print("⏰ Timeout waiting for job completion")
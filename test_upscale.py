@@ -5,6 +5,7 @@ Test script for Video Upscaling Application
 
 import os
 import sys
+import shutil
 import tempfile
 import cv2
 import numpy as np
@@ -70,5 +71,207 @@ def test_upscale_app():
     
     return True
 
+def test_onnx_backend_matches_torch(tolerance=2):
+    """Test that the ONNX Runtime backend reproduces the torch backend output."""
+    print("Testing ONNX Runtime backend against torch...")
+    
+    try:
+        from upscale_app import RealESRGANModel, MODEL_PATH
+        
+        # Textured frames exercise the whole network better than flat colour
+        rng = np.random.RandomState(0)
+        frames = [cv2.GaussianBlur(rng.randint(0, 256, (48, 64, 3), dtype=np.uint8), (5, 5), 0) for _ in range(3)]
+        
+        torch_model = RealESRGANModel(MODEL_PATH, backend="torch", device="cpu", precision="fp32")
+        onnx_model = RealESRGANModel(MODEL_PATH, backend="onnxruntime")
+        
+        for tile_size in (0, 32):
+            expected = torch_model.enhance_batch(frames, tile_size=tile_size)
+            actual = onnx_model.enhance_batch(frames, tile_size=tile_size)
+            diff = max(int(np.abs(e.astype(np.int16) - a.astype(np.int16)).max()) for e, a in zip(expected, actual))
+            if diff > tolerance:
+                print(f"❌ ONNX output differs from torch by {diff} (tile_size={tile_size})")
+                return False
+        
+        print("✅ ONNX backend test passed!")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error during ONNX backend test: {e}")
+        return False
+
+def test_tiled_forward_stays_within_batch():
+    """Test that tiled upscaling never runs more tiles per forward pass than the batch it was planned for."""
+    print("Testing tiles per forward pass...")
+    
+    try:
+        from upscale_app import RealESRGANModel
+        
+        class RecordingBackend:
+            """Stands in for the network: records pass sizes and upscales by pixel repetition."""
+            def __init__(self):
+                self.passes = []
+            
+            def forward(self, imgs):
+                self.passes.append(len(imgs))
+                return [img.repeat(4, axis=0).repeat(4, axis=1) for img in imgs]
+        
+        model = RealESRGANModel.__new__(RealESRGANModel)
+        model.scale = 4
+        model.max_batch_size = 64
+        model.backend = RecordingBackend()
+        
+        frames = [np.full((200, 300, 3), i * 40, dtype=np.uint8) for i in range(4)]
+        for max_tiles, limit in ((0, len(frames)), (2, 2)):
+            model.backend.passes = []
+            outputs = model.enhance_batch(frames, tile_size=64, tile_overlap=8, max_tiles=max_tiles)
+            if max(model.backend.passes) > limit:
+                print(f"❌ Forward pass of {max(model.backend.passes)} tiles exceeds {limit}")
+                return False
+            if any(output.shape != (800, 1200, 3) or output.min() != i * 40 or output.max() != i * 40
+                   for i, output in enumerate(outputs)):
+                print("❌ Tiled output was not reassembled correctly")
+                return False
+        
+        print("✅ Tiled forward pass test passed!")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error during tiled forward pass test: {e}")
+        return False
+
+def test_mmap_store_keeps_shapes_apart():
+    """Test that frames of different shapes spilled to the arena tier never share storage."""
+    print("Testing memory-mapped frame arena...")
+    
+    try:
+        from frame_store import MmapFrameStore
+        
+        directory = tempfile.mkdtemp(prefix="test_arena_")
+        store = MmapFrameStore(directory, chunk_frames=1)
+        # Alternate two shapes so each gets several single-frame chunks
+        frames = {}
+        for i in range(6):
+            shape = (48, 64, 3) if i % 2 == 0 else (32, 40, 3)
+            frames[i] = np.random.randint(0, 256, shape, dtype=np.uint8)
+            store.put(i, frames[i])
+        
+        mismatched = [key for key, frame in frames.items() if not np.array_equal(store.get(key), frame)]
+        store.close()
+        shutil.rmtree(directory, ignore_errors=True)
+        if mismatched:
+            print(f"❌ Frames {mismatched} did not round-trip through the arena")
+            return False
+        
+        print("✅ Memory-mapped frame arena test passed!")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error during memory-mapped frame arena test: {e}")
+        return False
+
+def test_frame_store_tiers():
+    """Test that the frame store spills across its three tiers and gets every frame back intact."""
+    print("Testing frame store tiers...")
+    
+    try:
+        from frame_store import FrameStore
+        
+        # Room for two frames in memory and two in the arena; the rest are compressed
+        frame_mb = 48 * 64 * 3 / (1024 * 1024)
+        store = FrameStore(memory_budget_mb=2 * frame_mb, arena_budget_mb=2 * frame_mb,
+                           temp_dir=tempfile.gettempdir())
+        frames = {i: np.random.randint(0, 256, (48, 64, 3), dtype=np.uint8) for i in range(6)}
+        for key, frame in frames.items():
+            store.put(key, frame)
+        
+        stats = store.stats()
+        if [stats[name]["frames"] for name in ("memory", "mmap", "compressed")] != [2, 2, 2]:
+            print(f"❌ Frames were not spread over the tiers as budgeted: {stats}")
+            return False
+        if any(not np.array_equal(store.get(key), frame) for key, frame in frames.items()):
+            print("❌ A frame came back changed from get()")
+            return False
+        if any(not np.array_equal(store.pop(key), frames[key]) for key in (0, 2, 4)):
+            print("❌ A frame came back changed from pop()")
+            return False
+        if len(store) != 3 or any(key in store for key in (0, 2, 4)):
+            print("❌ Popped frames are still in the store")
+            return False
+        if [tier.nbytes for tier in store.tiers] != [frames[1].nbytes, frames[3].nbytes, store.tiers[2].files[5][3]]:
+            print("❌ Tier byte counts were not reduced by pop()")
+            return False
+        
+        # Freed memory budget is used again before spilling
+        store.put(6, frames[0])
+        if store.stats()["memory"]["frames"] != 3 or not np.array_equal(store.get(6), frames[0]):
+            print("❌ Freed memory budget was not reused")
+            return False
+        
+        directory = store.directory
+        store.close()
+        if len(store) or os.path.exists(directory):
+            print("❌ close() left frames or the spill directory behind")
+            return False
+        
+        print("✅ Frame store tier test passed!")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error during frame store tier test: {e}")
+        return False
+
+def test_job_queue_dispatch_order():
+    """Test that the job queue serves priority classes in order and shares a class fairly between clients."""
+    print("Testing job queue dispatch order...")
+    
+    try:
+        import threading
+        import time
+        from server import JobQueue
+        
+        dispatched = []
+        release = threading.Event()
+        finished = threading.Event()
+        
+        def run(job_id):
+            dispatched.append(job_id)
+            if job_id == 1:
+                # Hold the only slot while the rest are queued, so the order depends on the rules alone
+                release.wait(10)
+            if len(dispatched) == 6:
+                finished.set()
+        
+        job_queue = JobQueue(run, 1, priorities=("high", "normal", "low"))
+        job_queue.submit(1, "normal", "a")
+        while not dispatched:
+            time.sleep(0.01)
+        job_queue.submit(2, "normal", "a")
+        job_queue.submit(3, "low", "a")
+        job_queue.submit(4, "normal", "a")
+        job_queue.submit(5, "normal", "b")
+        job_queue.submit(6, "high", "b")
+        # Client a has now used a slot for a while and b has not, so b's normal job goes before a's backlog
+        time.sleep(0.2)
+        release.set()
+        finished.wait(10)
+        
+        expected = [1, 6, 5, 2, 4, 3]
+        if dispatched != expected:
+            print(f"❌ Jobs dispatched in order {dispatched}, expected {expected}")
+            return False
+        
+        print("✅ Job queue dispatch order test passed!")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error during job queue test: {e}")
+        return False
+
 if __name__ == "__main__":
-    test_upscale_app()
\ No newline at end of file
+    test_upscale_app()
+    test_onnx_backend_matches_torch()
+    test_tiled_forward_stays_within_batch()
+    test_job_queue_dispatch_order()
+    test_mmap_store_keeps_shapes_apart()
+    test_frame_store_tiers()
\ No newline at end of file
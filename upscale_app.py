@@ -6,18 +6,199 @@ A simplified application for video upscaling using realesr-general-x4v3 model.
 
 import os
 import sys
+import copy
 import time
 import subprocess
 import cv2
-import tempfile
-import shutil
+import numpy as np
 import json
+import queue
+import collections
+import hashlib
+import shutil
+import tempfile
+import functools
+import atexit
+import itertools
+import threading
+import multiprocessing
+import concurrent.futures
 from pathlib import Path
+from frame_store import FrameStore
+from result_cache import ResultCache, make_cache_key
+from job_metrics import JobMetrics, JobProgress, write_metrics_line
 
 # Configuration
 DENOISE_STRENGTH = 0.5
 UPSCALE_FACTOR = 4
+TARGET_WIDTH = 0  # output width in pixels instead of upscale_factor, 0 = unset
+TARGET_HEIGHT = 0  # output height in pixels instead of upscale_factor, 0 = unset
+MAX_DIMENSION = 0  # cap on the longest output side in pixels, 0 = no cap
 FACE_ENHANCEMENT = True
+BATCH_SIZE = 4
+TILE_SIZE = 0  # 0 disables tiling, "auto" picks the largest tile that fits in memory
+TILE_OVERLAP = 16
+MEMORY_BUDGET_MB = 0  # 0 measures free memory at job start
+IO_BACKEND = "ffmpeg"  # "ffmpeg" (rawvideo pipes, keeps audio) or "opencv"
+VIDEO_CODEC = "libx264"
+VIDEO_CRF = 18
+VIDEO_PRESET = "medium"
+ENCODER_THREADS = 0  # 0 lets the encoder use all cores
+SKIP_DUPLICATE_FRAMES = True
+DUPLICATE_THRESHOLD = 0.0  # mean abs difference of 32x32 thumbnails (0-255), 0 = exact matches only
+INFERENCE_BACKEND = "torch"  # "torch" or "onnxruntime" (CPU, exported once to models/*.onnx)
+INFERENCE_THREADS = 0  # intra-op threads for the onnxruntime backend, 0 = physical cores
+PRECISION = "auto"  # "auto" (fp16 on CUDA, fp32 on CPU), "fp32", "fp16", "bf16" or "int8" (CPU only)
+CALIBRATION_FRAMES = 8  # frames sampled across each input to calibrate int8 activation ranges
+CALIBRATION_CROP = 128  # edge of the crops cut from each calibration frame, in model input pixels
+TEMPORAL_DELTA = False  # only re-upscale tiles that changed since the previous frame
+DELTA_TILE_SIZE = 64  # tile edge in input pixels compared between frames
+DELTA_THRESHOLD = 2.0  # mean abs grayscale difference (0-255) above which a tile is re-upscaled
+DELTA_REFRESH_INTERVAL = 30  # upscale the whole frame every N frames to stop drift
+FACE_GATING = True  # only run GFPGAN on frames where a cheap detector finds faces
+FACE_DETECT_INTERVAL = 5  # run the detector every N frames and track boxes in between
+FACE_BATCH_SIZE = 8  # face crops per GFPGAN forward pass
+
+# Pipeline defaults, overridden by processing_settings in config.json
+PIPELINE_WORKERS = 2
+PIPELINE_QUEUE_SIZE = 4
+PIPELINE_ENGINE = "threads"  # "threads" or "processes" (inference worker processes fed through shared memory)
+PROCESS_WORKERS = 0  # inference processes for the "processes" engine, 0 = one per physical core
+SEGMENT_WORKERS = 1  # processes upscaling keyframe-aligned segments in parallel, 1 disables
+SEGMENT_SECONDS = 60
+TEMP_DIR = None  # None uses the system temp directory
+CHECKPOINT_SEGMENTS = False  # split long videos into segments and record their progress so interrupted jobs can resume
+FRAME_STORE_MEMORY_MB = 1024  # RAM for buffered out-of-order frames before spilling to disk
+FRAME_STORE_ARENA_MB = 4096  # memory-mapped arena before spilled frames are compressed
+FRAME_STORE_DIR = None  # spill location (e.g. a tmpfs mount), None uses temp_dir
+RESULT_CACHE_MB = 10240  # disk space for cached outputs of repeated requests, 0 disables the cache
+RESULT_CACHE_DIR = None  # None uses temp_dir/result_cache
+METRICS_LOG = None  # JSON-lines file every job appends its per-stage metrics to, None disables
+JOB_SLOTS = 1  # server jobs run at the same time, each with its own frame pipeline
+MAX_QUEUED_JOBS = 100  # server jobs allowed to wait for a slot, 0 = unlimited
+JOB_DB_PATH = None  # SQLite file the server keeps its jobs in, None uses jobs.db in temp_dir (next to the scripts without one)
+PRIORITY_CLASSES = ("high", "normal", "low")  # server job priority classes, highest first
+DEFAULT_PRIORITY = "normal"  # class of jobs submitted without a priority
+CLIENT_WEIGHTS = {}  # client ID -> share of slot time relative to other clients in a class, default 1
+SHORTEST_JOB_FIRST = False  # run each client's smallest estimated jobs first instead of oldest first
+
+# Preview defaults
+PREVIEW_FRAMES = 8  # evenly spaced frames sampled for a preview
+PREVIEW_CLIP_FPS = 1  # frame rate of a clip made from sampled frames
+PREVIEW_SHEET_CELL_WIDTH = 960  # widest a frame is drawn on a contact sheet
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json')
+MODEL_PATH = os.path.join('models', 'realesr-general-x4v3.pth')
+GFPGAN_MODEL_URL = "https://github.com/TencentARC/GFPGAN/releases/download/v1.3.0/GFPGANv1.3.pth"
+
+# Models stay loaded for the lifetime of the process and are shared by all jobs
+_model_cache = {}
+_model_cache_lock = threading.Lock()
+_face_enhancer_lock = threading.Lock()
+# Inference worker process groups are kept too; idle ones are lent to the next job that needs them
+_worker_groups = {}
+_worker_groups_lock = threading.Lock()
+
+def load_config(config_path=CONFIG_PATH):
+    """
+    Load application settings from config.json.
+    
+    Args:
+        config_path (str): Path to the JSON config file
+    
+    Returns:
+        dict: Parsed config, empty if the file is missing or invalid
+    """
+    try:
+        with open(config_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"Failed to load config {config_path}: {e}")
+        return {}
+
+def get_upscale_settings(overrides=None):
+    """
+    Resolve the effective upscale settings for a job.
+    
+    Module defaults are overridden by ``upscale_settings`` in config.json,
+    which are in turn overridden by per-job values.
+    
+    Args:
+        overrides (dict): Per-job settings; None values are ignored
+    
+    Returns:
+        dict: Effective settings
+    """
+    settings = {
+        "denoise_strength": DENOISE_STRENGTH,
+        "upscale_factor": UPSCALE_FACTOR,
+        "target_width": TARGET_WIDTH,
+        "target_height": TARGET_HEIGHT,
+        "max_dimension": MAX_DIMENSION,
+        "face_enhancement": FACE_ENHANCEMENT,
+        "batch_size": BATCH_SIZE,
+        "tile_size": TILE_SIZE,
+        "tile_overlap": TILE_OVERLAP,
+        "memory_budget_mb": MEMORY_BUDGET_MB,
+        "io_backend": IO_BACKEND,
+        "video_codec": VIDEO_CODEC,
+        "crf": VIDEO_CRF,
+        "preset": VIDEO_PRESET,
+        "encoder_threads": ENCODER_THREADS,
+        "copy_audio": True,
+        "skip_duplicate_frames": SKIP_DUPLICATE_FRAMES,
+        "duplicate_threshold": DUPLICATE_THRESHOLD,
+        "face_gating": FACE_GATING,
+        "face_detect_interval": FACE_DETECT_INTERVAL,
+        "face_batch_size": FACE_BATCH_SIZE,
+        "precision": PRECISION,
+        "inference_backend": INFERENCE_BACKEND,
+        "inference_threads": INFERENCE_THREADS,
+        "temporal_delta": TEMPORAL_DELTA,
+        "delta_tile_size": DELTA_TILE_SIZE,
+        "delta_threshold": DELTA_THRESHOLD,
+        "delta_refresh_interval": DELTA_REFRESH_INTERVAL
+    }
+    settings.update(load_config().get("upscale_settings", {}))
+    if overrides:
+        settings.update({key: value for key, value in overrides.items() if value is not None})
+    return settings
+
+def get_processing_settings():
+    """
+    Resolve host-level processing settings from config.json.
+    
+    Returns:
+        dict: Effective processing settings
+    """
+    settings = {
+        "max_workers": PIPELINE_WORKERS,
+        "decode_queue_size": PIPELINE_QUEUE_SIZE,
+        "encode_queue_size": PIPELINE_QUEUE_SIZE,
+        "engine": PIPELINE_ENGINE,
+        "process_workers": PROCESS_WORKERS,
+        "segment_workers": SEGMENT_WORKERS,
+        "segment_seconds": SEGMENT_SECONDS,
+        "temp_dir": TEMP_DIR,
+        "frame_store_memory_mb": FRAME_STORE_MEMORY_MB,
+        "frame_store_arena_mb": FRAME_STORE_ARENA_MB,
+        "frame_store_dir": FRAME_STORE_DIR,
+        "checkpoint_segments": CHECKPOINT_SEGMENTS,
+        "result_cache_mb": RESULT_CACHE_MB,
+        "result_cache_dir": RESULT_CACHE_DIR,
+        "metrics_log": METRICS_LOG,
+        "job_slots": JOB_SLOTS,
+        "max_queued_jobs": MAX_QUEUED_JOBS,
+        "job_db_path": JOB_DB_PATH,
+        "priority_classes": list(PRIORITY_CLASSES),
+        "default_priority": DEFAULT_PRIORITY,
+        "client_weights": dict(CLIENT_WEIGHTS),
+        "shortest_job_first": SHORTEST_JOB_FIRST
+    }
+    settings.update(load_config().get("processing_settings", {}))
+    return settings
 
 def install_upscale_dependencies():
     """Install dependencies for video upscaling."""
@@ -30,155 +211,3295 @@ def install_upscale_dependencies():
         print("Successfully installed upscaling dependencies")
         return True
         
-    except subprocess.CalledProcessError as e:
-        print(f"Failed to install dependencies: {e.stderr}")
-        return False
+    except subprocess.CalledProcessError as e:
+        print(f"Failed to install dependencies: {e.stderr}")
+        return False
+    except Exception as e:
+        print(f"Error installing dependencies: {e}")
+        return False
+
+def download_realesrgan_model():
+    """Download Real-ESRGAN model files."""
+    try:
+        print("Downloading Real-ESRGAN model files...")
+        
+        # Create models directory
+        models_dir = 'models'
+        os.makedirs(models_dir, exist_ok=True)
+        
+        # Download realesr-general-x4v3 model
+        model_url = "https://github.com/xinntao/Real-ESRGAN/releases/download/v0.2.5.0/realesr-general-x4v3.pth"
+        model_path = MODEL_PATH
+        
+        if not os.path.exists(model_path):
+            subprocess.run(['wget', '-O', model_path, model_url], check=True)
+            print("Successfully downloaded Real-ESRGAN model")
+        else:
+            print("Real-ESRGAN model already exists")
+
+        # Download the WDN variant used to blend in the denoise strength
+        wdn_model_url = "https://github.com/xinntao/Real-ESRGAN/releases/download/v0.2.5.0/realesr-general-wdn-x4v3.pth"
+        wdn_model_path = os.path.join(models_dir, "realesr-general-wdn-x4v3.pth")
+
+        if not os.path.exists(wdn_model_path):
+            subprocess.run(['wget', '-O', wdn_model_path, wdn_model_url], check=True)
+            print("Successfully downloaded Real-ESRGAN WDN model")
+
+        return True
+        
+    except Exception as e:
+        print(f"Failed to download Real-ESRGAN model: {e}")
+        return False
+
+class RealESRGANModel:
+    """
+    In-process realesr-general-x4v3 network.
+    
+    Loaded once and kept in memory so that consecutive jobs skip interpreter
+    startup, torch import and weight loading. ``enhance`` mirrors
+    ``RealESRGANer.enhance`` so the model can also be used as GFPGAN's
+    background upsampler. Batching, tiling and resizing happen here; the
+    forward pass itself is delegated to one of INFERENCE_BACKENDS.
+    """
+    
+    def __init__(self, model_path=MODEL_PATH, denoise_strength=DENOISE_STRENGTH, device=None, precision=PRECISION,
+                 backend=INFERENCE_BACKEND, threads=INFERENCE_THREADS):
+        """
+        Load the network weights.
+        
+        Args:
+            model_path (str): Path to realesr-general-x4v3.pth
+            denoise_strength (float): Blend weight against the WDN model (1 = no extra denoise)
+            device (str): Torch device, defaults to CUDA when available (CPU for int8)
+            precision (str): One of PRECISION_MODES, see resolve_precision
+            backend (str): Name of the inference backend in INFERENCE_BACKENDS
+            threads (int): Intra-op threads for backends that take it, 0 = automatic
+        """
+        from realesrgan.archs.srvgg_arch import SRVGGNetCompact
+        
+        if backend not in INFERENCE_BACKENDS:
+            raise Exception(f"Unknown inference backend: {backend} (expected one of {', '.join(INFERENCE_BACKENDS)})")
+        
+        self.scale = 4
+        # Lowered automatically when a batch runs out of memory
+        self.max_batch_size = 64
+        
+        net = SRVGGNetCompact(num_in_ch=3, num_out_ch=3, num_feat=64, num_conv=32, upscale=4, act_type='prelu')
+        state = self._load_weights(model_path, denoise_strength)
+        net.load_state_dict(state, strict=True)
+        net.eval()
+        self.num_feat = net.num_feat
+        
+        # Exported artifacts are named after the blended weights, so new weights or denoise strengths re-export
+        digest = hashlib.sha1(b''.join(value.numpy().tobytes() for value in state.values())).hexdigest()[:12]
+        cache_path = f"{os.path.splitext(model_path)[0]}-{digest}"
+        self.backend = INFERENCE_BACKENDS[backend](net, device=device, precision=precision,
+                                                   cache_path=cache_path, threads=threads)
+        self.device = self.backend.device
+        self.precision = self.backend.precision
+    
+    @staticmethod
+    def _load_weights(model_path, denoise_strength):
+        """Load the state dict, blending in the WDN weights for denoise control."""
+        import torch
+        
+        def load(path):
+            loadnet = torch.load(path, map_location='cpu')
+            return loadnet['params_ema'] if 'params_ema' in loadnet else loadnet['params']
+        
+        state = load(model_path)
+        wdn_model_path = model_path.replace('realesr-general-x4v3', 'realesr-general-wdn-x4v3')
+        if denoise_strength != 1 and wdn_model_path != model_path and os.path.exists(wdn_model_path):
+            wdn_state = load(wdn_model_path)
+            for key, value in state.items():
+                state[key] = denoise_strength * value + (1 - denoise_strength) * wdn_state[key]
+        
+        return state
+    
+    def calibrated(self, calibration):
+        """
+        Return a view of this model calibrated for one job.
+        
+        int8 activation ranges depend on the content, so each job quantizes
+        its own copy of the network on frames from its input instead of
+        reusing ranges from whatever the shared model saw first. Other
+        precisions need no calibration and return the model itself.
+        
+        Args:
+            calibration (Calibration): Frames to calibrate on and where they came from
+        
+        Returns:
+            RealESRGANModel: A calibrated copy sharing the weights, or self
+        """
+        if self.precision != 'int8' or not calibration.frames:
+            return self
+        view = copy.copy(self)
+        view.backend = self.backend.calibrated(calibration)
+        return view
+    
+    def enhance(self, img, outscale=None):
+        """
+        Upscale a single BGR image.
+        
+        Args:
+            img (numpy.ndarray): BGR uint8 image
+            outscale (float): Final scale, resized from the native 4x if different
+        
+        Returns:
+            tuple: (upscaled image, None)
+        """
+        return self.enhance_batch([img], outscale)[0], None
+    
+    def enhance_batch(self, imgs, outscale=None, tile_size=0, tile_overlap=TILE_OVERLAP, max_tiles=0):
+        """
+        Upscale several same-sized BGR images in one forward pass.
+        
+        With tile_size set, frames larger than a tile are split into
+        overlapping tiles which are blended back, so peak memory depends on
+        the tile size rather than the frame size. Each forward pass then
+        takes at most max_tiles tiles, by default one per image, which is
+        the batch auto_tile_size sizes the tiles for.
+        
+        Args:
+            imgs (list): BGR uint8 images of identical shape
+            outscale (float): Final scale, resized from the native 4x if different
+            tile_size (int): Tile edge in input pixels, 0 to disable tiling
+            tile_overlap (int): Overlap between neighbouring tiles in input pixels
+            max_tiles (int): Tiles per forward pass when tiling, 0 = len(imgs)
+        
+        Returns:
+            list: Upscaled BGR images in input order
+        """
+        height, width = imgs[0].shape[:2]
+        if tile_size and (height > tile_size or width > tile_size):
+            outputs = self._enhance_tiled(imgs, int(tile_size), int(tile_overlap), int(max_tiles) or len(imgs))
+        else:
+            outputs = self._forward_batched(imgs)
+        
+        if outscale is not None and outscale != self.scale:
+            size = (int(width * outscale), int(height * outscale))
+            outputs = [cv2.resize(output, size, interpolation=cv2.INTER_LANCZOS4) for output in outputs]
+        
+        return outputs
+    
+    def _forward_batched(self, imgs, limit=0):
+        """
+        Run the network on a list of images, at most max_batch_size (and limit, if set) at a time.
+        
+        If a batch does not fit in memory it is split in half and retried,
+        and the largest size that worked is remembered for later batches.
+        """
+        outputs = []
+        start = 0
+        while start < len(imgs):
+            size = min(self.max_batch_size, limit) if limit else self.max_batch_size
+            chunk = imgs[start:start + size]
+            try:
+                outputs.extend(self.backend.forward(chunk))
+                start += len(chunk)
+            except (RuntimeError, MemoryError) as e:
+                if not _is_out_of_memory(e) or len(chunk) == 1:
+                    raise
+                self.max_batch_size = max(1, len(chunk) // 2)
+                print(f"Out of memory with batch of {len(chunk)}, retrying with {self.max_batch_size}")
+                self.backend.release_memory()
+        return outputs
+    
+    def _enhance_tiled(self, imgs, tile_size, tile_overlap, max_tiles):
+        """Upscale images tile by tile, max_tiles per forward pass, and blend the tiles across their overlaps."""
+        height, width = imgs[0].shape[:2]
+        tile_h, tile_w = min(tile_size, height), min(tile_size, width)
+        overlap = max(0, min(tile_overlap, tile_size // 2))
+        ys = _tile_starts(height, tile_h, overlap)
+        xs = _tile_starts(width, tile_w, overlap)
+        
+        # All tiles have the same shape, so tiles from every frame in the batch share forward passes, but no
+        # more of them per pass than the tile size was planned for
+        tiles = [img[y:y + tile_h, x:x + tile_w] for img in imgs for y in ys for x in xs]
+        tile_outputs = iter(self._forward_batched(tiles, max_tiles))
+        
+        scale = self.scale
+        ramp = overlap * scale
+        outputs = []
+        for _ in imgs:
+            output = np.empty((height * scale, width * scale, 3), dtype=np.uint8)
+            for row, y in enumerate(ys):
+                for col, x in enumerate(xs):
+                    _blend_tile(output, next(tile_outputs), y * scale, x * scale,
+                                ramp if row > 0 else 0, ramp if col > 0 else 0)
+            outputs.append(output)
+        
+        return outputs
+    
+    def auto_tile_size(self, batch_size=1, memory_budget_mb=0):
+        """
+        Pick the largest tile that fits in the memory budget.
+        
+        The per-pixel cost is measured with a probe forward pass on CUDA and
+        estimated from the network width on CPU.
+        
+        Args:
+            batch_size (int): Tiles processed per forward pass
+            memory_budget_mb (float): Memory to plan for, 0 to use measured free memory
+        
+        Returns:
+            int: Tile edge in input pixels
+        """
+        import torch
+        
+        if self.device.type == 'cuda':
+            probe = 64
+            torch.cuda.synchronize(self.device)
+            torch.cuda.reset_peak_memory_stats(self.device)
+            baseline = torch.cuda.memory_allocated(self.device)
+            self.backend.forward([np.zeros((probe, probe, 3), dtype=np.uint8)])
+            bytes_per_pixel = (torch.cuda.max_memory_allocated(self.device) - baseline) / (probe * probe)
+            free_bytes = torch.cuda.mem_get_info(self.device)[0]
+            free_bytes += torch.cuda.memory_reserved(self.device) - torch.cuda.memory_allocated(self.device)
+        else:
+            import psutil
+            element_size = {'fp16': 2, 'bf16': 2, 'int8': 1}.get(self.precision, 4)
+            # Two feature maps live per conv plus the pixel-shuffled output and residual base
+            out_channels = 3 * self.scale * self.scale
+            bytes_per_pixel = (2 * self.num_feat + 3 * out_channels) * element_size
+            free_bytes = psutil.virtual_memory().available
+        
+        budget = memory_budget_mb * 1024 * 1024 if memory_budget_mb else free_bytes * 0.5
+        tile = int((budget / (bytes_per_pixel * max(1, batch_size))) ** 0.5)
+        tile = max(64, min(4096, tile - tile % 16))
+        print(f"Auto tile size: {tile}px (budget {budget / 2**20:.0f} MB, {bytes_per_pixel:.0f} B/px)")
+        return tile
+
+def _tile_starts(length, tile, overlap):
+    """Start offsets of tiles covering length, with the last tile flush to the edge."""
+    if length <= tile:
+        return [0]
+    step = max(1, tile - overlap)
+    starts = list(range(0, length - tile, step))
+    starts.append(length - tile)
+    return starts
+
+def _blend_tile(output, tile, y, x, ramp_top, ramp_left):
+    """
+    Write an upscaled tile into output, feathering it over the tiles above and to the left.
+    
+    Tiles are written in raster order, so only the top and left edges
+    overlap existing content. Weights ramp linearly from 0 at the tile edge
+    to 1 at the end of the overlap, which hides the seams.
+    """
+    tile_h, tile_w = tile.shape[:2]
+    region = output[y:y + tile_h, x:x + tile_w]
+    if not ramp_top and not ramp_left:
+        region[...] = tile
+        return
+    
+    weight_y = np.ones(tile_h, dtype=np.float32)
+    weight_x = np.ones(tile_w, dtype=np.float32)
+    if ramp_top:
+        weight_y[:ramp_top] = (np.arange(ramp_top, dtype=np.float32) + 0.5) / ramp_top
+    if ramp_left:
+        weight_x[:ramp_left] = (np.arange(ramp_left, dtype=np.float32) + 0.5) / ramp_left
+    weight = (weight_y[:, None] * weight_x[None, :])[..., None]
+    
+    blended = tile.astype(np.float32) * weight + region.astype(np.float32) * (1 - weight)
+    region[...] = np.clip(blended + 0.5, 0, 255).astype(np.uint8)
+
+class TorchBackend:
+    """Eager PyTorch inference, on CUDA when available."""
+    
+    name = "torch"
+    
+    def __init__(self, net, device=None, precision=PRECISION, cache_path=None, threads=0):
+        """
+        Move the network to its device and precision.
+        
+        Args:
+            net (torch.nn.Module): SRVGG network with weights loaded, in fp32 on CPU
+            device (str): Torch device, defaults to CUDA when available (CPU for int8)
+            precision (str): One of PRECISION_MODES, see resolve_precision
+            cache_path (str): Unused, torch needs no exported artifact
+            threads (int): Unused, torch keeps its global thread settings
+        """
+        import torch
+        
+        if device is None:
+            # Quantized kernels only exist for CPU
+            device = 'cuda' if torch.cuda.is_available() and precision != 'int8' else 'cpu'
+        self.device = torch.device(device)
+        self.precision = resolve_precision(precision, self.device)
+        self.dtype = {'fp16': torch.float16, 'bf16': torch.bfloat16}.get(self.precision, torch.float32)
+        self.net = net.to(self.device, self.dtype)
+        # int8 keeps the float network: jobs quantize their own copy with calibrated(), and a
+        # backend used without one is quantized on its first forward pass, calibrated on that batch
+        self.float_net = self.net if self.precision == 'int8' else None
+        self.quantized = self.precision != 'int8'
+        self.calibration_source = None
+        self._quantize_lock = threading.Lock()
+    
+    def _to_tensor(self, imgs):
+        import torch
+        
+        batch = np.stack(imgs)[..., ::-1].transpose(0, 3, 1, 2)
+        tensor = torch.from_numpy(np.ascontiguousarray(batch)).to(self.device)
+        return tensor.to(self.dtype) / 255.0
+    
+    def calibrated(self, calibration):
+        """
+        Return a copy of this backend with the network quantized to int8 on the given frames.
+        
+        Args:
+            calibration (Calibration): Frames to calibrate on and where they came from
+        """
+        batches = []
+        for frames in batch_frames(calibration.frames, CALIBRATION_FRAMES):
+            # Crops of a frame smaller than CALIBRATION_CROP differ in shape; each shape gets its own batch
+            for shape in sorted({frame.shape for frame in frames}):
+                batches.append(self._to_tensor([frame for frame in frames if frame.shape == shape]))
+        view = copy.copy(self)
+        view.net = self._quantize(batches, calibration.source)
+        view.quantized = True
+        view.calibration_source = calibration.source
+        view._quantize_lock = threading.Lock()
+        return view
+    
+    def forward(self, imgs):
+        """Run the network on a list of BGR images stacked into one tensor."""
+        import torch
+        
+        tensor = self._to_tensor(imgs)
+        if not self.quantized:
+            with self._quantize_lock:
+                if not self.quantized:
+                    source = f"first batch of {tensor.shape[0]} frames"
+                    self.net = self._quantize([tensor], source)
+                    self.calibration_source = source
+                    self.quantized = True
+        
+        with torch.no_grad():
+            output = self.net(tensor)
+        
+        output = output.float().clamp_(0, 1).mul_(255.0).round_()
+        output = output.byte().cpu().numpy().transpose(0, 2, 3, 1)[..., ::-1]
+        return [np.ascontiguousarray(frame) for frame in output]
+    
+    def _quantize(self, batches, source):
+        """
+        Quantize a copy of the float network to static int8 with FX post-training quantization.
+        
+        Dynamic quantization only covers Linear and recurrent layers, and
+        SRVGG is all convolutions, so activation ranges are calibrated on
+        real frames instead.
+        
+        Args:
+            batches (list): Input tensors to observe activation ranges on
+            source (str): Description of the calibration frames, for the log
+        
+        Returns:
+            torch.nn.Module: The quantized network
+        """
+        import warnings
+        import torch
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+        
+        engine = 'x86' if 'x86' in torch.backends.quantized.supported_engines else 'qnnpack'
+        torch.backends.quantized.engine = engine
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            prepared = prepare_fx(copy.deepcopy(self.float_net), get_default_qconfig_mapping(engine), (batches[0],))
+            with torch.no_grad():
+                for batch in batches:
+                    prepared(batch)
+            net = convert_fx(prepared)
+        print(f"Quantized model to int8 ({engine}), calibrated on {source}")
+        return net
+    
+    def release_memory(self):
+        """Free cached allocator blocks after an out-of-memory error."""
+        import torch
+        
+        if self.device.type == 'cuda':
+            torch.cuda.empty_cache()
+
+class OnnxRuntimeBackend:
+    """
+    ONNX Runtime inference on CPU.
+    
+    The network is exported to ONNX once and the file is kept next to the
+    weights, so later runs only pay for creating the session.
+    """
+    
+    name = "onnxruntime"
+    
+    def __init__(self, net, device=None, precision=PRECISION, cache_path=None, threads=0):
+        """
+        Export the network if needed and open an inference session.
+        
+        Args:
+            net (torch.nn.Module): SRVGG network with weights loaded, in fp32 on CPU
+            device (str): Only "cpu" (or None) is supported
+            precision (str): Only fp32 is supported, other modes fall back to it
+            cache_path (str): Artifact path without extension, ".onnx" is appended
+            threads (int): Intra-op threads, 0 = one per physical core
+        """
+        import torch
+        import onnxruntime as ort
+        
+        if device not in (None, 'cpu'):
+            raise Exception(f"The onnxruntime backend only runs on CPU, not {device}")
+        if precision not in ("auto", "fp32"):
+            print(f"The onnxruntime backend runs in fp32, ignoring precision {precision}")
+        self.device = torch.device('cpu')
+        self.precision = "fp32"
+        
+        self.onnx_path = (cache_path or os.path.splitext(MODEL_PATH)[0]) + '.onnx'
+        export_onnx_model(net, self.onnx_path)
+        
+        if not threads:
+            import psutil
+            threads = psutil.cpu_count(logical=False) or os.cpu_count() or 1
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = int(threads)
+        # SRVGG is a single chain of convolutions, so there is nothing to run in parallel between ops
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(self.onnx_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        print(f"Loaded ONNX model {self.onnx_path} ({threads} threads)")
+    
+    def forward(self, imgs):
+        """Run the network on a list of BGR images stacked into one array."""
+        batch = np.stack(imgs)[..., ::-1].transpose(0, 3, 1, 2)
+        batch = np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+        
+        output = self.session.run(None, {self.input_name: batch})[0]
+        
+        output = np.clip(output, 0, 1) * 255.0
+        output = np.round(output).astype(np.uint8).transpose(0, 2, 3, 1)[..., ::-1]
+        return [np.ascontiguousarray(frame) for frame in output]
+    
+    def release_memory(self):
+        """Nothing to release, ONNX Runtime uses a plain CPU allocator."""
+
+def export_onnx_model(net, onnx_path):
+    """
+    Export the SRVGG network to ONNX unless the file already exists.
+    
+    The batch and spatial dimensions are dynamic so one file serves every
+    frame and tile size.
+    
+    Args:
+        net (torch.nn.Module): SRVGG network in fp32 on CPU
+        onnx_path (str): Destination .onnx path
+    
+    Returns:
+        str: onnx_path
+    """
+    import torch
+    
+    if os.path.exists(onnx_path):
+        return onnx_path
+    
+    print(f"Exporting ONNX model to {onnx_path}...")
+    os.makedirs(os.path.dirname(onnx_path) or '.', exist_ok=True)
+    tmp_path = f"{onnx_path}.{os.getpid()}.tmp"
+    export_kwargs = {
+        "input_names": ["input"],
+        "output_names": ["output"],
+        "dynamic_axes": {"input": {0: "batch", 2: "height", 3: "width"},
+                         "output": {0: "batch", 2: "height", 3: "width"}},
+        "opset_version": 17
+    }
+    dummy = torch.rand(1, 3, 64, 64)
+    with torch.no_grad():
+        try:
+            # Newer torch defaults to the dynamo exporter, which needs extra packages
+            torch.onnx.export(net, dummy, tmp_path, dynamo=False, **export_kwargs)
+        except TypeError:
+            torch.onnx.export(net, dummy, tmp_path, **export_kwargs)
+    # Parallel segment workers may export at the same time, the rename keeps the file whole
+    os.replace(tmp_path, onnx_path)
+    return onnx_path
+
+INFERENCE_BACKENDS = {
+    TorchBackend.name: TorchBackend,
+    OnnxRuntimeBackend.name: OnnxRuntimeBackend
+}
+
+PRECISION_MODES = ("auto", "fp32", "fp16", "bf16", "int8")
+
+def resolve_precision(precision, device):
+    """
+    Map a requested precision mode to one the device supports.
+    
+    Args:
+        precision (str): One of PRECISION_MODES
+        device (torch.device): Device the model runs on
+    
+    Returns:
+        str: "fp32", "fp16", "bf16" or "int8"
+    """
+    import torch
+    
+    if precision not in PRECISION_MODES:
+        raise Exception(f"Unknown precision: {precision} (expected one of {', '.join(PRECISION_MODES)})")
+    
+    if precision == "auto":
+        return "fp16" if device.type == 'cuda' else "fp32"
+    if precision == "fp16" and device.type != 'cuda':
+        print("fp16 is only used on CUDA, falling back to fp32")
+        return "fp32"
+    if precision == "bf16":
+        if device.type == 'cuda':
+            supported = torch.cuda.is_bf16_supported()
+        else:
+            supported = torch.ops.mkldnn._is_mkldnn_bf16_supported()
+        if not supported:
+            print("bf16 is not supported on this device, falling back to fp32")
+            return "fp32"
+    if precision == "int8" and device.type != 'cpu':
+        print("int8 is only available on CPU, falling back to fp32")
+        return "fp32"
+    return precision
+
+def _is_out_of_memory(error):
+    """Check whether an exception is a CUDA or CPU allocation failure."""
+    if isinstance(error, MemoryError):
+        return True
+    message = str(error).lower()
+    return 'out of memory' in message or "can't allocate memory" in message
+
+def get_upscale_model(denoise_strength=DENOISE_STRENGTH, precision=PRECISION, backend=INFERENCE_BACKEND,
+                      threads=INFERENCE_THREADS):
+    """
+    Return the shared Real-ESRGAN model, loading it on first use.
+    
+    Args:
+        denoise_strength (float): Denoise strength the weights are blended for
+        precision (str): Inference precision, one of PRECISION_MODES
+        backend (str): Inference backend, one of INFERENCE_BACKENDS
+        threads (int): Intra-op threads for the backend, 0 = automatic
+    
+    Returns:
+        RealESRGANModel: Cached model instance
+    """
+    key = ('realesrgan', denoise_strength, precision, backend, threads)
+    with _model_cache_lock:
+        if key not in _model_cache:
+            if not os.path.exists(MODEL_PATH):
+                raise Exception(f"Model file not found: {MODEL_PATH}")
+            print(f"Loading Real-ESRGAN model (denoise={denoise_strength}, precision={precision}, "
+                  f"backend={backend})...")
+            _model_cache[key] = RealESRGANModel(MODEL_PATH, denoise_strength, precision=precision,
+                                                backend=backend, threads=threads)
+        return _model_cache[key]
+
+def get_face_enhancer():
+    """
+    Return the shared GFPGAN face enhancer, loading it on first use.
+    
+    Backgrounds are upscaled in batches by RealESRGANModel, so the enhancer
+    is created without a background upsampler (see restore_faces).
+    
+    Returns:
+        GFPGANer: Cached face enhancer instance
+    """
+    key = ('gfpgan',)
+    with _model_cache_lock:
+        if key not in _model_cache:
+            from gfpgan import GFPGANer
+            print("Loading GFPGAN face enhancer...")
+            _model_cache[key] = GFPGANer(
+                model_path=GFPGAN_MODEL_URL,
+                upscale=UPSCALE_FACTOR,
+                arch='clean',
+                channel_multiplier=2,
+                bg_upsampler=None)
+        return _model_cache[key]
+
+def preload_models():
+    """
+    Load the models up front so the first job does not pay for it.
+    
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    try:
+        settings = get_upscale_settings()
+        get_upscale_model(settings["denoise_strength"], settings["precision"], settings["inference_backend"],
+                          settings["inference_threads"])
+        if settings["face_enhancement"]:
+            get_face_enhancer()
+        return True
+        
+    except Exception as e:
+        print(f"Failed to preload models: {e}")
+        return False
+
+def get_ffmpeg_exe():
+    """
+    Locate the ffmpeg binary, preferring the one bundled with imageio-ffmpeg.
+    
+    Returns:
+        str: Path to ffmpeg, or None if it is not available
+    """
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return shutil.which('ffmpeg')
+
+def resolve_io_backend(io_backend):
+    """Fall back to OpenCV when ffmpeg was requested but is not installed."""
+    if io_backend == "ffmpeg" and get_ffmpeg_exe() is None:
+        print("ffmpeg not found, falling back to OpenCV video I/O")
+        return "opencv"
+    return io_backend
+
+def get_video_info(input_video_path):
+    """
+    Read basic stream properties of a video.
+    
+    Args:
+        input_video_path (str): Path to input video file
+    
+    Returns:
+        dict: fps, frame_count, width and height
+    """
+    cap = cv2.VideoCapture(input_video_path)
+    if not cap.isOpened():
+        raise Exception("Error opening video file")
+    
+    try:
+        return {
+            "fps": cap.get(cv2.CAP_PROP_FPS),
+            "frame_count": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        }
+    finally:
+        cap.release()
+
+def read_video_frames(input_video_path, io_backend="opencv"):
+    """
+    Decode a video one frame at a time.
+    
+    Args:
+        input_video_path (str): Path to input video file
+        io_backend (str): "ffmpeg" to decode through a rawvideo pipe, or "opencv"
+    
+    Yields:
+        numpy.ndarray: BGR frame
+    """
+    if io_backend == "ffmpeg":
+        yield from _read_video_frames_ffmpeg(input_video_path)
+        return
+    
+    cap = cv2.VideoCapture(input_video_path)
+    if not cap.isOpened():
+        raise Exception("Error opening video file")
+    
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+def _read_video_frames_ffmpeg(input_video_path):
+    """Decode a video with ffmpeg writing raw BGR frames to stdout."""
+    import imageio_ffmpeg
+    
+    reader = imageio_ffmpeg.read_frames(input_video_path, pix_fmt='bgr24')
+    try:
+        meta = next(reader)
+        width, height = meta["size"]
+        for data in reader:
+            yield np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+    finally:
+        reader.close()
+
+def restore_faces(face_enhancer, frame, upscaled, outscale):
+    """
+    Restore faces in a frame with GFPGAN and paste them onto its upscaled version.
+    
+    Args:
+        face_enhancer (GFPGANer): GFPGAN face enhancer
+        frame (numpy.ndarray): Original BGR frame
+        upscaled (numpy.ndarray): Upscaled BGR frame
+        outscale (float): Scale between frame and upscaled
+    
+    Returns:
+        numpy.ndarray: Upscaled frame with restored faces
+    """
+    return restore_faces_batch(face_enhancer, [frame], [upscaled], outscale)[0]
+
+def restore_faces_batch(face_enhancer, frames, upscaled, outscale, face_batch_size=FACE_BATCH_SIZE, stats=None):
+    """
+    Restore faces in several frames, running GFPGAN on all their face crops together.
+    
+    This is GFPGANer.enhance split into its steps: landmarks and alignment
+    per frame, one batched GFPGAN pass over every crop, then pasting each
+    frame's restored faces onto its upscaled background. Backgrounds are
+    supplied by the caller so they can be upscaled in batches beforehand.
+    
+    Args:
+        face_enhancer (GFPGANer): GFPGAN face enhancer
+        frames (list): Original BGR frames
+        upscaled (list): Upscaled BGR frames
+        outscale (float): Scale between frames and upscaled
+        face_batch_size (int): Face crops per GFPGAN forward pass
+        stats (dict): Optional dict accumulating face_frames / gfpgan_seconds
+    
+    Returns:
+        list: Upscaled frames with restored faces
+    """
+    outputs = list(upscaled)
+    started = time.time()
+    
+    # GFPGANer keeps per-image state on its face helper, so it cannot be shared concurrently
+    with _face_enhancer_lock:
+        helper = face_enhancer.face_helper
+        prepared = []
+        for index, frame in enumerate(frames):
+            helper.clean_all()
+            helper.read_image(frame)
+            helper.get_face_landmarks_5(only_center_face=False, eye_dist_threshold=5)
+            helper.align_warp_face()
+            if helper.cropped_faces:
+                prepared.append((index, helper.input_img, list(helper.affine_matrices), list(helper.cropped_faces)))
+        
+        crops = [crop for _, _, _, frame_crops in prepared for crop in frame_crops]
+        restored = iter(_gfpgan_forward(face_enhancer, crops, face_batch_size))
+        
+        helper.set_upscale_factor(outscale)
+        for index, input_img, affine_matrices, frame_crops in prepared:
+            helper.clean_all()
+            helper.input_img = input_img
+            helper.affine_matrices = affine_matrices
+            for _ in frame_crops:
+                helper.add_restored_face(next(restored))
+            helper.get_inverse_affine(None)
+            outputs[index] = helper.paste_faces_to_input_image(upsample_img=outputs[index])
+        
+        if stats is not None:
+            stats["face_frames"] = stats.get("face_frames", 0) + len(frames)
+            stats["gfpgan_seconds"] = stats.get("gfpgan_seconds", 0.0) + time.time() - started
+    
+    return outputs
+
+def _gfpgan_forward(face_enhancer, crops, face_batch_size):
+    """Run GFPGAN over aligned 512x512 face crops, face_batch_size at a time."""
+    import torch
+    from basicsr.utils import img2tensor, tensor2img
+    from torchvision.transforms.functional import normalize
+    
+    restored_faces = []
+    for start in range(0, len(crops), max(1, int(face_batch_size))):
+        chunk = crops[start:start + max(1, int(face_batch_size))]
+        tensors = []
+        for crop in chunk:
+            crop_t = img2tensor(crop / 255., bgr2rgb=True, float32=True)
+            normalize(crop_t, (0.5, 0.5, 0.5), (0.5, 0.5, 0.5), inplace=True)
+            tensors.append(crop_t)
+        
+        try:
+            with torch.no_grad():
+                output = face_enhancer.gfpgan(torch.stack(tensors).to(face_enhancer.device),
+                                              return_rgb=False, weight=0.5)[0]
+            for face in output:
+                restored_faces.append(tensor2img(face, rgb2bgr=True, min_max=(-1, 1)).astype('uint8'))
+        except RuntimeError as e:
+            print(f"Failed GFPGAN inference: {e}")
+            restored_faces.extend(chunk)
+    
+    return restored_faces
+
+class FaceTracker:
+    """
+    Cheap face presence detector used to gate GFPGAN.
+    
+    A Haar cascade runs on a downscaled grayscale copy every
+    detect_interval frames. In between, the boxes are followed by template
+    matching in a window around their last position, and dropped once the
+    match gets weak.
+    """
+    
+    def __init__(self, detect_interval=FACE_DETECT_INTERVAL, detect_size=320, match_threshold=0.6):
+        """
+        Args:
+            detect_interval (int): Frames between full detector runs
+            detect_size (int): Longest side of the image the detector runs on
+            match_threshold (float): Minimum normalized correlation to keep tracking a box
+        """
+        self.detect_interval = max(1, int(detect_interval))
+        self.detect_size = detect_size
+        self.match_threshold = match_threshold
+        # Haar cascades are not shipped with every OpenCV build
+        self.cascade = None
+        if hasattr(cv2, 'CascadeClassifier'):
+            self.cascade = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades,
+                                                              'haarcascade_frontalface_default.xml'))
+        self.tracks = []
+        self.frame_index = 0
+    
+    def update(self, frame):
+        """
+        Find faces in the next frame.
+        
+        Args:
+            frame (numpy.ndarray): BGR frame
+        
+        Returns:
+            list: Face boxes (x, y, w, h) in the downscaled detector image
+        """
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.detect_size / max(height, width))
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if scale < 1.0:
+            gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        
+        if self.frame_index % self.detect_interval == 0:
+            boxes = self.cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=4, minSize=(16, 16))
+            self.tracks = [(tuple(int(v) for v in box), gray[y:y + h, x:x + w].copy()) for box in boxes
+                           for x, y, w, h in [box]]
+        else:
+            self.tracks = [track for track in (self._follow(gray, box, template) for box, template in self.tracks)
+                           if track is not None]
+        
+        self.frame_index += 1
+        return [box for box, _ in self.tracks]
+    
+    def _follow(self, gray, box, template):
+        """Relocate a box by template matching in a window around it."""
+        x, y, w, h = box
+        margin_x, margin_y = w // 2, h // 2
+        x0, y0 = max(0, x - margin_x), max(0, y - margin_y)
+        x1, y1 = min(gray.shape[1], x + w + margin_x), min(gray.shape[0], y + h + margin_y)
+        window = gray[y0:y1, x0:x1]
+        if window.shape[0] < h or window.shape[1] < w:
+            return None
+        
+        scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (dx, dy) = cv2.minMaxLoc(scores)
+        if best < self.match_threshold:
+            return None
+        
+        nx, ny = x0 + dx, y0 + dy
+        return (nx, ny, w, h), gray[ny:ny + h, nx:nx + w].copy()
+
+def gate_faces(items, tracker, stats=None):
+    """
+    Mark which frames contain faces so GFPGAN only runs where it matters.
+    
+    Runs on the decode thread because tracking needs frames in order.
+    
+    Args:
+        items (iterable): FrameItem tuples
+        tracker (FaceTracker): Face presence tracker
+        stats (dict): Optional dict counting face_frames_skipped
+    
+    Yields:
+        FrameItem: Item with has_faces set
+    """
+    if stats is not None:
+        stats["face_frames_skipped"] = 0
+    for item in items:
+        has_faces = bool(tracker.update(item.frame))
+        if not has_faces and stats is not None:
+            stats["face_frames_skipped"] += 1
+        yield item._replace(has_faces=has_faces)
+
+def batch_frames(frames, batch_size):
+    """
+    Group a stream of frames into lists of up to batch_size frames.
+    
+    Args:
+        frames (iterable): BGR frames
+        batch_size (int): Maximum frames per batch
+    
+    Yields:
+        list: Batch of frames
+    """
+    batch = []
+    for frame in frames:
+        batch.append(frame)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# A decoded frame moving through the pipeline: how many times its output is
+# written (duplicate runs), whether it contains faces (None = not checked),
+# and for temporal delta the tiles to re-upscale (DeltaTiles) and then the
+# upscaled patches, with frame None (None = whole frame). A PreviewFrame
+# delta carries an output a preview already computed for the frame
+FrameItem = collections.namedtuple('FrameItem', ['frame', 'repeats', 'has_faces', 'delta'], defaults=(None,))
+
+# Upscaled output of a frame, loaded from a preview instead of recomputed
+PreviewFrame = collections.namedtuple('PreviewFrame', ['frame'])
+
+# Changed tiles of a frame: every tile is tile_size (h, w) at (y, x) and is
+# upscaled from a crop_size window at (crop_y, crop_x) that adds context
+DeltaTiles = collections.namedtuple('DeltaTiles', ['tile_size', 'crop_size', 'origins'])
+
+def frame_items(frames):
+    """
+    Wrap plain frames as FrameItem tuples.
+    
+    Args:
+        frames (iterable): BGR frames
+    
+    Yields:
+        FrameItem: Item written once, faces unchecked
+    """
+    for frame in frames:
+        yield FrameItem(frame, 1, None)
+
+def frame_digest(frame):
+    """Exact content digest of a frame."""
+    return hashlib.blake2b(np.ascontiguousarray(frame).data, digest_size=16).digest()
+
+def frame_fingerprint(frame):
+    """
+    Compute a cheap fingerprint for duplicate detection.
+    
+    Args:
+        frame (numpy.ndarray): BGR frame
+    
+    Returns:
+        tuple: (exact content digest, 32x32 grayscale thumbnail)
+    """
+    digest = frame_digest(frame)
+    thumbnail = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (32, 32), interpolation=cv2.INTER_AREA)
+    return digest, thumbnail
+
+def dedupe_frames(frames, threshold=DUPLICATE_THRESHOLD, stats=None):
+    """
+    Collapse runs of identical (or near-identical) consecutive frames.
+    
+    Each frame is compared with the last frame that will actually be
+    upscaled, so slow fades cannot drift past the threshold one small step
+    at a time.
+    
+    Args:
+        frames (iterable): BGR frames
+        threshold (float): Max mean abs thumbnail difference to count as duplicate, 0 for exact only
+        stats (dict): Optional dict receiving unique_frames / duplicate_frames counts
+    
+    Yields:
+        FrameItem: Item whose repeats counts the collapsed run
+    """
+    if stats is None:
+        stats = {}
+    stats["unique_frames"] = 0
+    stats["duplicate_frames"] = 0
+    
+    reference = None
+    reference_fp = None
+    repeats = 0
+    for frame in frames:
+        fingerprint = frame_fingerprint(frame)
+        if reference is not None:
+            duplicate = fingerprint[0] == reference_fp[0]
+            if not duplicate and threshold > 0:
+                distance = cv2.absdiff(fingerprint[1], reference_fp[1]).mean()
+                duplicate = distance <= threshold
+            if duplicate:
+                repeats += 1
+                stats["duplicate_frames"] += 1
+                continue
+            yield FrameItem(reference, repeats, None)
+        
+        reference, reference_fp, repeats = frame, fingerprint, 1
+        stats["unique_frames"] += 1
+    
+    if reference is not None:
+        yield FrameItem(reference, repeats, None)
+
+def delta_tiles(items, tile_size=DELTA_TILE_SIZE, threshold=DELTA_THRESHOLD, refresh_interval=DELTA_REFRESH_INTERVAL,
+                padding=TILE_OVERLAP, full_frame_faces=False, stats=None):
+    """
+    Mark which tiles of each frame changed enough to need upscaling again.
+    
+    Tiles are compared against the input that their current upscaled
+    output was made from, so slow changes still trigger once they add up
+    to the threshold. The whole frame is upscaled on the first frame,
+    every refresh_interval frames, and whenever the changed tiles (with
+    their context padding) would cost as much as the full frame. Runs on
+    the decode thread because it needs frames in order.
+    
+    Args:
+        items (iterable): FrameItem tuples
+        tile_size (int): Tile edge in input pixels
+        threshold (float): Mean abs grayscale difference (0-255) that marks a tile changed
+        refresh_interval (int): Frames between full refreshes, 0 to only refresh when needed
+        padding (int): Context in input pixels upscaled around each tile to avoid seams
+        full_frame_faces (bool): Upscale the whole frame when it may contain faces (for GFPGAN)
+        stats (dict): Optional dict counting delta_full_frames / delta_tiles / delta_tiles_upscaled
+    
+    Yields:
+        FrameItem: Item with delta set to DeltaTiles, or None for a full frame
+    """
+    reference = None
+    since_refresh = 0
+    if stats is not None:
+        stats.update({"delta_full_frames": 0, "delta_tiles": 0, "delta_tiles_upscaled": 0})
+    
+    for item in items:
+        frame = item.frame
+        if isinstance(item.delta, PreviewFrame):
+            # Already upscaled whole, so it refreshes the reference like a full frame
+            reference = frame.copy()
+            since_refresh = 1
+            yield item
+            continue
+        
+        height, width = frame.shape[:2]
+        tile_h, tile_w = min(tile_size, height), min(tile_size, width)
+        crop_h, crop_w = min(tile_h + 2 * padding, height), min(tile_w + 2 * padding, width)
+        ys = _tile_starts(height, tile_h, 0)
+        xs = _tile_starts(width, tile_w, 0)
+        
+        full = (reference is None or reference.shape != frame.shape
+                or (refresh_interval and since_refresh >= refresh_interval)
+                or (full_frame_faces and item.has_faces is not False))
+        origins = []
+        if not full:
+            diff = cv2.cvtColor(cv2.absdiff(frame, reference), cv2.COLOR_BGR2GRAY)
+            sums = cv2.integral(diff)
+            limit = threshold * tile_h * tile_w
+            for y in ys:
+                for x in xs:
+                    changed = sums[y + tile_h, x + tile_w] - sums[y, x + tile_w] - sums[y + tile_h, x] + sums[y, x]
+                    if changed > limit:
+                        crop_y = min(max(0, y - padding), height - crop_h)
+                        crop_x = min(max(0, x - padding), width - crop_w)
+                        origins.append((y, x, crop_y, crop_x))
+            full = len(origins) * crop_h * crop_w >= height * width
+        
+        if stats is not None:
+            stats["delta_tiles"] += len(ys) * len(xs)
+            stats["delta_tiles_upscaled"] += len(ys) * len(xs) if full else len(origins)
+        
+        if full:
+            reference = frame.copy()
+            since_refresh = 1
+            if stats is not None:
+                stats["delta_full_frames"] += 1
+            yield item._replace(delta=None)
+            continue
+        
+        for y, x, _, _ in origins:
+            reference[y:y + tile_h, x:x + tile_w] = frame[y:y + tile_h, x:x + tile_w]
+        since_refresh += 1
+        yield item._replace(delta=DeltaTiles((tile_h, tile_w), (crop_h, crop_w), origins))
+
+def upscale_delta_tiles(items, upscale_model, outscale=UPSCALE_FACTOR):
+    """
+    Upscale the changed tiles of several frames in one batch.
+    
+    Args:
+        items (list): FrameItem tuples whose delta is a DeltaTiles
+        upscale_model (RealESRGANModel): Real-ESRGAN model
+        outscale (float): Output scale factor
+    
+    Returns:
+        list: FrameItem tuples with frame None and delta holding (out_y, out_x, patch) tuples
+    """
+    crops = [item.frame[crop_y:crop_y + item.delta.crop_size[0], crop_x:crop_x + item.delta.crop_size[1]]
+             for item in items for _, _, crop_y, crop_x in item.delta.origins]
+    # All tiles of a frame share one crop size, so group by size to keep batches uniform
+    by_size = collections.defaultdict(list)
+    for index, crop in enumerate(crops):
+        by_size[crop.shape].append(index)
+    outputs = [None] * len(crops)
+    for indices in by_size.values():
+        for index, output in zip(indices, upscale_model.enhance_batch([crops[i] for i in indices], outscale=outscale)):
+            outputs[index] = output
+    
+    outputs = iter(outputs)
+    results = []
+    for item in items:
+        (tile_h, tile_w), _, origins = item.delta
+        patches = []
+        for y, x, crop_y, crop_x in origins:
+            output = next(outputs)
+            out_y, out_x = int(round(y * outscale)), int(round(x * outscale))
+            patch_h = int(round((y + tile_h) * outscale)) - out_y
+            patch_w = int(round((x + tile_w) * outscale)) - out_x
+            offset_y, offset_x = out_y - int(round(crop_y * outscale)), out_x - int(round(crop_x * outscale))
+            patches.append((out_y, out_x, output[offset_y:offset_y + patch_h, offset_x:offset_x + patch_w]))
+        results.append(item._replace(frame=None, delta=patches))
+    return results
+
+def compose_delta_frames(items):
+    """
+    Rebuild full output frames from upscaled delta patches.
+    
+    Runs on the encode thread, where items arrive in order, so each
+    patched frame starts from the previous output.
+    
+    Args:
+        items (iterable): Upscaled FrameItem tuples
+    
+    Yields:
+        FrameItem: Item with a full output frame
+    """
+    previous = None
+    for item in items:
+        if item.delta is not None:
+            output = previous.copy()
+            for out_y, out_x, patch in item.delta:
+                region = output[out_y:out_y + patch.shape[0], out_x:out_x + patch.shape[1]]
+                region[...] = patch[:region.shape[0], :region.shape[1]]
+            item = item._replace(frame=output, delta=None)
+        previous = item.frame
+        yield item
+
+def expand_repeats(items):
+    """
+    Expand FrameItem tuples back into a plain frame stream.
+    
+    Args:
+        items (iterable): FrameItem tuples
+    
+    Yields:
+        numpy.ndarray: Each frame, repeated as requested
+    """
+    for item in items:
+        for _ in range(item.repeats):
+            yield item.frame
+
+def reuse_preview_frames(items, preview, stats=None):
+    """
+    Attach outputs a preview already computed to the matching frames.
+    
+    Frames are matched by content, so this works for any segment of the
+    video. Hashing stops once every preview frame has been found.
+    
+    Args:
+        items (iterable): FrameItem tuples
+        preview (PreviewStore): Store of the preview's outputs
+        stats (dict): Optional dict counting preview_frames_reused
+    
+    Yields:
+        FrameItem: Item, with delta set to a PreviewFrame when the output is known
+    """
+    remaining = set(preview.digests())
+    if stats is not None:
+        stats["preview_frames_reused"] = 0
+    
+    for item in items:
+        if remaining:
+            digest = frame_digest(item.frame).hex()
+            if digest in remaining:
+                remaining.discard(digest)
+                output = preview.get(digest)
+                if output is not None:
+                    if stats is not None:
+                        stats["preview_frames_reused"] += 1
+                    item = item._replace(delta=PreviewFrame(output))
+        yield item
+
+def process_preview_items(items, process_batch):
+    """
+    Run process_batch on the items that still need upscaling.
+    
+    Args:
+        items (list): FrameItem tuples, some holding PreviewFrame outputs
+        process_batch (callable): Upscales a list of FrameItem tuples
+    
+    Returns:
+        list: Upscaled FrameItem tuples in input order
+    """
+    results = [item._replace(frame=item.delta.frame, delta=None) if isinstance(item.delta, PreviewFrame) else None
+               for item in items]
+    pending = [index for index, result in enumerate(results) if result is None]
+    if pending:
+        for index, result in zip(pending, process_batch([items[i] for i in pending])):
+            results[index] = result
+    return results
+
+def write_frame_items(items, crop_size=None, **kwargs):
+    """
+    Encode FrameItem tuples, writing each frame repeats times.
+    
+    Args:
+        items (iterable): FrameItem tuples, possibly holding delta patches
+        crop_size (tuple): Optional (width, height) to center-crop output frames to
+        **kwargs: Passed through to write_video_frames
+    
+    Returns:
+        int: Number of frames written
+    """
+    frames = expand_repeats(compose_delta_frames(items))
+    if crop_size:
+        frames = crop_frames(frames, crop_size)
+    return write_video_frames(frames, **kwargs)
+
+def upscale_frame_items(items, **kwargs):
+    """
+    Upscale a batch of FrameItem tuples.
+    
+    Args:
+        items (list): FrameItem tuples
+        **kwargs: Passed through to upscale_batch
+    
+    Returns:
+        list: FrameItem tuples holding the upscaled frames (or delta patches)
+    """
+    results = list(items)
+    full = [index for index, item in enumerate(items) if item.delta is None]
+    partial = [index for index, item in enumerate(items) if item.delta is not None]
+    
+    if full:
+        outputs = upscale_batch([items[i].frame for i in full], face_flags=[items[i].has_faces for i in full],
+                                **kwargs)
+        for index, output in zip(full, outputs):
+            results[index] = items[index]._replace(frame=output)
+    if partial:
+        patched = upscale_delta_tiles([items[i] for i in partial], kwargs["upscale_model"],
+                                      kwargs.get("outscale", UPSCALE_FACTOR))
+        for index, item in zip(partial, patched):
+            results[index] = item
+    return results
+
+def upscale_batch(batch, upscale_model, face_enhancer=None, outscale=UPSCALE_FACTOR, tile_size=0,
+                  tile_overlap=TILE_OVERLAP, face_flags=None, face_batch_size=FACE_BATCH_SIZE, face_stats=None):
+    """
+    Upscale one batch of frames, restoring faces afterwards if enabled.
+    
+    Args:
+        batch (list): BGR frames of identical shape
+        upscale_model (RealESRGANModel): Real-ESRGAN model
+        face_enhancer: Optional GFPGAN enhancer
+        outscale (float): Output scale factor
+        tile_size (int): Tile edge in input pixels, 0 to disable tiling
+        tile_overlap (int): Overlap between neighbouring tiles in input pixels
+        face_flags (list): Per-frame face presence; False skips GFPGAN, None means unknown
+        face_batch_size (int): Face crops per GFPGAN forward pass
+        face_stats (dict): Optional dict accumulating GFPGAN stats
+    
+    Returns:
+        list: Upscaled BGR frames
+    """
+    outputs = upscale_model.enhance_batch(batch, outscale=outscale, tile_size=tile_size,
+                                          tile_overlap=tile_overlap)
+    if face_enhancer is not None:
+        if face_flags is None:
+            face_flags = [None] * len(batch)
+        selected = [index for index, flag in enumerate(face_flags) if flag is not False]
+        if selected:
+            restored = restore_faces_batch(face_enhancer, [batch[i] for i in selected],
+                                           [outputs[i] for i in selected], outscale, face_batch_size, face_stats)
+            for index, output in zip(selected, restored):
+                outputs[index] = output
+    return outputs
+
+def upscale_frames(frames, upscale_model, face_enhancer=None, outscale=UPSCALE_FACTOR, batch_size=BATCH_SIZE,
+                   tile_size=0, tile_overlap=TILE_OVERLAP):
+    """
+    Upscale a stream of frames in memory, batch_size frames per forward pass.
+    
+    Args:
+        frames (iterable): BGR frames
+        upscale_model (RealESRGANModel): Real-ESRGAN model
+        face_enhancer: Optional GFPGAN enhancer
+        outscale (float): Output scale factor
+        batch_size (int): Frames stacked into one forward pass
+        tile_size (int): Tile edge in input pixels, 0 to disable tiling
+        tile_overlap (int): Overlap between neighbouring tiles in input pixels
+    
+    Yields:
+        numpy.ndarray: Upscaled BGR frame
+    """
+    for batch in batch_frames(frames, max(1, int(batch_size))):
+        yield from upscale_batch(batch, upscale_model, face_enhancer, outscale, tile_size, tile_overlap)
+
+def write_video_frames(frames, output_video_path, fps, io_backend="opencv", audio_source=None,
+                       video_codec=VIDEO_CODEC, crf=VIDEO_CRF, preset=VIDEO_PRESET, encoder_threads=ENCODER_THREADS):
+    """
+    Encode a stream of frames to a video file.
+    
+    The writer is opened lazily from the size of the first frame.
+    
+    Args:
+        frames (iterable): BGR frames
+        output_video_path (str): Path to output video file
+        fps (float): Output frame rate
+        io_backend (str): "ffmpeg" to encode through a rawvideo pipe, or "opencv" (mp4v, no audio)
+        audio_source (str): ffmpeg only, file whose audio stream is copied into the output
+        video_codec (str): ffmpeg only, video encoder
+        crf (int): ffmpeg only, constant rate factor for x264/x265
+        preset (str): ffmpeg only, encoder speed preset
+        encoder_threads (int): ffmpeg only, encoder threads (0 = all cores)
+    
+    Returns:
+        int: Number of frames written
+    """
+    if io_backend == "ffmpeg":
+        return _write_video_frames_ffmpeg(frames, output_video_path, fps, audio_source,
+                                          video_codec, crf, preset, encoder_threads)
+    
+    out = None
+    written = 0
+    try:
+        for frame in frames:
+            if out is None:
+                height, width = frame.shape[:2]
+                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+                out = cv2.VideoWriter(output_video_path, fourcc, fps, (width, height))
+                if not out.isOpened():
+                    raise Exception("Error initializing video writer")
+            
+            out.write(frame)
+            written += 1
+            
+            if written % 100 == 0:
+                print(f"Upscaled {written} frames")
+    finally:
+        if out is not None:
+            out.release()
+    
+    return written
+
+def _write_video_frames_ffmpeg(frames, output_video_path, fps, audio_source, video_codec, crf, preset,
+                               encoder_threads):
+    """Encode raw BGR frames piped into ffmpeg's stdin, copying the source audio stream."""
+    process = None
+    written = 0
+    try:
+        for frame in frames:
+            if process is None:
+                height, width = frame.shape[:2]
+                cmd = [
+                    get_ffmpeg_exe(), '-y', '-v', 'error',
+                    '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f"{width}x{height}", '-r', str(fps),
+                    '-i', '-'
+                ]
+                if audio_source:
+                    # The trailing '?' keeps inputs without an audio track working
+                    cmd += ['-i', audio_source, '-map', '0:v:0', '-map', '1:a:0?', '-c:a', 'copy', '-shortest']
+                cmd += ['-c:v', video_codec, '-threads', str(encoder_threads)]
+                if video_codec in ('libx264', 'libx265'):
+                    cmd += ['-preset', preset, '-crf', str(crf)]
+                # yuv420p needs even dimensions
+                cmd += ['-pix_fmt', 'yuv420p', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2']
+                if output_video_path.lower().endswith('.mp4'):
+                    cmd += ['-movflags', '+faststart']
+                cmd.append(output_video_path)
+                process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+            
+            process.stdin.write(np.ascontiguousarray(frame).tobytes())
+            written += 1
+            
+            if written % 100 == 0:
+                print(f"Upscaled {written} frames")
+    except BaseException:
+        if process is not None:
+            process.kill()
+            process.wait()
+        raise
+    
+    if process is not None:
+        process.stdin.close()
+        stderr = process.stderr.read().decode(errors='replace')
+        if process.wait() != 0:
+            raise Exception(f"ffmpeg encoding failed: {stderr.strip()}")
+    
+    return written
+
+class PipelineStage:
+    """Busy-time accounting for one stage of the frame pipeline."""
+    
+    def __init__(self, name, workers=1):
+        self.name = name
+        self.workers = workers
+        self.busy = 0.0
+        self.items = 0
+        self._lock = threading.Lock()
+    
+    def add(self, seconds, items=1):
+        """Record time spent working on items."""
+        with self._lock:
+            self.busy += seconds
+            self.items += items
+    
+    def report(self, wall_time):
+        """Return busy time, item count and utilization over wall_time."""
+        capacity = wall_time * self.workers
+        return {
+            "workers": self.workers,
+            "busy_seconds": round(self.busy, 3),
+            "items": self.items,
+            "utilization": round(self.busy / capacity, 3) if capacity > 0 else 0.0
+        }
+
+# Queue sentinels: a producer finished / the pipeline is shutting down after an error
+_PIPELINE_DONE = object()
+_PIPELINE_STOP = object()
+# Stands in for the frame of a FrameItem parked in the pipeline's frame store
+_STASHED = object()
+
+def _queue_put(q, item, stop_event):
+    """Put into a bounded queue without blocking forever once the pipeline is stopping."""
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _queue_get(q, stop_event):
+    """Get from a queue, returning _PIPELINE_STOP once the pipeline is stopping."""
+    while not stop_event.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _PIPELINE_STOP
+
+def _stash_frame_items(frame_store, index, items):
+    """Move the frames of a batch into frame_store, keyed by (batch index, position)."""
+    stashed = []
+    for position, item in enumerate(items):
+        if item.frame is not None:
+            frame_store.put((index, position), item.frame)
+            item = item._replace(frame=_STASHED)
+        stashed.append(item)
+    return stashed
+
+def _unstash_frame_items(frame_store, index, items):
+    """Take the frames of a batch back out of frame_store."""
+    return [item._replace(frame=frame_store.pop((index, position))) if item.frame is _STASHED else item
+            for position, item in enumerate(items)]
+
+def run_frame_pipeline(frames, process_batch, write_frames, batch_size=BATCH_SIZE, workers=PIPELINE_WORKERS,
+                       decode_queue_size=PIPELINE_QUEUE_SIZE, encode_queue_size=PIPELINE_QUEUE_SIZE,
+                       frame_store=None, progress=None):
+    """
+    Run decode, inference and encode concurrently with bounded queues between them.
+    
+    A decode thread pulls frames and groups them into batches, ``workers``
+    inference threads run process_batch, and an encode thread reorders the
+    results and feeds them to write_frames. At most
+    decode_queue_size + encode_queue_size + workers batches are waiting for
+    inference; finished batches that arrive ahead of a slow one wait in
+    frame_store when given, so a stall spills to disk instead of growing
+    the process.
+    
+    Args:
+        frames (iterable): BGR frames, consumed on the decode thread
+        process_batch (callable): Maps a list of frames to a list of output frames
+        write_frames (callable): Consumes an iterable of output frames, returns the count written
+        batch_size (int): Frames per batch
+        workers (int): Inference threads
+        decode_queue_size (int): Batches buffered between decode and inference
+        encode_queue_size (int): Batches buffered between inference and encode
+        frame_store (FrameStore): Optional buffer for out-of-order FrameItem outputs
+        progress (JobProgress): Optional progress advanced as each batch is handed to the encoder
+    
+    Returns:
+        tuple: (frames written, per-stage stats dict)
+    """
+    workers = max(1, int(workers))
+    decode_queue = queue.Queue(maxsize=max(1, int(decode_queue_size)))
+    encode_queue = queue.Queue(maxsize=max(1, int(encode_queue_size)))
+    stop_event = threading.Event()
+    errors = []
+    result = {"written": 0}
+    stages = {
+        "decode": PipelineStage("decode"),
+        "inference": PipelineStage("inference", workers),
+        "encode": PipelineStage("encode")
+    }
+    
+    def fail(error):
+        errors.append(error)
+        stop_event.set()
+    
+    def decode():
+        try:
+            frame_iter = iter(frames)
+            index = 0
+            while True:
+                started = time.time()
+                batch = []
+                for frame in frame_iter:
+                    batch.append(frame)
+                    if len(batch) >= batch_size:
+                        break
+                stages["decode"].add(time.time() - started, len(batch))
+                if not batch:
+                    break
+                if not _queue_put(decode_queue, (index, batch), stop_event):
+                    return
+                index += 1
+        except BaseException as e:
+            fail(e)
+        finally:
+            # Closing the generator stops the ffmpeg reader if we bailed out early
+            if hasattr(frames, 'close'):
+                frames.close()
+            for _ in range(workers):
+                _queue_put(decode_queue, _PIPELINE_DONE, stop_event)
+    
+    def infer():
+        try:
+            while True:
+                item = _queue_get(decode_queue, stop_event)
+                if item is _PIPELINE_STOP:
+                    return
+                if item is _PIPELINE_DONE:
+                    break
+                index, batch = item
+                started = time.time()
+                outputs = process_batch(batch)
+                stages["inference"].add(time.time() - started, len(batch))
+                if not _queue_put(encode_queue, (index, outputs), stop_event):
+                    return
+        except BaseException as e:
+            fail(e)
+        finally:
+            _queue_put(encode_queue, _PIPELINE_DONE, stop_event)
+    
+    def ordered_outputs(waiting):
+        pending = {}
+        next_index = 0
+        finished_workers = 0
+        while finished_workers < workers:
+            started = time.time()
+            item = _queue_get(encode_queue, stop_event)
+            waiting[0] += time.time() - started
+            if item is _PIPELINE_STOP:
+                return
+            if item is _PIPELINE_DONE:
+                finished_workers += 1
+                continue
+            index, outputs = item
+            if frame_store is not None and index != next_index:
+                outputs = _stash_frame_items(frame_store, index, outputs)
+            pending[index] = outputs
+            while next_index in pending:
+                outputs = pending.pop(next_index)
+                if frame_store is not None:
+                    outputs = _unstash_frame_items(frame_store, next_index, outputs)
+                yield from outputs
+                if progress is not None:
+                    progress.advance(sum(getattr(output, 'repeats', 1) for output in outputs))
+                next_index += 1
+    
+    def encode():
+        waiting = [0.0]
+        started = time.time()
+        try:
+            result["written"] = write_frames(ordered_outputs(waiting))
+        except BaseException as e:
+            fail(e)
+        finally:
+            stages["encode"].add(time.time() - started - waiting[0], result["written"])
+    
+    started = time.time()
+    threads = [threading.Thread(target=decode, name="pipeline-decode", daemon=True)]
+    threads += [threading.Thread(target=infer, name=f"pipeline-infer-{i}", daemon=True) for i in range(workers)]
+    threads.append(threading.Thread(target=encode, name="pipeline-encode", daemon=True))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.time() - started
+    
+    if errors:
+        raise errors[0]
+    
+    stats = {name: stage.report(wall_time) for name, stage in stages.items()}
+    stats["wall_seconds"] = round(wall_time, 3)
+    stats["bottleneck"] = max(stages, key=lambda name: stats[name]["utilization"])
+    return result["written"], stats
+
+class SharedFrameRing:
+    """
+    Ring of fixed-size batch slots in one shared memory block.
+    
+    Each slot holds a batch of input frames followed by room for the
+    upscaled batch, so worker processes read and write frames in place and
+    only slot numbers and small metadata are pickled between processes.
+    """
+    
+    def __init__(self, slots, batch_size, input_shape, output_shape, name=None):
+        """
+        Create the shared block, or attach to an existing one by name.
+        
+        Args:
+            slots (int): Number of batch slots
+            batch_size (int): Frames per slot
+            input_shape (tuple): (height, width, 3) of input frames
+            output_shape (tuple): (height, width, 3) of upscaled frames
+            name (str): Name of an existing block to attach to, None to create one
+        """
+        from multiprocessing import shared_memory
+        
+        self.slots = slots
+        self.batch_size = batch_size
+        self.input_shape = tuple(input_shape)
+        self.output_shape = tuple(output_shape)
+        self.input_bytes = batch_size * int(np.prod(self.input_shape))
+        self.slot_bytes = self.input_bytes + batch_size * int(np.prod(self.output_shape))
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * self.slot_bytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+    
+    def layout(self):
+        """Constructor arguments for attaching to this ring from another process."""
+        return self.slots, self.batch_size, self.input_shape, self.output_shape
+    
+    def inputs(self, slot, count):
+        """Array view of the first count input frames of a slot."""
+        return np.ndarray((count,) + self.input_shape, dtype=np.uint8, buffer=self.shm.buf,
+                          offset=slot * self.slot_bytes)
+    
+    def outputs(self, slot, count):
+        """Array view of the first count output frames of a slot."""
+        return np.ndarray((count,) + self.output_shape, dtype=np.uint8, buffer=self.shm.buf,
+                          offset=slot * self.slot_bytes + self.input_bytes)
+    
+    def close(self):
+        """Detach from the block, and free it if this process created it."""
+        try:
+            self.shm.close()
+        except BufferError:
+            # A view is still referenced somewhere; the mapping goes away with the process
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+def _inference_worker(threads, tasks, results):
+    """
+    Process entry point: upscale batches placed in a job's shared frame ring.
+    
+    The process outlives jobs. A ("job", job, ring_name, ring_layout,
+    settings, calibration) task attaches it to a job's ring and loads the
+    job's models (cached in the process like get_upscale_model), and
+    ("end", job) detaches it again. Batches are ("batch", job, slot,
+    [(repeats, has_faces, delta), ...]). Replies are (job, slot,
+    placements, face_stats) where placements holds None for a full output
+    frame or the (y, x, h, w) patch rectangles of a delta frame, or (job,
+    slot, None, error message) on failure.
+    """
+    import torch
+    
+    torch.set_num_threads(threads)
+    ring = None
+    upscale_kwargs = None
+    error = None
+    face_stats = {}
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        if task[0] == "job":
+            _, job, ring_name, ring_layout, settings, calibration = task
+            try:
+                ring = SharedFrameRing(*ring_layout, name=ring_name)
+                upscale_kwargs = get_upscale_kwargs(settings, face_stats, calibration)
+                error = None
+            except Exception as e:
+                upscale_kwargs = None
+                error = f"Failed to start job: {e}"
+            continue
+        if task[0] == "end":
+            if ring is not None:
+                ring.close()
+            ring = None
+            upscale_kwargs = None
+            continue
+        
+        _, job, slot, metadata = task
+        if upscale_kwargs is None:
+            results.put((job, slot, None, error))
+            continue
+        try:
+            items = [FrameItem(frame, repeats, has_faces, delta)
+                     for frame, (repeats, has_faces, delta) in zip(ring.inputs(slot, len(metadata)), metadata)]
+            face_stats.clear()
+            upscaled = upscale_frame_items(items, **upscale_kwargs)
+            
+            placements = []
+            for output, item in zip(ring.outputs(slot, len(items)), upscaled):
+                if item.delta is None:
+                    output[...] = item.frame
+                    placements.append(None)
+                    continue
+                rects = []
+                for out_y, out_x, patch in item.delta:
+                    region = output[out_y:out_y + patch.shape[0], out_x:out_x + patch.shape[1]]
+                    region[...] = patch[:region.shape[0], :region.shape[1]]
+                    rects.append((out_y, out_x) + region.shape[:2])
+                placements.append(rects)
+            del items, upscaled, output
+            results.put((job, slot, placements, dict(face_stats)))
+        except Exception as e:
+            results.put((job, slot, None, str(e)))
+    
+    if ring is not None:
+        ring.close()
+
+class InferenceWorkers:
+    """
+    A group of persistent inference worker processes.
+    
+    Starting a worker means spawning a Python process that imports torch
+    and loads the models, which takes seconds, so groups are kept for the
+    lifetime of the process (see get_inference_workers) and lent to one
+    job at a time. Each worker has its own task queue so job setup
+    reaches every worker exactly once.
+    """
+    
+    def __init__(self, workers, threads):
+        """
+        Start the worker processes.
+        
+        Args:
+            workers (int): Worker processes
+            threads (int): Intra-op threads per worker
+        """
+        self.workers = workers
+        self.threads = threads
+        self.lock = threading.Lock()
+        self.waiting = {}
+        self.replies = {}
+        self.jobs = itertools.count(1)
+        
+        context = multiprocessing.get_context('spawn')
+        self.tasks = [context.Queue() for _ in range(workers)]
+        self.results = context.Queue()
+        self.processes = [context.Process(target=_inference_worker, name=f"inference-worker-{i}", daemon=True,
+                                          args=(threads, self.tasks[i], self.results))
+                          for i in range(workers)]
+        for process in self.processes:
+            process.start()
+        self.collector = threading.Thread(target=self._collect, name="inference-results", daemon=True)
+        self.collector.start()
+        print(f"Started {workers} inference worker processes ({threads} threads each)")
+    
+    def alive(self):
+        """Check that every worker process is still running."""
+        return all(process.is_alive() for process in self.processes)
+    
+    def _collect(self):
+        """Route worker replies to the threads waiting on their (job, slot)."""
+        while True:
+            reply = self.results.get()
+            if reply is None:
+                return
+            job, slot, placements, extra = reply
+            with self.lock:
+                done = self.waiting.pop((job, slot), None)
+                if done is not None:
+                    self.replies[(job, slot)] = (placements, extra)
+            if done is not None:
+                done.set()
+    
+    def close(self):
+        """Stop the workers."""
+        for tasks in self.tasks:
+            tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self.results.put(None)
+        self.collector.join()
+
+def get_inference_workers(workers, threads):
+    """
+    Borrow an idle group of inference worker processes, starting one if none is free.
+    
+    Return it with release_inference_workers when the job is done.
+    
+    Args:
+        workers (int): Worker processes
+        threads (int): Intra-op threads per worker
+    
+    Returns:
+        InferenceWorkers: Group reserved for the caller
+    """
+    key = (workers, threads)
+    with _worker_groups_lock:
+        idle = _worker_groups.setdefault(key, [])
+        while idle:
+            group = idle.pop()
+            if group.alive():
+                return group
+            group.close()
+    return InferenceWorkers(workers, threads)
+
+def release_inference_workers(group):
+    """Return a group borrowed with get_inference_workers, or stop it if a worker died."""
+    if not group.alive():
+        group.close()
+        return
+    with _worker_groups_lock:
+        _worker_groups.setdefault((group.workers, group.threads), []).append(group)
+
+@atexit.register
+def shutdown_inference_workers():
+    """Stop every idle inference worker group (busy ones are daemons and end with the process)."""
+    with _worker_groups_lock:
+        groups = [group for idle in _worker_groups.values() for group in idle]
+        _worker_groups.clear()
+    for group in groups:
+        group.close()
+
+class ProcessInferencePool:
+    """
+    One job's use of a group of inference worker processes, fed through a SharedFrameRing.
+    
+    Eager pre- and post-processing holds the GIL, so on CPU-only hosts
+    inference threads in one process stop scaling long before the cores
+    run out. Here each process runs its own model with an equal share of
+    the physical cores. The processes are persistent and reused by later
+    jobs; only the ring is per job. ``process`` is a drop-in process_batch
+    for run_frame_pipeline, which still reorders results by frame index;
+    it gets two slots per worker so the next batch can be copied in while
+    the current one runs.
+    """
+    
+    def __init__(self, settings, frame_shape, workers=PROCESS_WORKERS, batch_size=BATCH_SIZE, face_stats=None,
+                 calibration=None):
+        """
+        Reserve worker processes and attach them to a new frame ring.
+        
+        Args:
+            settings (dict): Effective upscale settings
+            frame_shape (tuple): (height, width) of input frames
+            workers (int): Worker processes, 0 = one per physical core
+            batch_size (int): Maximum frames per batch
+            face_stats (dict): Optional dict accumulating GFPGAN stats from every worker
+            calibration (Calibration): Frames int8 workers quantize their model on
+        """
+        import psutil
+        
+        cores = psutil.cpu_count(logical=False) or os.cpu_count() or 1
+        workers = max(1, int(workers) or cores)
+        threads = max(1, cores // workers)
+        if not settings["inference_threads"]:
+            settings = dict(settings, inference_threads=threads)
+        
+        height, width = frame_shape
+        outscale = settings["upscale_factor"]
+        output_shape = (int(height * outscale), int(width * outscale), 3)
+        
+        self.slots = 2 * workers
+        self.ring = SharedFrameRing(self.slots, batch_size, (height, width, 3), output_shape)
+        self.free_slots = queue.Queue()
+        for slot in range(self.slots):
+            self.free_slots.put(slot)
+        self.face_stats = face_stats
+        
+        self.group = get_inference_workers(workers, threads)
+        self.job = next(self.group.jobs)
+        for tasks in self.group.tasks:
+            tasks.put(("job", self.job, self.ring.name, self.ring.layout(), settings, calibration))
+    
+    def process(self, items):
+        """
+        Upscale a batch of FrameItem tuples in a worker process.
+        
+        Args:
+            items (list): FrameItem tuples, at most batch_size of them
+        
+        Returns:
+            list: FrameItem tuples holding the upscaled frames (or delta patches)
+        """
+        group = self.group
+        slot = self.free_slots.get()
+        try:
+            for target, item in zip(self.ring.inputs(slot, len(items)), items):
+                if item.frame.shape != target.shape:
+                    raise Exception(f"Frame shape {item.frame.shape} does not match the stream ({target.shape})")
+                target[...] = item.frame
+            
+            # Each worker owns two slots, so a free slot also means its worker is idle or nearly so
+            done = threading.Event()
+            with group.lock:
+                group.waiting[(self.job, slot)] = done
+            group.tasks[slot % group.workers].put(
+                ("batch", self.job, slot, [(item.repeats, item.has_faces, item.delta) for item in items]))
+            while not done.wait(1.0):
+                dead = [process for process in group.processes if not process.is_alive()]
+                if dead:
+                    with group.lock:
+                        group.waiting.pop((self.job, slot), None)
+                    raise Exception(f"Inference worker exited with code {dead[0].exitcode}")
+            
+            with group.lock:
+                placements, extra = group.replies.pop((self.job, slot))
+            if placements is None:
+                raise Exception(f"Inference worker failed: {extra}")
+            if self.face_stats is not None:
+                with group.lock:
+                    for key, value in extra.items():
+                        self.face_stats[key] = self.face_stats.get(key, 0) + value
+            
+            results = []
+            for output, item, placement in zip(self.ring.outputs(slot, len(items)), items, placements):
+                if placement is None:
+                    results.append(item._replace(frame=output.copy(), delta=None))
+                else:
+                    patches = [(y, x, output[y:y + h, x:x + w].copy()) for y, x, h, w in placement]
+                    results.append(item._replace(frame=None, delta=patches))
+            return results
+        finally:
+            self.free_slots.put(slot)
+    
+    def close(self):
+        """Detach the workers from the ring, return them for reuse and free the shared memory."""
+        for tasks in self.group.tasks:
+            tasks.put(("end", self.job))
+        release_inference_workers(self.group)
+        self.ring.close()
+
+def plan_upscale(width, height, settings):
+    """
+    Choose the cheapest resize / model / resize path to the requested output size.
+    
+    The output scale comes from target_width / target_height (fitted
+    inside both when both are set, keeping the aspect ratio), otherwise
+    from upscale_factor, and is capped by max_dimension. Real-ESRGAN
+    always upscales 4x, so below 4x the input is downscaled first so that
+    the model lands just above the output size, making the model pass as
+    small as possible, and the few extra pixels are cropped off. Above 4x
+    the model output is resized up, and at 1x or below the model is
+    skipped entirely.
+    
+    Args:
+        width (int): Input frame width
+        height (int): Input frame height
+        settings (dict): Effective upscale settings
+    
+    Returns:
+        dict: The plan, with pre_resize (model input size or None), model_passes,
+            outscale (model input to model output), crop (final size or None),
+            output_size and a readable description
+    """
+    model_scale = 4
+    targets = [int(settings["target_width"]) / width if settings["target_width"] else None,
+               int(settings["target_height"]) / height if settings["target_height"] else None]
+    targets = [scale for scale in targets if scale is not None]
+    scale = min(targets) if targets else float(settings["upscale_factor"])
+    if settings["max_dimension"]:
+        scale = min(scale, int(settings["max_dimension"]) / max(width, height))
+    output_size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    
+    plan = {
+        "input_size": [width, height],
+        "scale": scale,
+        "output_size": list(output_size),
+        "pre_resize": None,
+        "model_passes": 0,
+        "model_input_size": None,
+        "outscale": scale,
+        "crop": None
+    }
+    steps = []
+    if scale <= 1:
+        if output_size != (width, height):
+            steps.append(f"resize {width}x{height} -> {output_size[0]}x{output_size[1]}")
+    else:
+        model_size = (width, height)
+        if scale < model_scale:
+            model_size = (-(-output_size[0] // model_scale), -(-output_size[1] // model_scale))
+            plan["pre_resize"] = list(model_size)
+            steps.append(f"downscale {width}x{height} -> {model_size[0]}x{model_size[1]}")
+        plan["model_passes"] = 1
+        plan["model_input_size"] = list(model_size)
+        steps.append(f"Real-ESRGAN x{model_scale} -> {model_size[0] * model_scale}x{model_size[1] * model_scale}")
+        
+        if scale <= model_scale:
+            plan["outscale"] = model_scale
+            if (model_size[0] * model_scale, model_size[1] * model_scale) != output_size:
+                plan["crop"] = list(output_size)
+                steps.append(f"crop -> {output_size[0]}x{output_size[1]}")
+        else:
+            plan["outscale"] = scale
+            plan["output_size"] = [int(width * scale), int(height * scale)]
+            steps.append(f"resize -> {plan['output_size'][0]}x{plan['output_size'][1]}")
+    
+    plan["description"] = ", ".join(steps) or "copy"
+    return plan
+
+def resize_frames(frames, size):
+    """
+    Resize a stream of frames, using area averaging when shrinking.
+    
+    Args:
+        frames (iterable): BGR frames
+        size (tuple): (width, height) to resize to
+    
+    Yields:
+        numpy.ndarray: Resized frame
+    """
+    size = tuple(size)
+    for frame in frames:
+        if (frame.shape[1], frame.shape[0]) == size:
+            yield frame
+            continue
+        shrinking = size[0] < frame.shape[1]
+        yield cv2.resize(frame, size, interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LANCZOS4)
+
+def crop_frames(frames, size):
+    """
+    Center-crop a stream of frames.
+    
+    Args:
+        frames (iterable): BGR frames at least size large
+        size (tuple): (width, height) to crop to
+    
+    Yields:
+        numpy.ndarray: Cropped frame
+    """
+    width, height = size
+    for frame in frames:
+        y = (frame.shape[0] - height) // 2
+        x = (frame.shape[1] - width) // 2
+        yield np.ascontiguousarray(frame[y:y + height, x:x + width])
+
+def resize_frame_items(items, size):
+    """
+    Stand-in for upscale_frame_items when the plan has no model pass.
+    
+    Args:
+        items (list): FrameItem tuples
+        size (tuple): (width, height) of the output
+    
+    Returns:
+        list: FrameItem tuples holding the resized frames
+    """
+    frames = resize_frames([item.frame for item in items], size)
+    return [item._replace(frame=frame) for item, frame in zip(items, frames)]
+
+Calibration = collections.namedtuple('Calibration', ['frames', 'source'])
+
+def calibration_crops(frames, crop=CALIBRATION_CROP):
+    """
+    Cut calibration crops from frames at native scale.
+    
+    Each frame gives up to nine crops on a 3x3 grid of positions, so dark
+    and bright regions are both seen without running whole large frames
+    through the observed network.
+    
+    Args:
+        frames (iterable): BGR frames
+        crop (int): Crop edge in pixels
+    
+    Returns:
+        list: BGR crops
+    """
+    crops = []
+    for frame in frames:
+        height, width = frame.shape[:2]
+        crop_h, crop_w = min(crop, height), min(crop, width)
+        for y in sorted({0, (height - crop_h) // 2, height - crop_h}):
+            for x in sorted({0, (width - crop_w) // 2, width - crop_w}):
+                crops.append(frame[y:y + crop_h, x:x + crop_w])
+    return crops
+
+def sample_calibration(input_video_path, info, io_backend="opencv", plan=None, count=CALIBRATION_FRAMES):
+    """
+    Sample int8 calibration crops from frames spread across a video.
+    
+    Args:
+        input_video_path (str): Video to sample
+        info (dict): Stream info from get_video_info
+        io_backend (str): "ffmpeg" or "opencv"
+        plan (dict): Upscale plan; frames are pre-resized like the model input
+        count (int): Frames to sample
+    
+    Returns:
+        Calibration: Crops of the sampled frames and a description of them
+    """
+    total = info["frame_count"]
+    count = max(1, min(int(count), total)) if total > 0 else 1
+    indices = sorted({int((i + 0.5) * total / count) for i in range(count)}) if total > 0 else [0]
+    frames = [frame for _, frame in read_video_frames_at(input_video_path, indices, info["fps"] or 30.0, io_backend)]
+    if plan is not None and plan["pre_resize"]:
+        frames = list(resize_frames(frames, plan["pre_resize"]))
+    return Calibration(calibration_crops(frames),
+                       f"{len(frames)} frames sampled across {os.path.basename(input_video_path)}")
+
+def get_upscale_kwargs(settings, face_stats=None, calibration=None):
+    """
+    Load the models for a job and collect the arguments for upscale_frame_items.
+    
+    Args:
+        settings (dict): Effective upscale settings
+        face_stats (dict): Optional dict accumulating GFPGAN stats
+        calibration (Calibration): Frames from the job's input; int8 models are quantized on them
+    
+    Returns:
+        dict: Keyword arguments for upscale_frame_items / upscale_batch
+    """
+    upscale_model = get_upscale_model(settings["denoise_strength"], settings["precision"],
+                                      settings["inference_backend"], settings["inference_threads"])
+    if calibration is not None:
+        upscale_model = upscale_model.calibrated(calibration)
+    face_enhancer = get_face_enhancer() if settings["face_enhancement"] else None
+    
+    tile_size = settings["tile_size"]
+    if tile_size == "auto":
+        tile_size = upscale_model.auto_tile_size(settings["batch_size"], settings["memory_budget_mb"])
+    
+    upscale_kwargs = {
+        "upscale_model": upscale_model,
+        "face_enhancer": face_enhancer,
+        "outscale": settings["upscale_factor"],
+        "tile_size": tile_size,
+        "tile_overlap": settings["tile_overlap"]
+    }
+    if face_enhancer is not None:
+        upscale_kwargs["face_batch_size"] = settings["face_batch_size"]
+        upscale_kwargs["face_stats"] = face_stats
+    return upscale_kwargs
+
+def upscale_images(images, settings=None, stats=None, progress=None):
+    """
+    Upscale a list of still images with the persistent model.
+    
+    Images are grouped by size and each group is upscaled batch_size
+    images per forward pass, following the same plan as videos
+    (target_width / target_height / max_dimension apply per image).
+    Grayscale and BGRA images are accepted; alpha is resized alongside.
+    
+    Args:
+        images (list): uint8 images (HxW, HxWx3 BGR or HxWx4 BGRA)
+        settings (dict): Per-request overrides of the upscale settings
+        stats (dict): Optional dict filled in with image / batch counts
+        progress (JobProgress): Optional progress advanced per batch, counting images as frames
+    
+    Returns:
+        list: Upscaled images in input order, with the same channel layout
+    """
+    progress = progress or JobProgress()
+    progress.set_stage("upscale", len(images))
+    settings = get_upscale_settings(settings)
+    batch_size = max(1, int(settings["batch_size"]))
+    face_stats = {}
+    upscale_kwargs = None
+    tracker = None
+    
+    groups = collections.defaultdict(list)
+    for index, image in enumerate(images):
+        if image is None or image.dtype != np.uint8:
+            raise Exception(f"Image {index} is not an 8-bit image")
+        groups[image.shape[:2]].append(index)
+    
+    outputs = [None] * len(images)
+    batches = 0
+    for (height, width), indices in groups.items():
+        plan = plan_upscale(width, height, settings)
+        colors = []
+        alphas = []
+        for index in indices:
+            image = images[index]
+            alphas.append(image[..., 3] if image.ndim == 3 and image.shape[2] == 4 else None)
+            colors.append(cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if image.ndim == 2 else image[..., :3])
+        
+        if not plan["model_passes"]:
+            results = list(resize_frames(colors, plan["output_size"]))
+            progress.advance(len(results))
+        else:
+            if upscale_kwargs is None:
+                calibration = None
+                if settings["precision"] == "int8":
+                    step = max(1, len(images) // CALIBRATION_FRAMES)
+                    sampled = [image if image.ndim == 3 else cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+                               for image in images[::step][:CALIBRATION_FRAMES]]
+                    calibration = Calibration(calibration_crops([image[..., :3] for image in sampled]),
+                                              f"{len(sampled)} of the {len(images)} input images")
+                upscale_kwargs = get_upscale_kwargs(settings, face_stats, calibration)
+                if upscale_kwargs["face_enhancer"] is not None and settings["face_gating"]:
+                    tracker = FaceTracker(1)
+                    tracker = tracker if tracker.cascade is not None else None
+            if plan["pre_resize"]:
+                colors = list(resize_frames(colors, plan["pre_resize"]))
+            results = []
+            for batch in batch_frames(colors, batch_size):
+                # Unrelated images: detect faces on each one rather than tracking between them
+                face_flags = [bool(tracker.update(image)) for image in batch] if tracker is not None else None
+                results.extend(upscale_batch(batch, **dict(upscale_kwargs, outscale=plan["outscale"],
+                                                           face_flags=face_flags)))
+                batches += 1
+                progress.advance(len(batch))
+            if plan["crop"]:
+                results = list(crop_frames(results, plan["crop"]))
+        
+        for index, result, alpha in zip(indices, results, alphas):
+            image = images[index]
+            if image.ndim == 2:
+                result = cv2.cvtColor(result, cv2.COLOR_BGR2GRAY)
+            elif alpha is not None:
+                alpha = cv2.resize(alpha, (result.shape[1], result.shape[0]), interpolation=cv2.INTER_LANCZOS4)
+                result = np.dstack([result, alpha])
+            outputs[index] = result
+    
+    if stats is not None:
+        stats["images"] = len(images)
+        stats["sizes"] = len(groups)
+        stats["batches"] = batches
+        stats.update(face_stats)
+    return outputs
+
+def upscale_image(image, settings=None):
+    """
+    Upscale a single still image with the persistent model.
+    
+    Args:
+        image (numpy.ndarray): uint8 image (HxW, HxWx3 BGR or HxWx4 BGRA)
+        settings (dict): Per-request overrides of the upscale settings
+    
+    Returns:
+        numpy.ndarray: Upscaled image with the same channel layout
+    """
+    return upscale_images([image], settings)[0]
+
+def upscale_image_files(input_paths, output_paths, settings=None, stats=None, progress=None):
+    """
+    Upscale image files, writing each result in the format of its output extension.
+    
+    Args:
+        input_paths (list): Image files to read
+        output_paths (list): Files to write, one per input
+        settings (dict): Per-request overrides of the upscale settings
+        stats (dict): Optional dict filled in with image / batch counts
+        progress (JobProgress): Optional progress advanced per batch, counting images as frames
+    
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    progress = progress or JobProgress()
+    try:
+        if len(input_paths) != len(output_paths):
+            raise Exception(f"Got {len(input_paths)} inputs but {len(output_paths)} outputs")
+        
+        progress.set_stage("read", len(input_paths))
+        images = []
+        for path in input_paths:
+            image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+            if image is None:
+                raise Exception(f"Could not read image: {path}")
+            images.append(image)
+        
+        print(f"Upscaling {len(images)} images...")
+        outputs = upscale_images(images, settings, stats, progress)
+        progress.set_stage("write")
+        for path, output in zip(output_paths, outputs):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            if not cv2.imwrite(path, output):
+                raise Exception(f"Could not write image: {path}")
+        print(f"Upscaled images saved ({len(images)} files)")
+        return True
+        
     except Exception as e:
-        print(f"Error installing dependencies: {e}")
+        print(f"Error during image upscaling: {e}")
         return False
 
-def download_realesrgan_model():
-    """Download Real-ESRGAN model files."""
+def _upscale_video_stream(input_video_path, output_video_path, settings, processing, info, job_stats=None,
+                          preview=None, metrics=None, progress=None):
+    """
+    Upscale a whole video through the in-process frame pipeline.
+    
+    Args:
+        input_video_path (str): Path to input video file
+        output_video_path (str): Path to output upscaled video file
+        settings (dict): Effective upscale settings
+        processing (dict): Effective processing settings
+        info (dict): Stream info from get_video_info
+        job_stats (dict): Optional dict filled in with pipeline stats
+        preview (PreviewStore): Optional frames already upscaled by a preview
+        metrics (JobMetrics): Optional metrics the per-stage timings and bytes are added to
+        progress (JobProgress): Optional progress advanced per batch
+    
+    Returns:
+        int: Number of frames written
+    """
+    metrics = metrics or JobMetrics()
+    progress = progress or JobProgress()
+    io_backend = resolve_io_backend(settings["io_backend"])
+    batch_size = max(1, int(settings["batch_size"]))
+    plan = plan_upscale(info["width"], info["height"], settings)
+    # The model now runs on the (possibly pre-resized) frames and scales them by the plan's outscale
+    settings = dict(settings, upscale_factor=plan["outscale"])
+    model_size = plan["model_input_size"]
+    face_enhancement = bool(settings["face_enhancement"]) and plan["model_passes"] > 0
+    
+    face_stats = {}
+    pool = None
+    progress.set_stage("model_load")
+    with metrics.stage("model_load"):
+        calibration = None
+        if settings["precision"] == "int8" and plan["model_passes"]:
+            calibration = sample_calibration(input_video_path, info, io_backend, plan)
+        if not plan["model_passes"]:
+            process_batch = functools.partial(resize_frame_items, size=plan["output_size"])
+            inference_workers = processing["max_workers"]
+        elif processing["engine"] == "processes":
+            pool = ProcessInferencePool(settings, (model_size[1], model_size[0]), processing["process_workers"],
+                                        batch_size, face_stats, calibration)
+            process_batch = pool.process
+            inference_workers = pool.slots
+        elif processing["engine"] == "threads":
+            process_batch = functools.partial(upscale_frame_items,
+                                              **get_upscale_kwargs(settings, face_stats, calibration))
+            inference_workers = processing["max_workers"]
+        else:
+            raise Exception(f"Unknown pipeline engine: {processing['engine']} (expected threads or processes)")
+    
+    print("Running Real-ESRGAN upscaling...")
+    frames = read_video_frames(input_video_path, io_backend)
+    if plan["pre_resize"]:
+        frames = resize_frames(frames, plan["pre_resize"])
+    write_kwargs = {
+        "output_video_path": output_video_path,
+        "fps": info["fps"],
+        "io_backend": io_backend,
+        "audio_source": input_video_path if settings["copy_audio"] else None,
+        "video_codec": settings["video_codec"],
+        "crf": settings["crf"],
+        "preset": settings["preset"],
+        "encoder_threads": settings["encoder_threads"]
+    }
+    
+    dedupe_stats = {}
+    if settings["skip_duplicate_frames"]:
+        # Duplicate frames travel as repeat counts and reuse the previous upscaled output
+        items = dedupe_frames(frames, settings["duplicate_threshold"], dedupe_stats)
+    else:
+        items = frame_items(frames)
+    
+    preview_stats = {}
+    if preview is not None and plan["model_passes"] and preview.digests():
+        items = reuse_preview_frames(items, preview, preview_stats)
+        process_batch = functools.partial(process_preview_items, process_batch=process_batch)
+    
+    if face_enhancement:
+        tracker = FaceTracker(settings["face_detect_interval"]) if settings["face_gating"] else None
+        if tracker is not None and tracker.cascade is not None:
+            items = gate_faces(items, tracker, face_stats)
+        elif tracker is not None:
+            print("Face gating unavailable in this OpenCV build, running GFPGAN on every frame")
+    
+    delta_stats = {}
+    if settings["temporal_delta"] and plan["model_passes"]:
+        # Tiles the model never saw keep their previous output, so GFPGAN frames are always upscaled whole
+        items = delta_tiles(items, int(settings["delta_tile_size"]), settings["delta_threshold"],
+                            int(settings["delta_refresh_interval"]), int(settings["tile_overlap"]),
+                            full_frame_faces=face_enhancement, stats=delta_stats)
+    
+    write_frames = functools.partial(write_frame_items, crop_size=plan["crop"], **write_kwargs)
+    
+    frame_store = FrameStore(processing["frame_store_memory_mb"], processing["frame_store_arena_mb"],
+                             processing["frame_store_dir"] or processing["temp_dir"])
     try:
-        print("Downloading Real-ESRGAN model files...")
+        progress.set_stage("upscale")
+        with metrics.stage("pipeline") as counters:
+            written, stage_stats = run_frame_pipeline(items, process_batch, write_frames,
+                                                      batch_size=batch_size,
+                                                      workers=inference_workers,
+                                                      decode_queue_size=processing["decode_queue_size"],
+                                                      encode_queue_size=processing["encode_queue_size"],
+                                                      frame_store=frame_store,
+                                                      progress=progress)
+            counters["frames"] = written
+    finally:
+        if pool is not None:
+            pool.close()
+        frame_store.close()
+    
+    # Pipeline stages overlap, so each reports its busy time spread over its workers (the
+    # fps it sustains while busy); GFPGAN time is split out of inference
+    peak_memory = metrics.stages["pipeline"].get("peak_memory_bytes")
+    busy = {name: stage_stats[name]["busy_seconds"] / max(1, stage_stats[name]["workers"])
+            for name in ("decode", "inference", "encode")}
+    gfpgan_seconds = face_stats.get("gfpgan_seconds", 0.0) / max(1, stage_stats["inference"]["workers"])
+    metrics.add("decode", busy["decode"], frames=written, bytes_read=os.path.getsize(input_video_path),
+                peak_memory=peak_memory)
+    metrics.add("inference", max(0.0, busy["inference"] - gfpgan_seconds),
+                frames=stage_stats["inference"]["items"], peak_memory=peak_memory)
+    if face_stats.get("face_frames"):
+        metrics.add("face_enhancement", gfpgan_seconds, frames=face_stats["face_frames"], peak_memory=peak_memory)
+    metrics.add("encode", busy["encode"], frames=written, bytes_written=os.path.getsize(output_video_path),
+                peak_memory=peak_memory)
+    
+    store_stats = frame_store.stats()
+    stage_stats["reorder_buffer"] = store_stats
+    if store_stats["mmap"]["frames"] or store_stats["compressed"]["frames"]:
+        print(f"Reorder buffer spilled {store_stats['mmap']['frames']} frames to the arena and "
+              f"{store_stats['compressed']['frames']} to compressed files")
+    
+    if dedupe_stats:
+        print(f"Skipped {dedupe_stats['duplicate_frames']} duplicate frames "
+              f"({dedupe_stats['unique_frames']} upscaled)")
+    utilization = ", ".join(f"{name} {stage_stats[name]['utilization']:.0%}"
+                            for name in ("decode", "inference", "encode"))
+    print(f"Stage utilization: {utilization} (bottleneck: {stage_stats['bottleneck']})")
+    if "face_frames_skipped" in face_stats:
+        # Estimate the GFPGAN time saved from the average cost of frames that did run it
+        face_frames = face_stats.get("face_frames", 0)
+        per_frame = face_stats.get("gfpgan_seconds", 0.0) / face_frames if face_frames else 0.0
+        face_stats["gfpgan_seconds_skipped"] = per_frame * face_stats["face_frames_skipped"]
+        print(f"GFPGAN ran on {face_frames} frames, skipped {face_stats['face_frames_skipped']} without faces")
+    if preview_stats:
+        print(f"Reused {preview_stats['preview_frames_reused']} frames from a preview")
+    if delta_stats.get("delta_tiles"):
+        print(f"Temporal delta upscaled {delta_stats['delta_tiles_upscaled']}/{delta_stats['delta_tiles']} tiles "
+              f"({delta_stats['delta_full_frames']} full frames)")
+    
+    if job_stats is not None:
+        job_stats["stages"] = stage_stats
+        job_stats["plan"] = plan
+        job_stats.update(dedupe_stats)
+        job_stats.update(face_stats)
+        job_stats.update(delta_stats)
+        job_stats.update(preview_stats)
+    
+    if written == 0:
+        raise Exception("No frames decoded from input video")
+    
+    return written
+
+def split_video_segments(input_video_path, segments_dir, segment_seconds):
+    """
+    Split the video stream into keyframe-aligned segments without re-encoding.
+    
+    ffmpeg's segment muxer can only cut at keyframes when stream copying,
+    so each segment starts on a keyframe and decodes independently.
+    
+    Args:
+        input_video_path (str): Path to input video file
+        segments_dir (str): Directory receiving the segment files
+        segment_seconds (float): Target segment duration
+    
+    Returns:
+        list: Sorted segment file paths
+    """
+    cmd = [
+        get_ffmpeg_exe(), '-y', '-v', 'error', '-i', input_video_path,
+        '-map', '0:v:0', '-c', 'copy', '-an',
+        '-f', 'segment', '-segment_time', str(segment_seconds), '-reset_timestamps', '1',
+        os.path.join(segments_dir, 'segment_%05d.mkv')
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg segmenting failed: {result.stderr.strip()}")
+    
+    return sorted(os.path.join(segments_dir, name) for name in os.listdir(segments_dir)
+                  if name.startswith('segment_'))
+
+def concat_video_segments(segment_paths, output_video_path, audio_source=None):
+    """
+    Join encoded segments with the concat demuxer, copying all streams.
+    
+    Args:
+        segment_paths (list): Upscaled segment files in order
+        output_video_path (str): Path to output video file
+        audio_source (str): Optional file whose audio stream is copied into the output
+    """
+    list_path = output_video_path + '.segments.txt'
+    with open(list_path, 'w') as f:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    
+    try:
+        cmd = [get_ffmpeg_exe(), '-y', '-v', 'error', '-f', 'concat', '-safe', '0', '-i', list_path]
+        if audio_source:
+            cmd += ['-i', audio_source, '-map', '0:v:0', '-map', '1:a:0?', '-shortest']
+        cmd += ['-c', 'copy']
+        if output_video_path.lower().endswith('.mp4'):
+            cmd += ['-movflags', '+faststart']
+        cmd.append(output_video_path)
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception(f"ffmpeg concat failed: {result.stderr.strip()}")
+    finally:
+        if os.path.exists(list_path):
+            os.remove(list_path)
+
+def _upscale_segment(input_segment_path, output_segment_path, settings, preview_dir=None, progress=None):
+    """
+    Process pool entry point: upscale one segment in a worker process.
+    
+    Called in-process with progress when there is a single segment worker.
+    
+    Returns:
+        dict: Pipeline stats for the segment
+    """
+    stats = {}
+    info = get_video_info(input_segment_path)
+    preview = PreviewStore(preview_dir) if preview_dir else None
+    with JobMetrics() as metrics:
+        stats["frames"] = _upscale_video_stream(input_segment_path, output_segment_path, settings,
+                                                get_processing_settings(), info, stats, preview, metrics, progress)
+    stats["metrics"] = metrics.report()
+    return stats
+
+_sha256_cache = {}
+_sha256_cache_lock = threading.Lock()
+
+def file_sha256(path, chunk_size=4 * 1024 * 1024):
+    """
+    Hash a file's content.
+    
+    Digests are remembered per path, size and modification time, so the
+    cache, preview and checkpoint keys of one job hash the input once.
+    
+    Args:
+        path (str): File to hash
+        chunk_size (int): Read size in bytes
+    
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _sha256_cache_lock:
+        if key in _sha256_cache:
+            return _sha256_cache[key]
+    
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    
+    with _sha256_cache_lock:
+        if len(_sha256_cache) >= 256:
+            _sha256_cache.clear()
+        _sha256_cache[key] = digest.hexdigest()
+    return _sha256_cache[key]
+
+def get_checkpoint_dir(input_video_path, settings, processing):
+    """
+    Durable work directory for a job, keyed by input content and settings.
+    
+    The same input upscaled with the same settings always maps to the same
+    directory, so a restarted job finds the segments already completed.
+    
+    Args:
+        input_video_path (str): Path to input video file
+        settings (dict): Effective upscale settings
+        processing (dict): Effective processing settings
+    
+    Returns:
+        str: Checkpoint directory path
+    """
+    key = json.dumps({
+        "input_sha256": file_sha256(input_video_path),
+        "settings": settings,
+        "segment_seconds": processing["segment_seconds"]
+    }, sort_keys=True, default=str)
+    job_key = hashlib.sha256(key.encode()).hexdigest()[:24]
+    base_dir = processing["temp_dir"] or tempfile.gettempdir()
+    return os.path.join(base_dir, 'upscale_checkpoints', job_key)
+
+# Settings that only change speed, not pixels, so they stay out of result cache keys
+RESULT_CACHE_IGNORED_SETTINGS = ("batch_size", "encoder_threads", "inference_threads", "face_batch_size")
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+def get_result_cache(processing=None):
+    """
+    Return the shared result cache, creating it on first use.
+    
+    Args:
+        processing (dict): Effective processing settings, read from config.json if omitted
+    
+    Returns:
+        ResultCache: Cache instance, or None if result_cache_mb is 0
+    """
+    global _result_cache
+    processing = processing or get_processing_settings()
+    if not processing["result_cache_mb"]:
+        return None
+    
+    with _result_cache_lock:
+        if _result_cache is None:
+            base_dir = processing["temp_dir"] or tempfile.gettempdir()
+            cache_dir = processing["result_cache_dir"] or os.path.join(base_dir, 'result_cache')
+            _result_cache = ResultCache(cache_dir, processing["result_cache_mb"])
+        return _result_cache
+
+def get_result_cache_key(input_path, settings):
+    """
+    Cache key for upscaling a file: its content hash plus every setting that affects the output.
+    
+    Args:
+        input_path (str): Input file
+        settings (dict): Effective upscale settings
+    
+    Returns:
+        str: Hex cache key
+    """
+    output_settings = {key: value for key, value in settings.items() if key not in RESULT_CACHE_IGNORED_SETTINGS}
+    return make_cache_key(file_sha256(input_path), os.path.basename(MODEL_PATH), output_settings)
+
+# Settings that never change a single upscaled frame, so previews are shared across them
+PREVIEW_IGNORED_SETTINGS = RESULT_CACHE_IGNORED_SETTINGS + (
+    "video_codec", "crf", "preset", "copy_audio", "skip_duplicate_frames", "duplicate_threshold",
+    "face_detect_interval", "temporal_delta", "delta_tile_size", "delta_threshold", "delta_refresh_interval")
+
+class PreviewStore:
+    """
+    Upscaled frames computed by a preview, kept for the full job to reuse.
+    
+    Each frame is a lossless PNG named after the content digest of the
+    (pre-resized) input frame it was upscaled from, before any final crop.
+    """
+    
+    def __init__(self, directory):
+        """
+        Args:
+            directory (str): Directory holding the frames
+        """
+        self.directory = directory
+    
+    def digests(self):
+        """Return the input digests of every stored frame."""
+        if not os.path.isdir(self.directory):
+            return []
+        return [name[:-4] for name in os.listdir(self.directory) if name.endswith('.png') and not name.startswith('.')]
+    
+    def get(self, digest):
+        """Load the output stored for an input digest, or None."""
+        return cv2.imread(os.path.join(self.directory, digest + '.png'), cv2.IMREAD_UNCHANGED)
+    
+    def put(self, digest, frame):
+        """Store the output for an input digest."""
+        os.makedirs(self.directory, exist_ok=True)
+        # Written under a hidden name first so a partial file is never picked up
+        temp_path = os.path.join(self.directory, f".{digest}.{threading.get_ident()}.png")
+        if not cv2.imwrite(temp_path, frame, [cv2.IMWRITE_PNG_COMPRESSION, 1]):
+            raise Exception(f"Could not write preview frame to {self.directory}")
+        os.replace(temp_path, os.path.join(self.directory, digest + '.png'))
+    
+    def remove(self):
+        """Delete every stored frame."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+def get_preview_store(input_video_path, settings, processing):
+    """
+    Preview store for a video, keyed by its content and the settings that affect upscaled frames.
+    
+    Args:
+        input_video_path (str): Path to input video file
+        settings (dict): Effective upscale settings
+        processing (dict): Effective processing settings
+    
+    Returns:
+        PreviewStore: Store shared by the video's previews and full job
+    """
+    frame_settings = {key: value for key, value in settings.items() if key not in PREVIEW_IGNORED_SETTINGS}
+    key = make_cache_key(file_sha256(input_video_path), os.path.basename(MODEL_PATH), frame_settings)
+    base_dir = processing["temp_dir"] or tempfile.gettempdir()
+    return PreviewStore(os.path.join(base_dir, 'upscale_previews', key[:24]))
+
+def lock_checkpoint_dir(work_dir):
+    """
+    Take an exclusive lock on a checkpoint directory without waiting.
+    
+    Checkpoint directories are keyed by content, so two jobs on the same
+    input and settings map to the same one; the lock keeps the second from
+    clearing or overwriting the first one's segments.
+    
+    Args:
+        work_dir (str): Checkpoint directory
+    
+    Returns:
+        file: Open lock file, holding the lock until closed, or None if another job holds it
+    """
+    import fcntl
+    
+    os.makedirs(os.path.dirname(work_dir), exist_ok=True)
+    lock_file = open(work_dir + '.lock', 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+def load_checkpoint(work_dir):
+    """Load a checkpoint manifest, or an empty one if none was written yet."""
+    try:
+        with open(os.path.join(work_dir, 'progress.json')) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"input_segments": [], "completed": {}}
+
+def save_checkpoint(work_dir, checkpoint):
+    """Write a checkpoint manifest atomically so a crash never leaves it half-written."""
+    path = os.path.join(work_dir, 'progress.json')
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def verify_segment(path, record):
+    """
+    Check that a completed segment on disk matches its checkpoint record.
+    
+    Args:
+        path (str): Segment file
+        record (dict): Checkpoint record with size and sha256
+    
+    Returns:
+        bool: True if the segment can be reused
+    """
+    if not os.path.exists(path) or os.path.getsize(path) != record.get("size"):
+        return False
+    return file_sha256(path) == record.get("sha256")
+
+def upscale_video_segmented(input_video_path, output_video_path, settings, processing, job_stats=None,
+                            resume=False, preview=None, metrics=None, progress=None):
+    """
+    Upscale a long video as keyframe-aligned segments processed in parallel.
+    
+    Segments are upscaled by a pool of segment_workers processes, each with
+    its own model, then concatenated without re-encoding and muxed with the
+    original audio. With checkpoint_segments enabled the work directory is
+    durable: every finished segment is recorded in progress.json, and a
+    resumed job reuses the segments that still verify. The directory is
+    locked while a job uses it; a second job on the same input and
+    settings runs in a private directory instead.
+    
+    Args:
+        input_video_path (str): Path to input video file
+        output_video_path (str): Path to output upscaled video file
+        settings (dict): Effective upscale settings
+        processing (dict): Effective processing settings
+        job_stats (dict): Optional dict filled in with aggregated segment stats
+        resume (bool): Reuse completed segments from an earlier interrupted run
+        preview (PreviewStore): Optional frames already upscaled by a preview
+        metrics (JobMetrics): Optional metrics the per-stage timings and bytes are added to
+        progress (JobProgress): Optional progress, advanced per batch with one segment worker and
+            per segment with a pool
+    """
+    metrics = metrics or JobMetrics()
+    progress = progress or JobProgress()
+    checkpointing = processing["checkpoint_segments"]
+    lock_file = None
+    if checkpointing:
+        work_dir = get_checkpoint_dir(input_video_path, settings, processing)
+        lock_file = lock_checkpoint_dir(work_dir)
+        if lock_file is None:
+            print(f"Checkpoint {work_dir} is in use by another job; this run will not be checkpointed")
+            checkpointing = False
+    if checkpointing:
+        if not resume:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        os.makedirs(work_dir, exist_ok=True)
+    else:
+        temp_dir = processing["temp_dir"]
+        if temp_dir:
+            os.makedirs(temp_dir, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix='segments_', dir=temp_dir)
+    
+    succeeded = False
+    try:
+        checkpoint = load_checkpoint(work_dir)
+        segments_dir = os.path.join(work_dir, 'input')
         
-        # Create models directory
-        models_dir = 'models'
-        os.makedirs(models_dir, exist_ok=True)
+        # Splitting is deterministic, so existing input segments are reused if all are intact
+        segments = [os.path.join(segments_dir, record["name"]) for record in checkpoint["input_segments"]]
+        if not segments or not all(verify_segment(path, record)
+                                   for path, record in zip(segments, checkpoint["input_segments"])):
+            shutil.rmtree(segments_dir, ignore_errors=True)
+            os.makedirs(segments_dir)
+            progress.set_stage("split")
+            with metrics.stage("split") as counters:
+                segments = split_video_segments(input_video_path, segments_dir, processing["segment_seconds"])
+                checkpoint = {
+                    "input": os.path.abspath(input_video_path),
+                    "input_segments": [{"name": os.path.basename(path), "size": os.path.getsize(path),
+                                        "sha256": file_sha256(path)} for path in segments],
+                    "completed": {}
+                }
+                if checkpointing:
+                    save_checkpoint(work_dir, checkpoint)
+                counters["bytes_read"] = os.path.getsize(input_video_path)
+                counters["bytes_written"] = sum(record["size"] for record in checkpoint["input_segments"])
+        if not segments:
+            raise Exception("No segments produced from input video")
         
-        # Download realesr-general-x4v3 model
-        model_url = "https://github.com/xinntao/Real-ESRGAN/releases/download/v0.2.5.0/realesr-general-x4v3.pth"
-        model_path = os.path.join(models_dir, "realesr-general-x4v3.pth")
+        outputs = [os.path.join(work_dir, f"upscaled_{i:05d}.mkv") for i in range(len(segments))]
+        segment_stats = {}
+        pending = []
+        for index, output in enumerate(outputs):
+            record = checkpoint["completed"].get(str(index))
+            if record and verify_segment(output, record):
+                segment_stats[index] = record.get("stats", {})
+            else:
+                pending.append(index)
+        if len(pending) < len(segments):
+            print(f"Resuming: {len(segments) - len(pending)} of {len(segments)} segments already completed")
+            progress.advance(sum(stats.get("frames", 0) for stats in segment_stats.values()), timed=False)
         
-        if not os.path.exists(model_path):
-            subprocess.run(['wget', '-O', model_path, model_url], check=True)
-            print("Successfully downloaded Real-ESRGAN model")
-        else:
-            print("Real-ESRGAN model already exists")
-            
-        return True
+        # Audio is muxed once at the end; segments carry video only
+        segment_settings = dict(settings, copy_audio=False, io_backend="ffmpeg")
+        preview_dir = preview.directory if preview is not None else None
         
-    except Exception as e:
-        print(f"Failed to download Real-ESRGAN model: {e}")
-        return False
+        def complete(index, stats):
+            segment_stats[index] = stats
+            metrics.merge(stats.pop("metrics", {}))
+            if checkpointing:
+                checkpoint["completed"][str(index)] = {
+                    "size": os.path.getsize(outputs[index]),
+                    "sha256": file_sha256(outputs[index]),
+                    "stats": stats
+                }
+                save_checkpoint(work_dir, checkpoint)
+        
+        workers = max(1, min(int(processing["segment_workers"]), len(pending)))
+        print(f"Upscaling {len(pending)} segments with {workers} worker process(es)...")
+        progress.set_stage("upscale")
+        if workers == 1:
+            # No pool needed; reuse the model already loaded in this process
+            for index in pending:
+                complete(index, _upscale_segment(segments[index], outputs[index], segment_settings, preview_dir,
+                                                 progress))
+        elif pending:
+            # spawn, not fork: the parent may already hold CUDA state and model weights
+            context = multiprocessing.get_context('spawn')
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                futures = {executor.submit(_upscale_segment, segments[index], outputs[index], segment_settings,
+                                           preview_dir): index
+                           for index in pending}
+                for future in concurrent.futures.as_completed(futures):
+                    stats = future.result()
+                    complete(futures[future], stats)
+                    # Worker processes cannot report per batch, so progress moves a segment at a time
+                    progress.advance(stats.get("frames", 0))
+        
+        print("Concatenating upscaled segments...")
+        progress.set_stage("concat")
+        with metrics.stage("concat") as counters:
+            concat_video_segments(outputs, output_video_path,
+                                  audio_source=input_video_path if settings["copy_audio"] else None)
+            counters["bytes_read"] = sum(os.path.getsize(path) for path in outputs)
+            counters["bytes_written"] = os.path.getsize(output_video_path)
+        
+        if job_stats is not None:
+            ordered_stats = [segment_stats[index] for index in range(len(segments))]
+            job_stats["segments"] = len(segments)
+            job_stats["resumed_segments"] = len(segments) - len(pending)
+            job_stats["segment_stages"] = [stats.get("stages") for stats in ordered_stats]
+            for key in ("unique_frames", "duplicate_frames", "face_frames", "face_frames_skipped",
+                        "gfpgan_seconds", "gfpgan_seconds_skipped", "delta_full_frames", "delta_tiles",
+                        "delta_tiles_upscaled", "preview_frames_reused"):
+                if any(key in stats for stats in ordered_stats):
+                    job_stats[key] = sum(stats.get(key, 0) for stats in ordered_stats)
+        succeeded = True
+    finally:
+        if succeeded or not checkpointing:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        else:
+            print(f"Progress kept in {work_dir}; rerun with resume to continue")
+        if lock_file is not None:
+            lock_file.close()
 
-def upscale_video_with_realesrgan(input_video_path, output_video_path):
+def upscale_video_with_realesrgan(input_video_path, output_video_path, settings=None, job_stats=None,
+                                  resume=False, return_metrics=False, progress=None):
     """
     Upscale video using Real-ESRGAN with specified settings.
     
+    Frames are streamed decode -> upscale -> encode through a threaded
+    pipeline with bounded queues, so only a few batches are held in memory
+    at a time and nothing is written to disk besides the output video.
+    Videos at least two segments long are split into keyframe-aligned
+    segments only when segment_workers > 1 (to upscale them in parallel)
+    or checkpoint_segments is enabled (to make the job resumable). Finished outputs are
+    kept in the result cache, so repeating a request with the same input
+    content and settings copies the cached file instead of upscaling.
+    Frames already upscaled by preview_video are reused.
+    
     Args:
         input_video_path (str): Path to input video file
         output_video_path (str): Path to output upscaled video file
+        settings (dict): Per-job overrides of the upscale settings
+        job_stats (dict): Optional dict filled in with per-stage pipeline stats
+        resume (bool): Continue from the segments completed by an earlier interrupted run
+        return_metrics (bool): Also return the job's JobMetrics
+        progress (JobProgress): Optional live progress (stage, frames done, fps, ETA) updated as the job runs
     
     Returns:
-        bool: True if successful, False otherwise
+        bool: True if successful, False otherwise; (bool, JobMetrics) with return_metrics
     """
+    metrics = JobMetrics()
+    metrics.start()
+    success = False
     try:
-        print(f"Upscaling video: {input_video_path}")
-        print(f"Settings: Denoise={DENOISE_STRENGTH}, Upscale={UPSCALE_FACTOR}x, FaceEnhance={FACE_ENHANCEMENT}")
-        
-        # Create temporary directory for frame processing
-        temp_dir = tempfile.mkdtemp()
-        frames_dir = os.path.join(temp_dir, "frames")
-        output_frames_dir = os.path.join(temp_dir, "output_frames")
-        os.makedirs(frames_dir, exist_ok=True)
-        os.makedirs(output_frames_dir, exist_ok=True)
-        
-        # Extract frames from video
-        print("Extracting video frames...")
-        cap = cv2.VideoCapture(input_video_path)
-        if not cap.isOpened():
-            raise Exception("Error opening video file")
-        
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        print(f"Video FPS: {fps}, Total frames: {frame_count}")
-        
-        # Save frames as images
-        frame_idx = 0
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            frame_path = os.path.join(frames_dir, f"frame_{frame_idx:06d}.png")
-            cv2.imwrite(frame_path, frame)
-            frame_idx += 1
+        settings = get_upscale_settings(settings)
+        processing = get_processing_settings()
+        success = _upscale_video(input_video_path, output_video_path, settings, processing, job_stats, resume,
+                                 metrics, progress or JobProgress())
         
-        cap.release()
-        print(f"Extracted {frame_idx} frames")
-        
-        # Prepare Real-ESRGAN command
-        cmd = [
-            sys.executable, '-m', 'realesrgan.archs.srvgg_arch',
-            '-i', frames_dir,
-            '-o', output_frames_dir,
-            '-n', 'realesr-general-x4v3',
-            '-s', str(UPSCALE_FACTOR),
-            '--outscale', str(UPSCALE_FACTOR)
-        ]
-        
-        # Add denoise strength
-        if DENOISE_STRENGTH != 0.5:  # 0.5 is default
-            cmd.extend(['--denoise_strength', str(DENOISE_STRENGTH)])
-            
-        # Add face enhancement
-        if FACE_ENHANCEMENT:
-            cmd.append('--face_enhance')
-            
-        # Add model path if exists
-        model_path = os.path.join('models', 'realesr-general-x4v3.pth')
-        if os.path.exists(model_path):
-            cmd.extend(['--model_path', model_path])
+    except Exception as e:
+        print(f"Error during video upscaling: {e}")
+    finally:
+        metrics.finish()
+    
+    if "encode" in metrics.stages:
+        metrics.frames = metrics.stages["encode"]["frames"]
+    metrics_log = get_processing_settings()["metrics_log"]
+    if metrics_log:
+        try:
+            write_metrics_line(metrics_log, dict(metrics.report(), time=time.time(), success=success,
+                                                 input_path=input_video_path, output_path=output_video_path))
+        except Exception as e:
+            print(f"Could not write metrics to {metrics_log}: {e}")
+    
+    return (success, metrics) if return_metrics else success
+
+def _upscale_video(input_video_path, output_video_path, settings, processing, job_stats, resume, metrics,
+                   progress):
+    """
+    Body of upscale_video_with_realesrgan, raising on failure.
+    
+    Returns:
+        bool: True once the output is written
+    """
+    cache = get_result_cache(processing)
+    if cache is not None:
+        progress.set_stage("cache_lookup")
+        with metrics.stage("cache_lookup") as counters:
+            cache_key = get_result_cache_key(input_video_path, settings)
+            hit = cache.get(cache_key, output_video_path)
+            if hit:
+                counters["bytes_written"] = os.path.getsize(output_video_path)
+        if hit:
+            print(f"Result cache hit, copied cached output to: {output_video_path}")
+            if job_stats is not None:
+                job_stats["result_cache"] = "hit"
+            return True
+        if job_stats is not None:
+            job_stats["result_cache"] = "miss"
+    
+    print(f"Upscaling video: {input_video_path}")
+    print(f"Settings: Denoise={settings['denoise_strength']}, Upscale={settings['upscale_factor']}x, "
+          f"FaceEnhance={settings['face_enhancement']}, BatchSize={settings['batch_size']}, "
+          f"Precision={settings['precision']}")
+    
+    info = get_video_info(input_video_path)
+    print(f"Video FPS: {info['fps']}, Total frames: {info['frame_count']}")
+    progress.set_stage("plan", info["frame_count"])
+    
+    plan = plan_upscale(info["width"], info["height"], settings)
+    print(f"Upscale plan: {plan['description']}")
+    if job_stats is not None:
+        job_stats["plan"] = plan
+    
+    preview = get_preview_store(input_video_path, settings, processing)
+    if not preview.digests():
+        preview = None
+    
+    duration = info["frame_count"] / info["fps"] if info["fps"] else 0
+    segmented = int(processing["segment_workers"]) > 1 or processing["checkpoint_segments"]
+    if segmented and get_ffmpeg_exe() is not None and duration >= 2 * processing["segment_seconds"]:
+        upscale_video_segmented(input_video_path, output_video_path, settings, processing, job_stats, resume,
+                                preview, metrics, progress)
+        print(f"Upscaled video saved to: {output_video_path}")
+    else:
+        written = _upscale_video_stream(input_video_path, output_video_path, settings, processing, info,
+                                        job_stats, preview, metrics, progress)
+        print(f"Upscaled video saved to: {output_video_path} ({written} frames)")
+    
+    if preview is not None:
+        # The whole video is done, so the preview's frames are no longer needed
+        preview.remove()
+    
+    if cache is not None:
+        progress.set_stage("cache_store")
+        try:
+            with metrics.stage("cache_store") as counters:
+                cache.put(cache_key, output_video_path)
+                counters["bytes_written"] = os.path.getsize(output_video_path)
+        except Exception as e:
+            print(f"Could not store result in cache: {e}")
+    return True
+
+def read_video_frames_at(input_video_path, indices, fps, io_backend="opencv"):
+    """
+    Decode individual frames by seeking to each one.
+    
+    Decoding matches read_video_frames for the same io_backend, so the
+    frames are bit-identical to the ones a full pass would produce.
+    
+    Args:
+        input_video_path (str): Path to input video file
+        indices (list): Frame indices to decode
+        fps (float): Stream frame rate, used to seek by time with ffmpeg
+        io_backend (str): "ffmpeg" or "opencv"
+    
+    Yields:
+        tuple: (index, BGR frame) for every frame that could be decoded
+    """
+    if io_backend == "ffmpeg":
+        import imageio_ffmpeg
         
-        print("Running Real-ESRGAN upscaling...")
-        print(f"Command: {' '.join(cmd)}")
+        for index in indices:
+            # Seek half a frame early so rounding never skips past the wanted frame
+            start = max(0.0, (index - 0.5) / fps) if fps else 0.0
+            reader = imageio_ffmpeg.read_frames(input_video_path, pix_fmt='bgr24',
+                                                input_params=['-ss', f"{start:.6f}"],
+                                                output_params=['-frames:v', '1'])
+            try:
+                width, height = next(reader)["size"]
+                for data in reader:
+                    yield index, np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+            finally:
+                reader.close()
+        return
+    
+    cap = cv2.VideoCapture(input_video_path)
+    if not cap.isOpened():
+        raise Exception("Error opening video file")
+    
+    try:
+        for index in indices:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ret, frame = cap.read()
+            if ret:
+                yield index, frame
+    finally:
+        cap.release()
+
+def make_contact_sheet(frames, labels, cell_width=PREVIEW_SHEET_CELL_WIDTH):
+    """
+    Tile frames into a labelled grid image.
+    
+    Args:
+        frames (list): BGR frames of one size
+        labels (list): Caption drawn on each frame
+        cell_width (int): Widest a frame is drawn, smaller frames keep their size
+    
+    Returns:
+        numpy.ndarray: Contact sheet image
+    """
+    height, width = frames[0].shape[:2]
+    scale = min(1.0, cell_width / width)
+    cell_w, cell_h = int(round(width * scale)), int(round(height * scale))
+    columns = int(np.ceil(np.sqrt(len(frames))))
+    rows = int(np.ceil(len(frames) / columns))
+    
+    sheet = np.zeros((rows * cell_h, columns * cell_w, 3), dtype=np.uint8)
+    for i, (frame, label) in enumerate(zip(frames, labels)):
+        cell = cv2.resize(frame, (cell_w, cell_h), interpolation=cv2.INTER_AREA) if scale < 1.0 else frame
+        y, x = (i // columns) * cell_h, (i % columns) * cell_w
+        sheet[y:y + cell_h, x:x + cell_w] = cell
+        font_scale = max(0.5, cell_h / 540)
+        cv2.putText(sheet, label, (x + 10, y + int(30 * font_scale)), cv2.FONT_HERSHEY_SIMPLEX, font_scale,
+                    (0, 0, 0), max(2, int(4 * font_scale)), cv2.LINE_AA)
+        cv2.putText(sheet, label, (x + 10, y + int(30 * font_scale)), cv2.FONT_HERSHEY_SIMPLEX, font_scale,
+                    (255, 255, 255), max(1, int(2 * font_scale)), cv2.LINE_AA)
+    return sheet
+
+def preview_video(input_video_path, output_path, settings=None, frames=PREVIEW_FRAMES, seconds=0,
+                  job_stats=None, progress=None):
+    """
+    Upscale a small part of a video to check quality before the full job.
+    
+    Either a few evenly spaced frames or the first seconds of the video are
+    upscaled with the same model and settings the full job would use. An
+    image output_path (.png, .jpg, ...) gets a contact sheet, anything else
+    a short clip. The upscaled frames are kept so that the full job (and
+    repeated previews) reuse them instead of upscaling them again.
+    
+    Args:
+        input_video_path (str): Path to input video file
+        output_path (str): Contact sheet image or clip to write
+        settings (dict): Per-job overrides of the upscale settings
+        frames (int): Evenly spaced frames to sample when seconds is 0
+        seconds (float): Upscale the first seconds of the video instead of sampling
+        job_stats (dict): Optional dict filled in with the preview frames and plan
+        progress (JobProgress): Optional progress advanced per upscaled batch
+    
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    progress = progress or JobProgress()
+    try:
+        settings = get_upscale_settings(settings)
+        processing = get_processing_settings()
+        io_backend = resolve_io_backend(settings["io_backend"])
+        info = get_video_info(input_video_path)
+        fps = info["fps"] or 30.0
+        plan = plan_upscale(info["width"], info["height"], settings)
         
-        # Run Real-ESRGAN
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"Real-ESRGAN failed: {result.stderr}")
-            return False
-            
-        print("Upscaling completed")
+        if seconds:
+            print(f"Previewing the first {seconds}s of {input_video_path}")
+            reader = read_video_frames(input_video_path, io_backend)
+            count = max(1, int(round(seconds * fps)))
+            decoded = itertools.islice(enumerate(reader), count)
+        else:
+            total = info["frame_count"]
+            count = max(1, min(int(frames), total)) if total > 0 else max(1, int(frames))
+            indices = sorted({int((i + 0.5) * total / count) for i in range(count)}) if total > 0 else range(count)
+            print(f"Previewing {len(indices)} frames of {input_video_path}")
+            reader = read_video_frames_at(input_video_path, indices, fps, io_backend)
+            decoded = reader
+            count = len(indices)
+        progress.set_stage("decode", min(count, info["frame_count"]) if info["frame_count"] > 0 else count)
         
-        # Reconstruct video from upscaled frames
-        print("Reconstructing upscaled video...")
+        indices = []
+        inputs = []
+        try:
+            for index, frame in decoded:
+                indices.append(index)
+                inputs.append(frame)
+        finally:
+            # Stops the decoder once the first seconds are read
+            reader.close()
+        if not inputs:
+            raise Exception("No frames decoded from input video")
+        if plan["pre_resize"]:
+            inputs = list(resize_frames(inputs, plan["pre_resize"]))
         
-        # Get dimensions of first upscaled frame
-        output_frame_files = sorted(os.listdir(output_frames_dir))
-        if not output_frame_files:
-            raise Exception("No upscaled frames found")
+        reused = 0
+        if plan["model_passes"]:
+            preview = get_preview_store(input_video_path, settings, processing)
+            digests = [frame_digest(frame).hex() for frame in inputs]
+            known = set(preview.digests())
+            outputs = [preview.get(digest) if digest in known else None for digest in digests]
+            reused = sum(output is not None for output in outputs)
+            progress.set_stage("upscale", len(inputs))
+            progress.advance(reused, timed=False)
             
-        first_frame_path = os.path.join(output_frames_dir, output_frame_files[0])
-        first_frame = cv2.imread(first_frame_path)
-        height, width = first_frame.shape[:2]
-        
-        # Initialize video writer
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_video_path, fourcc, fps, (width, height))
-        
-        if not out.isOpened():
-            raise Exception("Error initializing video writer")
-        
-        # Write frames to video
-        for frame_file in sorted(os.listdir(output_frames_dir)):
-            frame_path = os.path.join(output_frames_dir, frame_file)
-            frame = cv2.imread(frame_path)
-            out.write(frame)
-        
-        out.release()
-        print(f"Upscaled video saved to: {output_video_path}")
+            pending = [i for i, output in enumerate(outputs) if output is None]
+            if pending:
+                face_stats = {}
+                calibration = None
+                if settings["precision"] == "int8":
+                    calibration = Calibration(calibration_crops(inputs),
+                                              f"the {len(inputs)} preview frames of {os.path.basename(input_video_path)}")
+                upscale_kwargs = get_upscale_kwargs(dict(settings, upscale_factor=plan["outscale"]), face_stats,
+                                                    calibration)
+                tracker = None
+                if upscale_kwargs["face_enhancer"] is not None and settings["face_gating"]:
+                    tracker = FaceTracker(1)
+                    tracker = tracker if tracker.cascade is not None else None
+                for batch in batch_frames(pending, max(1, int(settings["batch_size"]))):
+                    batch_inputs = [inputs[i] for i in batch]
+                    face_flags = [bool(tracker.update(frame)) for frame in batch_inputs] if tracker is not None else None
+                    for i, output in zip(batch, upscale_batch(batch_inputs, face_flags=face_flags, **upscale_kwargs)):
+                        outputs[i] = output
+                        preview.put(digests[i], output)
+                    progress.advance(len(batch))
+            if plan["crop"]:
+                outputs = list(crop_frames(outputs, plan["crop"]))
+        else:
+            outputs = list(resize_frames(inputs, plan["output_size"]))
+            progress.set_stage("upscale", len(inputs))
+            progress.advance(len(outputs))
         
-        # Clean up temporary directory
-        shutil.rmtree(temp_dir, ignore_errors=True)
+        progress.set_stage("encode")
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        if os.path.splitext(output_path)[1].lower() in ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.tif', '.tiff'):
+            labels = [f"{index / fps:.2f}s (frame {index})" for index in indices]
+            if not cv2.imwrite(output_path, make_contact_sheet(outputs, labels)):
+                raise Exception(f"Could not write contact sheet: {output_path}")
+        else:
+            write_video_frames(outputs, output_path, fps if seconds else PREVIEW_CLIP_FPS, io_backend,
+                               audio_source=input_video_path if seconds and settings["copy_audio"] else None,
+                               video_codec=settings["video_codec"], crf=settings["crf"], preset=settings["preset"],
+                               encoder_threads=settings["encoder_threads"])
+        print(f"Preview saved to: {output_path} ({len(outputs)} frames, {reused} reused)")
         
+        if job_stats is not None:
+            job_stats["plan"] = plan
+            job_stats["preview_frames"] = indices
+            job_stats["preview_frames_reused"] = reused
         return True
         
     except Exception as e:
-        print(f"Error during video upscaling: {e}")
+        print(f"Error during preview: {e}")
         return False
 
+def benchmark_precision(input_video_path, precisions=("fp32", "bf16", "int8"), num_frames=8,
+                        denoise_strength=DENOISE_STRENGTH, batch_size=BATCH_SIZE):
+    """
+    Compare precision modes against fp32 on frames from a video.
+    
+    int8 is calibrated on frames sampled across the whole video (see
+    sample_calibration), and the source is reported with its results.
+    Each mode gets one untimed warm-up batch, then the remaining frames are
+    timed. PSNR is measured against the fp32 output of the same frames.
+    
+    Args:
+        input_video_path (str): Video to take the first num_frames frames from
+        precisions (tuple): Precision modes to compare
+        num_frames (int): Frames to benchmark on
+        denoise_strength (float): Denoise strength the weights are blended for
+        batch_size (int): Frames per forward pass
+    
+    Returns:
+        dict: Per precision, the resolved mode, fps, speedup over fp32, PSNR in dB and the int8 calibration source
+    """
+    frames = []
+    for frame in read_video_frames(input_video_path):
+        frames.append(frame)
+        if len(frames) >= num_frames + batch_size:
+            break
+    if len(frames) <= batch_size:
+        raise Exception(f"Need more than {batch_size} frames to benchmark, got {len(frames)}")
+    warmup, timed = frames[:batch_size], frames[batch_size:]
+    calibration = None
+    
+    results = {}
+    reference = None
+    for precision in ("fp32",) + tuple(p for p in precisions if p != "fp32"):
+        model = RealESRGANModel(MODEL_PATH, denoise_strength, precision=precision)
+        if model.precision == "int8":
+            calibration = calibration or sample_calibration(input_video_path, get_video_info(input_video_path))
+            model = model.calibrated(calibration)
+        model.enhance_batch(warmup)
+        
+        start = time.time()
+        outputs = []
+        for batch in batch_frames(timed, batch_size):
+            outputs.extend(model.enhance_batch(batch))
+        elapsed = time.time() - start
+        
+        if reference is None:
+            reference, reference_seconds = outputs, elapsed
+        psnr = float(np.mean([cv2.PSNR(ref, out) for ref, out in zip(reference, outputs)]))
+        results[precision] = {
+            "resolved": model.precision,
+            "fps": len(timed) / elapsed,
+            "speedup": reference_seconds / elapsed,
+            "psnr": psnr
+        }
+        source = getattr(model.backend, "calibration_source", None)
+        if source:
+            results[precision]["calibration"] = source
+        print(f"{precision:>5} ({model.precision} on {model.device.type}): {results[precision]['fps']:.2f} fps, "
+              f"{results[precision]['speedup']:.2f}x vs fp32, PSNR {psnr:.2f} dB"
+              + (f", calibrated on {source}" if source else ""))
+        del model
+    
+    return results
+
 def receive_video_via_ssh(ssh_user, ssh_host, remote_video_path, local_video_path):
     """
     Receive video file via SSH from remote server.
@@ -241,7 +3562,7 @@ def send_video_via_ssh(local_video_path, ssh_user, ssh_host, remote_video_path):
         print(f"Error sending video via SSH: {e}")
         return False
 
-def process_video_from_ssh(ssh_user, ssh_host, remote_input_path, remote_output_path):
+def process_video_from_ssh(ssh_user, ssh_host, remote_input_path, remote_output_path, resume=False):
     """
     Complete workflow: receive video, upscale it, and send it back.
     
@@ -250,21 +3571,30 @@ def process_video_from_ssh(ssh_user, ssh_host, remote_input_path, remote_output_
         ssh_host (str): SSH host
         remote_input_path (str): Path to input video on remote server
         remote_output_path (str): Path to save output video on remote server
+        resume (bool): Reuse the downloaded input and completed segments of an interrupted run
     
     Returns:
         bool: True if successful, False otherwise
     """
     try:
         # Generate local paths
-        local_input_path = f"input_{int(time.time())}.mp4"
-        local_output_path = f"output_{int(time.time())}.mp4"
+        if resume:
+            # Stable names so a rerun finds the same input file and checkpoint
+            source_key = hashlib.sha1(f"{ssh_user}@{ssh_host}:{remote_input_path}".encode()).hexdigest()[:12]
+            local_input_path = f"input_{source_key}.mp4"
+            local_output_path = f"output_{source_key}.mp4"
+        else:
+            local_input_path = f"input_{int(time.time())}.mp4"
+            local_output_path = f"output_{int(time.time())}.mp4"
         
         # Step 1: Receive video from remote server
-        if not receive_video_via_ssh(ssh_user, ssh_host, remote_input_path, local_input_path):
+        if resume and os.path.exists(local_input_path):
+            print(f"Reusing previously received video: {local_input_path}")
+        elif not receive_video_via_ssh(ssh_user, ssh_host, remote_input_path, local_input_path):
             return False
             
         # Step 2: Upscale video
-        if not upscale_video_with_realesrgan(local_input_path, local_output_path):
+        if not upscale_video_with_realesrgan(local_input_path, local_output_path, resume=resume):
             return False
             
         # Step 3: Send upscaled video back to remote server
@@ -299,20 +3629,44 @@ def main():
         print("Failed to download models. Exiting.")
         return 1
     
+    # --resume continues an interrupted run from its last completed segment
+    args = [arg for arg in sys.argv[1:] if arg != '--resume']
+    resume = len(args) != len(sys.argv) - 1
+    
+    if len(args) == 2 and args[0] == '--benchmark-precision':
+        # Compare precision modes on the first frames of a local video
+        benchmark_precision(args[1])
+        return 0
+    
+    if len(args) == 3 and args[0] == '--preview':
+        # Contact sheet (image output) or clip of sampled frames for a quick quality check
+        success = preview_video(args[1], args[2])
+        return 0 if success else 1
+    
     # Check if we have command line arguments for SSH processing
-    if len(sys.argv) == 5:
+    if len(args) == 4:
         # Process video via SSH: ssh_user ssh_host remote_input_path remote_output_path
-        ssh_user = sys.argv[1]
-        ssh_host = sys.argv[2]
-        remote_input_path = sys.argv[3]
-        remote_output_path = sys.argv[4]
+        ssh_user = args[0]
+        ssh_host = args[1]
+        remote_input_path = args[2]
+        remote_output_path = args[3]
         
-        success = process_video_from_ssh(ssh_user, ssh_host, remote_input_path, remote_output_path)
+        success = process_video_from_ssh(ssh_user, ssh_host, remote_input_path, remote_output_path, resume)
+        return 0 if success else 1
+    elif len(args) == 2:
+        # Process a local file: input_path output_path
+        success = upscale_video_with_realesrgan(args[0], args[1], resume=resume)
         return 0 if success else 1
     else:
         print("Usage for SSH processing:")
-        print(f"  {sys.argv[0]} <ssh_user> <ssh_host> <remote_input_path> <remote_output_path>")
-        print("\nFor manual processing, modify the code to call upscale_video_with_realesrgan() directly.")
+        print(f"  {sys.argv[0]} [--resume] <ssh_user> <ssh_host> <remote_input_path> <remote_output_path>")
+        print("Usage for local processing:")
+        print(f"  {sys.argv[0]} [--resume] <input_path> <output_path>")
+        print("Usage for comparing precision modes (speed and PSNR against fp32):")
+        print(f"  {sys.argv[0]} --benchmark-precision <input_path>")
+        print("Usage for previewing sampled frames (contact sheet for .png/.jpg, clip otherwise):")
+        print(f"  {sys.argv[0]} --preview <input_path> <output_path>")
+        print("\n--resume continues an interrupted job from its last completed segment.")
         return 0
 
 if __name__ == "__main__":